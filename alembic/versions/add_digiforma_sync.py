@@ -0,0 +1,89 @@
+"""add digiforma sync tables
+
+Revision ID: add_digiforma_sync
+Revises: add_entreprise_cache
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_digiforma_sync'
+down_revision: Union[str, None] = 'add_entreprise_cache'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Copie locale des sessions, inscriptions et signatures Digiforma (synchronisation incrémentale)
+    op.create_table('digiforma_sessions',
+        sa.Column('id', sa.String(50), nullable=False),
+        sa.Column('nom', sa.String(255), nullable=True),
+        sa.Column('code', sa.String(100), nullable=True),
+        sa.Column('pipeline', sa.String(50), nullable=True),
+        sa.Column('programme', sa.String(255), nullable=True),
+        sa.Column('date_debut', sa.Date(), nullable=True),
+        sa.Column('date_fin', sa.Date(), nullable=True),
+        sa.Column('total_score', sa.Float(), nullable=True),
+        sa.Column('total_pre', sa.Float(), nullable=True),
+        sa.Column('total_hot', sa.Float(), nullable=True),
+        sa.Column('total_cold', sa.Float(), nullable=True),
+        sa.Column('apprenants', sa.Text(), nullable=True),
+        sa.Column('empreinte', sa.String(64), nullable=False),
+        sa.Column('synchronise_le', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_digiforma_sessions_date_debut', 'digiforma_sessions', ['date_debut'])
+
+    op.create_table('digiforma_inscriptions',
+        sa.Column('id', sa.String(120), nullable=False),
+        sa.Column('session_id', sa.String(50), nullable=True),
+        sa.Column('nom_session', sa.String(255), nullable=True),
+        sa.Column('code_session', sa.String(100), nullable=True),
+        sa.Column('trainee_id', sa.String(50), nullable=True),
+        sa.Column('civilite', sa.String(20), nullable=True),
+        sa.Column('nom', sa.String(255), nullable=True),
+        sa.Column('prenom', sa.String(255), nullable=True),
+        sa.Column('handicape', sa.Boolean(), nullable=True),
+        sa.Column('reussite', sa.Boolean(), nullable=True),
+        sa.Column('completion', sa.Float(), nullable=True),
+        sa.Column('empreinte', sa.String(64), nullable=False),
+        sa.Column('synchronise_le', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_digiforma_inscriptions_session_id', 'digiforma_inscriptions', ['session_id'])
+
+    op.create_table('digiforma_signatures',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('inscription_id', sa.String(120), nullable=False),
+        sa.Column('signature', sa.Text(), nullable=True),
+        sa.Column('type', sa.String(50), nullable=True),
+        sa.Column('date', sa.String(30), nullable=True),
+        sa.Column('creneau', sa.String(30), nullable=True),
+        sa.Column('sous_session', sa.String(255), nullable=True),
+        sa.Column('id_sous_session', sa.String(50), nullable=True),
+        sa.ForeignKeyConstraint(['inscription_id'], ['digiforma_inscriptions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_digiforma_signatures_id', 'digiforma_signatures', ['id'])
+    op.create_index('ix_digiforma_signatures_inscription_id', 'digiforma_signatures', ['inscription_id'])
+
+    op.create_table('digiforma_sync_etat',
+        sa.Column('entite', sa.String(50), nullable=False),
+        sa.Column('derniere_synchro', sa.DateTime(), nullable=False),
+        sa.Column('filtre', sa.String(100), nullable=True),
+        sa.Column('elements_lus', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('elements_modifies', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('entite')
+    )
+
+def downgrade() -> None:
+    op.drop_table('digiforma_sync_etat')
+    op.drop_index('ix_digiforma_signatures_inscription_id', table_name='digiforma_signatures')
+    op.drop_index('ix_digiforma_signatures_id', table_name='digiforma_signatures')
+    op.drop_table('digiforma_signatures')
+    op.drop_index('ix_digiforma_inscriptions_session_id', table_name='digiforma_inscriptions')
+    op.drop_table('digiforma_inscriptions')
+    op.drop_index('ix_digiforma_sessions_date_debut', table_name='digiforma_sessions')
+    op.drop_table('digiforma_sessions')
@@ -0,0 +1,28 @@
+"""add entreprise_cache table
+
+Revision ID: add_entreprise_cache
+Revises: add_jobs_batch
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_entreprise_cache'
+down_revision: Union[str, None] = 'add_jobs_batch'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Cache persistant des fiches entreprise Pappers, clé = SIREN
+    op.create_table('entreprise_cache',
+        sa.Column('siren', sa.String(9), nullable=False),
+        sa.Column('donnees', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('siren')
+    )
+
+def downgrade() -> None:
+    op.drop_table('entreprise_cache')
@@ -0,0 +1,34 @@
+"""add geocodage_cache table
+
+Revision ID: add_geocodage_cache
+Revises: add_photo_profil_to_emargements
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_geocodage_cache'
+down_revision: Union[str, None] = 'add_photo_profil_to_emargements'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Cache persistant des géocodages api-adresse, clé = adresse normalisée
+    op.create_table('geocodage_cache',
+        sa.Column('cle', sa.Text(), nullable=False),
+        sa.Column('adresse', sa.Text(), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('score', sa.Float(), nullable=True),
+        sa.Column('label', sa.String(255), nullable=True),
+        sa.Column('code_postal', sa.String(10), nullable=True),
+        sa.Column('code_commune', sa.String(10), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('cle')
+    )
+
+def downgrade() -> None:
+    op.drop_table('geocodage_cache')
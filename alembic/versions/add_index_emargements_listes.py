@@ -0,0 +1,29 @@
+"""add indexes for emargement rosters
+
+Revision ID: add_index_emargements_listes
+Revises: add_digiforma_sync
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_index_emargements_listes'
+down_revision: Union[str, None] = 'add_digiforma_sync'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Listes d'émargements en une requête : jointures par événement et par email
+    op.create_index('ix_emargements_evenement_id', 'emargements', ['evenement_id'])
+    op.create_index('ix_emargements_email_evenement_id', 'emargements', ['email', 'evenement_id'])
+    op.create_index('ix_inscriptions_email', 'inscriptions', ['email'])
+    op.create_index('ix_besoins_evenement_event_id_email', 'besoins_evenement', ['event_id', 'email'])
+
+def downgrade() -> None:
+    op.drop_index('ix_besoins_evenement_event_id_email', table_name='besoins_evenement')
+    op.drop_index('ix_inscriptions_email', table_name='inscriptions')
+    op.drop_index('ix_emargements_email_evenement_id', table_name='emargements')
+    op.drop_index('ix_emargements_evenement_id', table_name='emargements')
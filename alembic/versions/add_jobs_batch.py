@@ -0,0 +1,43 @@
+"""add jobs_batch table
+
+Revision ID: add_jobs_batch
+Revises: add_geocodage_cache
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_jobs_batch'
+down_revision: Union[str, None] = 'add_geocodage_cache'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # File des traitements longs exécutés hors requête HTTP (QPV en lot, ...)
+    op.create_table('jobs_batch',
+        sa.Column('id', sa.String(32), nullable=False),
+        sa.Column('type', sa.String(50), nullable=False),
+        sa.Column('statut', sa.String(20), nullable=False),
+        sa.Column('parametres', sa.JSON(), nullable=False),
+        sa.Column('lignes_total', sa.Integer(), nullable=True),
+        sa.Column('lignes_traitees', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('lignes_reprises', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('fichier_sortie', sa.String(255), nullable=True),
+        sa.Column('erreur', sa.Text(), nullable=True),
+        sa.Column('tentatives', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_batch_type', 'jobs_batch', ['type'])
+    op.create_index('ix_jobs_batch_statut', 'jobs_batch', ['statut'])
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_batch_statut', table_name='jobs_batch')
+    op.drop_index('ix_jobs_batch_type', table_name='jobs_batch')
+    op.drop_table('jobs_batch')
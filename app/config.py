@@ -24,9 +24,14 @@ TEMPLATE_DIR = BASE_DIR / "templates"
 FICHIERS_DIR = BASE_DIR / "fichiers"
 STATIC_IMAGES_DIR = STATIC_DIR / "images"
 STATIC_MAPS_DIR = STATIC_DIR / "maps"
+DATA_DIR = BASE_DIR / "data"
+QPV_DATA_DIR = DATA_DIR / "qpv"
+QPV_SNAPSHOT_PATH = QPV_DATA_DIR / "qpv_snapshot.geojson"
+JOBS_DIR = DATA_DIR / "jobs"  # Fichiers d'entrée des jobs en arrière-plan
+QPV_CARTES_DIR = DATA_DIR / "cartes"  # Cartes QPV rendues à la demande (description, HTML, PNG)
 
 # Création des dossiers s'ils n'existent pas
-for directory in [STATIC_DIR, TEMPLATE_DIR, FICHIERS_DIR, STATIC_IMAGES_DIR, STATIC_MAPS_DIR]:
+for directory in [STATIC_DIR, TEMPLATE_DIR, FICHIERS_DIR, STATIC_IMAGES_DIR, STATIC_MAPS_DIR, QPV_DATA_DIR, JOBS_DIR, QPV_CARTES_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
 
 class Settings(BaseSettings):
@@ -77,6 +82,68 @@ class Settings(BaseSettings):
     # URL du site MCA
     MCA_WEBSITE_URL: str = "https://lesentrepreneursaffranchis.fr/"
 
+    # Configuration QPV (index local des quartiers prioritaires)
+    QPV_SNAPSHOT_URL: str = "https://public.opendatasoft.com/api/explore/v2.1/catalog/datasets/quartiers-prioritaires-de-la-politique-de-la-ville-qpv/exports/geojson"
+    QPV_DISTANCE_LIMITE_M: int = 300
+    QPV_PREFILTRE_CELLULE_M: int = 1000  # Taille des cellules de la grille de pré-filtrage
+    QPV_CARTES_TTL_MINUTES: int = 1440  # Cartes non consultées depuis ce délai : supprimées
+    QPV_MAP_RENDERER: str = "statique"  # "statique" (Pillow) ou "navigateur" (Chrome headless)
+    NAVIGATEUR_POOL_TAILLE: int = 2  # Nombre de Chrome headless gardés chauds
+    NAVIGATEUR_CAPTURES_MAX: int = 100  # Recyclage d'un navigateur après N captures
+    NAVIGATEUR_ATTENTE_TUILES_SEC: int = 10
+
+    # Géocodage (api-adresse) et cache des coordonnées
+    API_ADRESSE_URL: str = "https://api-adresse.data.gouv.fr"
+    GEOCODAGE_TIMEOUT_SEC: int = 10
+    GEOCODAGE_CACHE_TAILLE: int = 20000
+    GEOCODAGE_CACHE_TTL_JOURS: int = 90
+    GEOCODAGE_CACHE_TTL_NEGATIF_MIN: int = 60  # Adresse introuvable : gardée en mémoire seulement, brièvement
+    GEOCODAGE_CACHE_DB: bool = True  # False : cache mémoire seul (benchmarks, tests sans Postgres)
+    GEOCODAGE_CSV_TAILLE_LOT: int = 2000
+    GEOCODAGE_CSV_TIMEOUT_SEC: int = 180
+    API_ADRESSE_REQ_PAR_SEC: float = 40  # api-adresse tolère 50 requêtes/s par IP
+    OPENDATASOFT_URL: str = "https://public.opendatasoft.com"
+    OPENDATASOFT_REQ_PAR_SEC: float = 5
+
+    # Traitement des fichiers QPV en lot
+    QPV_BATCH_CONCURRENCE: int = 8
+    QPV_BATCH_TENTATIVES: int = 3
+    QPV_BATCH_DELAI_RETRY_SEC: float = 1.0
+    QPV_FLUX_TAILLE_LOT: int = 1000  # Lignes lues / écrites par lot en mode flux
+    QPV_FLUX_SEUIL_OCTETS: int = 2_000_000  # Au-delà, le fichier est traité en flux
+
+    # Jobs en arrière-plan (table jobs_batch)
+    JOBS_INTERVALLE_SONDAGE_SEC: float = 5
+    JOBS_INTERVALLE_PROGRESSION_SEC: float = 2
+    JOBS_DELAI_ABANDON_SEC: int = 600  # Job "en_cours" sans battement depuis ce délai : repris
+    JOBS_TENTATIVES_MAX: int = 3
+
+    # Client HTTP partagé (app/utils/http_client.py)
+    HTTP_TIMEOUT_SEC: float = 15
+    HTTP_TIMEOUT_CONNEXION_SEC: float = 5
+    HTTP_CONNEXIONS_MAX: int = 100
+    HTTP_CONNEXIONS_KEEPALIVE: int = 20
+    HTTP_CONCURRENCE_PAR_HOTE: int = 10
+    HTTP_TENTATIVES: int = 3
+    HTTP_DELAI_RETRY_SEC: float = 0.5
+    PAPPERS_URL: str = "https://api.pappers.fr"
+    PAPPERS_REQ_PAR_SEC: float = 5
+    SIRET_LOT_CONCURRENCE: int = 8
+    COMPTES_CSV_CACHE_TAILLE: int = 500
+    COMPTES_CSV_TTL_MINUTES: int = 60
+    DIGIFORMA_TIMEOUT_SEC: float = 50
+    DIGIFORMA_TAILLE_PAGE: int = 100
+    DIGIFORMA_CONCURRENCE: int = 4  # Pages demandées en parallèle
+    DIGIFORMA_REQ_PAR_SEC: float = 4
+    DIGIFORMA_SYNC_MARGE_JOURS: int = 30  # Sessions terminées depuis moins longtemps : relues à chaque synchro
+    DIGIFORMA_SYNC_COMPLETE_HEURES: int = 24  # Relecture de toutes les sessions de l'année au moins à ce rythme
+    DIGIFORMA_LIEN_VALIDITE_MIN: int = 30  # Durée de validité du lien signé de téléchargement du ZIP
+    DIGIFORMA_EXPORT_FRAICHEUR_MIN: int = 15  # Export servi depuis le cache sans interroger Digiforma
+    ENTREPRISE_CACHE_TAILLE: int = 5000
+    ENTREPRISE_CACHE_TTL_HEURES: int = 24  # Au-delà, la fiche est servie périmée et rafraîchie en arrière-plan
+    ENTREPRISE_CACHE_PERIME_MAX_JOURS: int = 30  # Au-delà, Pappers est interrogé avant de répondre
+    ENTREPRISE_CACHE_DB: bool = True
+
     # Construction de l'URL de la base de données
     @property
     def DATABASE_URL(self) -> str:
@@ -19,6 +19,12 @@ from sqlalchemy import text
 from app.database import AsyncSessionLocal, init_db
 import traceback
 from app.routes import route_fiche_synthese
+from app.routes import route_metrics, route_jobs, route_siret_lot
+from app.services.service_qpv_index import charger_index_qpv
+from app.services.service_navigateur_pool import demarrer_pool_navigateurs, arreter_pool_navigateurs
+from app.services.service_jobs import demarrer_worker_jobs, arreter_worker_jobs
+from app.utils.http_client import demarrer_client_http, arreter_client_http
+from app.config import settings
 
 
 # Configuration du logging
@@ -64,6 +70,29 @@ async def lifespan(app: FastAPI):
             print(f"📋 Traceback:\n{traceback.format_exc()}")
             raise
 
+        # Client HTTP partagé (connexions keep-alive vers les API externes)
+        print("\n🌐 Démarrage du client HTTP partagé...")
+        demarrer_client_http()
+
+        # Chargement de l'index local des QPV (hors boucle d'événements)
+        print("\n🗺️ Chargement de l'index QPV...")
+        try:
+            await asyncio.to_thread(charger_index_qpv)
+        except Exception as e:
+            print(f"⚠️ Index QPV non chargé, repli sur OpenDataSoft : {str(e)}")
+
+        # Pool de navigateurs pour la capture des cartes (mode "navigateur" uniquement)
+        if settings.QPV_MAP_RENDERER == "navigateur":
+            print("\n🌐 Démarrage du pool de navigateurs...")
+            try:
+                await demarrer_pool_navigateurs()
+            except Exception as e:
+                print(f"⚠️ Pool de navigateurs indisponible, capture à la demande : {str(e)}")
+
+        # Worker des jobs en arrière-plan (reprend les jobs interrompus)
+        print("\n⏳ Démarrage du worker de jobs...")
+        demarrer_worker_jobs()
+
         # Démarrage du planificateur de nettoyage
         print("\n🧹 Démarrage du planificateur de nettoyage...")
         if not scheduler.running:
@@ -79,6 +108,9 @@ async def lifespan(app: FastAPI):
         
     finally:
         print("\n🛑 Arrêt de l'application...")
+        await arreter_worker_jobs()
+        await arreter_pool_navigateurs()
+        await arreter_client_http()
         if scheduler.running:
             stop_cleanup_scheduler()
             print("✅ Planificateur de nettoyage arrêté")
@@ -132,6 +164,7 @@ print("✅ Dossiers statiques montés")
 print("\n🔗 Inclusion des routes...")
 api_router.include_router(route_generate_pdf_from_html.router, tags=["Génération de PDF à partir de HTML"])
 api_router.include_router(route_siret_pappers.router, tags=["Siret"])
+api_router.include_router(route_siret_lot.router, tags=["Siret"])
 api_router.include_router(route_qpv.router, tags=["QPV"])
 api_router.include_router(route_digiformat.router, tags=["Digiformat"])
 api_router.include_router(route_rdv.router, tags=["Rendez-vous"])
@@ -144,6 +177,8 @@ api_router.include_router(route_evenement.router, prefix="/event", tags=["evenem
 api_router.include_router(route_programme.router, prefix="/programmes", tags=["Programmes"])
 api_router.include_router(route_emargement.router, prefix="/emargement", tags=["emargement"])
 api_router.include_router(route_fiche_synthese.router, tags=["Fiche Synthétique"])
+api_router.include_router(route_metrics.router, tags=["Metrics"])
+api_router.include_router(route_jobs.router, tags=["Jobs"])
 
 print("✅ Routes incluses")
 
@@ -1,5 +1,5 @@
 # app/models/models.py
-from sqlalchemy import Column, String, Integer, Float, DateTime,Date, Enum, ForeignKey, Table, Text, func, Boolean
+from sqlalchemy import Column, String, Integer, Float, DateTime,Date, Enum, ForeignKey, Table, Text, func, Boolean, JSON, Index
 from sqlalchemy.orm import relationship, validates
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import date
@@ -152,6 +152,7 @@ class Preinscription(Base):
 #-------------------------------------INSCRIPTION-------------------------------------
 class Inscription(Base):
     __tablename__ = "inscriptions"
+    __table_args__ = (Index("ix_inscriptions_email", "email"),)
 
     # Identifiants de liaison
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -193,6 +194,7 @@ class Inscription(Base):
 #-------------------------------------BESOINS EVENEMENT-------------------------------------
 class BesoinEvenement(Base):
     __tablename__ = "besoins_evenement"
+    __table_args__ = (Index("ix_besoins_evenement_event_id_email", "event_id", "email"),)
 
     id = Column(String(50), primary_key=True)  # Changé en String pour le format "besoin_X_UUID"
     event_id = Column(Integer, ForeignKey("evenements.id", ondelete="CASCADE"), nullable=False)
@@ -254,6 +256,10 @@ class SatisfactionEvenement(Base):
 #-------------------------------------EMARGEMENT-------------------------------------
 class Emargement(Base):
     __tablename__ = "emargements"
+    __table_args__ = (
+        Index("ix_emargements_evenement_id", "evenement_id"),
+        Index("ix_emargements_email_evenement_id", "email", "evenement_id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     evenement_id = Column(Integer, ForeignKey("evenements.id", ondelete="CASCADE"), nullable=False)
@@ -341,3 +347,140 @@ class Evenement(Base):
         now = datetime.utcnow()
         return self.date_debut <= now <= self.date_fin 
 
+
+
+#-------------------------------------CACHE GEOCODAGE-------------------------------------
+class GeocodageCache(Base):
+    __tablename__ = "geocodage_cache"
+
+    cle = Column(Text, primary_key=True)  # Adresse normalisée
+    adresse = Column(Text, nullable=False)  # Adresse telle que saisie la première fois
+    latitude = Column(Float, nullable=True)  # NULL si l'adresse n'a pas été trouvée
+    longitude = Column(Float, nullable=True)
+    score = Column(Float, nullable=True)
+    label = Column(String(255), nullable=True)
+    code_postal = Column(String(10), nullable=True)
+    code_commune = Column(String(10), nullable=True)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<GeocodageCache(cle='{self.cle}', latitude={self.latitude}, longitude={self.longitude})>"
+
+
+class EntrepriseCache(Base):
+    __tablename__ = "entreprise_cache"
+
+    siren = Column(String(9), primary_key=True)
+    donnees = Column(JSON, nullable=False)  # Réponse brute de /v2/entreprise (Pappers)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<EntrepriseCache(siren='{self.siren}', updated_at={self.updated_at})>"
+
+
+
+#-------------------------------------JOBS EN ARRIERE-PLAN-------------------------------------
+class StatutJob(str, PyEnum):
+    EN_ATTENTE = "en_attente"
+    EN_COURS = "en_cours"
+    TERMINE = "termine"
+    ERREUR = "erreur"
+
+class JobBatch(Base):
+    __tablename__ = "jobs_batch"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    type = Column(String(50), nullable=False, index=True)  # ex: "qpv_groupe"
+    statut = Column(String(20), nullable=False, default=StatutJob.EN_ATTENTE.value, index=True)
+    parametres = Column(JSON, nullable=False, default=dict)  # Entrées du traitement (chemins, options)
+    lignes_total = Column(Integer, nullable=True)
+    lignes_traitees = Column(Integer, nullable=False, default=0)
+    lignes_reprises = Column(Integer, nullable=False, default=0)  # Déjà faites avant une reprise
+    fichier_sortie = Column(String(255), nullable=True)  # Nom du fichier dans FICHIERS_DIR
+    erreur = Column(Text, nullable=True)
+    tentatives = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())  # Battement de coeur du worker
+
+    def __repr__(self):
+        return f"<JobBatch(id='{self.id}', type='{self.type}', statut='{self.statut}', {self.lignes_traitees}/{self.lignes_total})>"
+
+
+
+#-------------------------------------SYNCHRONISATION DIGIFORMA-------------------------------------
+class DigiformaSession(Base):
+    __tablename__ = "digiforma_sessions"
+
+    id = Column(String(50), primary_key=True)  # Identifiant Digiforma
+    nom = Column(String(255), nullable=True)
+    code = Column(String(100), nullable=True)
+    pipeline = Column(String(50), nullable=True)
+    programme = Column(String(255), nullable=True)
+    date_debut = Column(Date, nullable=True, index=True)  # Première date de la session
+    date_fin = Column(Date, nullable=True)
+    total_score = Column(Float, nullable=True)
+    total_pre = Column(Float, nullable=True)
+    total_hot = Column(Float, nullable=True)
+    total_cold = Column(Float, nullable=True)
+    apprenants = Column(Text, nullable=True)
+    empreinte = Column(String(64), nullable=False)  # SHA-256 des champs ci-dessus
+    synchronise_le = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<DigiformaSession(id='{self.id}', nom='{self.nom}')>"
+
+
+class DigiformaInscription(Base):
+    __tablename__ = "digiforma_inscriptions"
+
+    id = Column(String(120), primary_key=True)  # "<id session>:<id client>:<id apprenant>[#position]"
+    session_id = Column(String(50), nullable=True, index=True)
+    nom_session = Column(String(255), nullable=True)
+    code_session = Column(String(100), nullable=True)
+    trainee_id = Column(String(50), nullable=True)
+    civilite = Column(String(20), nullable=True)
+    nom = Column(String(255), nullable=True)
+    prenom = Column(String(255), nullable=True)
+    handicape = Column(Boolean, nullable=True)
+    reussite = Column(Boolean, nullable=True)
+    completion = Column(Float, nullable=True)
+    empreinte = Column(String(64), nullable=False)  # SHA-256 de l'inscription et de ses signatures
+    synchronise_le = Column(DateTime, nullable=False, server_default=func.now())
+
+    signatures = relationship("DigiformaSignature", back_populates="inscription", cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<DigiformaInscription(id='{self.id}', nom='{self.nom}')>"
+
+
+class DigiformaSignature(Base):
+    __tablename__ = "digiforma_signatures"
+
+    id = Column(Integer, primary_key=True, index=True)
+    inscription_id = Column(String(120), ForeignKey("digiforma_inscriptions.id", ondelete="CASCADE"), nullable=False, index=True)
+    signature = Column(Text, nullable=True)
+    type = Column(String(50), nullable=True)
+    date = Column(String(30), nullable=True)
+    creneau = Column(String(30), nullable=True)
+    sous_session = Column(String(255), nullable=True)
+    id_sous_session = Column(String(50), nullable=True)
+
+    inscription = relationship("DigiformaInscription", back_populates="signatures")
+
+    def __repr__(self):
+        return f"<DigiformaSignature(inscription_id='{self.inscription_id}', date='{self.date}')>"
+
+
+class DigiformaSyncEtat(Base):
+    __tablename__ = "digiforma_sync_etat"
+
+    entite = Column(String(50), primary_key=True)  # "sessions", "sessions_complete" ou "inscriptions"
+    derniere_synchro = Column(DateTime, nullable=False)
+    filtre = Column(String(100), nullable=True)  # Filtre Digiforma utilisé (ex: startedAfter)
+    elements_lus = Column(Integer, nullable=False, default=0)
+    elements_modifies = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DigiformaSyncEtat(entite='{self.entite}', derniere_synchro={self.derniere_synchro})>"
@@ -1,9 +1,9 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import select, cast, String, text
+from sqlalchemy import select, cast, String, text, true
 from sqlalchemy.ext.asyncio import AsyncSession
 import traceback
 from datetime import datetime
@@ -37,6 +37,42 @@ templates = Jinja2Templates(directory="app/templates")
 # Ajouter la fonction get_static_url aux templates
 templates.env.globals["get_static_url"] = get_static_url
 
+LIMITE_PAGE_EMARGEMENTS = 50  # Taille de page par défaut quand seul le curseur `apres` est fourni
+
+def requete_emargements(*criteres):
+    """
+    Émargements avec, en une seule requête, le nom et prénom de l'inscription
+    (première inscription de l'email) et le besoin déposé pour l'événement.
+    Les jointures LATERAL sont limitées à une ligne : un émargement n'est
+    jamais dupliqué, quel que soit le nombre d'inscriptions de l'email.
+    """
+    inscription = (
+        select(Inscription.nom, Inscription.prenom)
+        .where(Inscription.email == Emargement.email)
+        .order_by(Inscription.id)
+        .limit(1)
+        .lateral("inscription")
+    )
+    besoin = (
+        select(true().label("trouve"), BesoinEvenement.is_participant)
+        .where(BesoinEvenement.event_id == Emargement.evenement_id, BesoinEvenement.email == Emargement.email)
+        .order_by(BesoinEvenement.id)
+        .limit(1)
+        .lateral("besoin")
+    )
+    return (
+        select(
+            Emargement.id, Emargement.evenement_id, Emargement.email, Emargement.date_signature,
+            Emargement.mode_signature, Emargement.is_validated,
+            inscription.c.nom, inscription.c.prenom,
+            besoin.c.trouve.is_not(None).label("a_rempli_besoins"), besoin.c.is_participant,
+        )
+        .select_from(Emargement)
+        .outerjoin(inscription, true())
+        .outerjoin(besoin, true())
+        .where(*criteres)
+    )
+
 @router.post("/create", response_model=EmargementCreateResponse)
 async def create_emargement_distant(
     emargement: EmargementCreate,
@@ -431,63 +467,25 @@ async def get_emargements_evenement(
             raise NotFoundException(f"Événement {evenement_id} non trouvé")
         print(f"✅ Événement trouvé: {evenement.titre}")
             
-        print("\n📥 Récupération des émargements...")
-        # Récupérer tous les émargements de l'événement
-        res = await db.execute(select(Emargement).where(Emargement.evenement_id == evenement_id))
-        emargements = res.scalars().all()
-        print(f"✅ {len(emargements)} émargements trouvés")
-        
-        print("\n🔄 Traitement des émargements...")
-        # Pour chaque émargement, chercher si on a des infos dans BesoinEvenement
-        result = []
-        for emargement in emargements:
-            print(f"\n👤 Traitement de l'émargement pour {emargement.email}")
-            # Recherche simple dans inscriptions pour obtenir le nom et prénom
-            query = text("""
-                SELECT nom, prenom
-                FROM inscriptions
-                WHERE email = :email
-            """)
-            res = await db.execute(
-                query,
-                {"email": emargement.email}
-            )
-            inscription = res.first()
-            
-            # Recherche séparée dans besoins_evenement
-            query_besoins = text("""
-                SELECT *
-                FROM besoins_evenement
-                WHERE CAST(event_id AS INTEGER) = :event_id
-                AND email = :email
-            """)
-            res_besoins = await db.execute(
-                query_besoins,
-                {"event_id": evenement_id, "email": emargement.email}
-            )
-            besoin = res_besoins.first()
-            
-            if inscription:
-                print(f"✅ Inscription trouvée pour {inscription.nom} {inscription.prenom}")
-            else:
-                print("ℹ️ Aucune inscription trouvée pour ce participant")
-            
-            if besoin:
-                print("✅ Besoins trouvés pour ce participant")
-            else:
-                print("ℹ️ Aucun besoin trouvé pour ce participant")
-            
-            result.append({
-                "id": emargement.id,
-                "nom": inscription.nom if inscription else None,
-                "prenom": inscription.prenom if inscription else None,
-                "email": emargement.email,
-                "date_signature": emargement.date_signature,
-                "mode_signature": emargement.mode_signature,
-                "is_validated": emargement.is_validated,
-                "a_rempli_besoins": besoin is not None,
-                "is_participant": besoin.is_participant if besoin else None
-            })
+        print("\n📥 Récupération des émargements, inscriptions et besoins (requête unique)...")
+        res = await db.execute(
+            requete_emargements(Emargement.evenement_id == evenement_id).order_by(Emargement.id)
+        )
+        result = [
+            {
+                "id": ligne.id,
+                "nom": ligne.nom,
+                "prenom": ligne.prenom,
+                "email": ligne.email,
+                "date_signature": ligne.date_signature,
+                "mode_signature": ligne.mode_signature,
+                "is_validated": ligne.is_validated,
+                "a_rempli_besoins": ligne.a_rempli_besoins,
+                "is_participant": ligne.is_participant
+            }
+            for ligne in res.all()
+        ]
+        print(f"✅ {len(result)} émargements trouvés")
             
         print("\n" + "="*50)
         print(f"✨ FIN LISTE ÉMARGEMENTS - {len(result)} participants traités")
@@ -507,72 +505,61 @@ async def get_emargements_evenement(
 @router.get("/participant/{email}/liste", response_model=List[dict],include_in_schema=False)
 async def get_emargements_participant(
     email: str,
+    response: Response,
+    limite: Optional[int] = Query(None, ge=1, le=200, description="Taille de page ; sans limite ni curseur, liste complète"),
+    apres: Optional[int] = Query(None, description="Curseur : en-tête X-Next-Cursor de la page précédente"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Récupère la liste des émargements d'un participant pour tous ses événements"""
+    """
+    Récupère les émargements d'un participant, du plus récent au plus ancien,
+    avec l'événement, l'identité et les besoins, en une seule requête.
+
+    Sans paramètre, la liste complète est renvoyée. Pagination par curseur
+    (keyset) si `limite` ou `apres` est fourni : `limite` émargements par page
+    (LIMITE_PAGE_EMARGEMENTS par défaut) ; s'il en reste, l'en-tête
+    X-Next-Cursor donne la valeur à passer dans `apres`.
+    """
     print("\n" + "="*50)
     print(f"📋 LISTE DES ÉMARGEMENTS POUR LE PARTICIPANT {email}")
     print("="*50)
     
     try:
-        print("\n🔍 Récupération des émargements...")
-        # Récupérer tous les émargements de cette personne
-        res = await db.execute(
-            select(Emargement).where(Emargement.email == email)
+        print("\n🔍 Récupération des émargements, événements et besoins (requête unique)...")
+        # Les émargements dont l'événement n'existe plus sont écartés par la jointure
+        requete = (
+            requete_emargements(Emargement.email == email, *([Emargement.id < apres] if apres is not None else []))
+            .join(Evenement, Evenement.id == Emargement.evenement_id)
+            .add_columns(Evenement.titre, Evenement.date_debut, Evenement.date_fin, Evenement.lieu)
+            .order_by(Emargement.id.desc())
         )
-        emargements = res.scalars().all()
-        print(f"✅ {len(emargements)} émargements trouvés")
-        
-        result = []
-        for emargement in emargements:
-            print(f"\n👤 Traitement de l'émargement {emargement.id}...")
-            # Récupérer l'événement
-            res_evenement = await db.execute(
-                select(Evenement).where(Evenement.id == emargement.evenement_id)
-            )
-            evenement = res_evenement.scalar_one_or_none()
-            
-            if evenement:  # Ne traiter que les événements qui existent encore
-                print(f"✅ Événement trouvé: {evenement.titre}")
-                
-                # Recherche dans inscriptions pour le nom et prénom
-                res_inscription = await db.execute(
-                    text("SELECT nom, prenom FROM inscriptions WHERE email = :email"),
-                    {"email": email}
-                )
-                inscription = res_inscription.first()
-                
-                # Chercher si on a des infos dans BesoinEvenement
-                res_besoin = await db.execute(
-                    text("""
-                        SELECT * FROM besoins_evenement 
-                        WHERE CAST(event_id AS INTEGER) = :event_id 
-                        AND email = :email
-                    """),
-                    {"event_id": evenement.id, "email": email}
-                )
-                besoin = res_besoin.first()
-                
-                if inscription:
-                    print(f"✅ Inscription trouvée pour {inscription.nom} {inscription.prenom}")
-                if besoin:
-                    print("✅ Besoins trouvés pour cet événement")
-                
-                result.append({
-                    "id": emargement.id,
-                    "evenement_id": evenement.id,
-                    "titre": evenement.titre,
-                    "date_debut": evenement.date_debut,
-                    "date_fin": evenement.date_fin,
-                    "lieu": evenement.lieu,
-                    "nom": inscription.nom if inscription else None,
-                    "prenom": inscription.prenom if inscription else None,
-                    "date_signature": emargement.date_signature,
-                    "mode_signature": emargement.mode_signature,
-                    "is_validated": emargement.is_validated,
-                    "a_rempli_besoins": besoin is not None,
-                    "is_participant": besoin.is_participant if besoin else None
-                })
+        if limite is None and apres is not None:
+            limite = LIMITE_PAGE_EMARGEMENTS
+        if limite is not None:
+            requete = requete.limit(limite + 1)
+        res = await db.execute(requete)
+        lignes = res.all()
+        if limite is not None and len(lignes) > limite:
+            lignes = lignes[:limite]
+            response.headers["X-Next-Cursor"] = str(lignes[-1].id)
+
+        result = [
+            {
+                "id": ligne.id,
+                "evenement_id": ligne.evenement_id,
+                "titre": ligne.titre,
+                "date_debut": ligne.date_debut,
+                "date_fin": ligne.date_fin,
+                "lieu": ligne.lieu,
+                "nom": ligne.nom,
+                "prenom": ligne.prenom,
+                "date_signature": ligne.date_signature,
+                "mode_signature": ligne.mode_signature,
+                "is_validated": ligne.is_validated,
+                "a_rempli_besoins": ligne.a_rempli_besoins,
+                "is_participant": ligne.is_participant
+            }
+            for ligne in lignes
+        ]
         
         print("\n" + "="*50)
         print(f"✨ FIN LISTE ÉMARGEMENTS - {len(result)} événements traités")
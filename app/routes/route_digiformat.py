@@ -1,14 +1,40 @@
-
-from fastapi import APIRouter, HTTPException, Request
-from app.services.service_digiforma import extract_digiforma_data
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import Response
+from app.config import settings
+from app.services.service_digiforma import NOM_ZIP, extract_digiforma_data, obtenir_export, verifier_jeton_export
 from app.schemas.schema_digiforma import DigiformaInput
 router = APIRouter()
 
+def reponse_zip(export: dict, if_none_match: Optional[str]) -> Response:
+    """ZIP en cache, ou 304 si le client détient déjà cette version (If-None-Match)."""
+    entetes = {
+        "ETag": export["etag"],
+        "Cache-Control": f"private, max-age={settings.DIGIFORMA_EXPORT_FRAICHEUR_MIN * 60}",
+    }
+    if if_none_match and export["etag"] in [etag.strip() for etag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=entetes)
+    return Response(
+        export["contenu"],
+        media_type="application/zip",
+        headers={**entetes, "Content-Disposition": f'attachment; filename="{NOM_ZIP}"'},
+    )
+
 @router.post("/digiforma")
-async def get_digiforma_sessions(data:DigiformaInput, request:Request):
+async def get_digiforma_sessions(data:DigiformaInput, request:Request, if_none_match: Optional[str] = Header(None)):
+    """ZIP des CSV (ETag, 304) ; JSON avec le ZIP en base64 si `content_base64` est demandé."""
     try:
-        return await extract_digiforma_data(data,request)
+        if data.content_base64:
+            return await extract_digiforma_data(data, request, avec_base64=True)
+        return reponse_zip(await obtenir_export(forcer=data.forcer_rafraichissement), if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Erreur interne : {str(e)}")
 
-
+@router.get("/digiforma/export/{jeton}")
+async def telecharger_export_digiforma(jeton: str, if_none_match: Optional[str] = Header(None)):
+    """Lien signé retourné par /digiforma (et par l'interface web) : export en cache ou reconstruit."""
+    if not verifier_jeton_export(jeton):
+        raise HTTPException(status_code=403, detail="❌ Lien de téléchargement invalide ou expiré.")
+    return reponse_zip(await obtenir_export(), if_none_match)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, HTTPException
+from app.services.service_jobs import etat_job, get_job
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}")
+async def get_statut_job(job_id: str):
+    """Avancement d'un job en arrière-plan (lignes, débit, ETA, lien de téléchargement)"""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return etat_job(job)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from app.utils import metrics
+from app.services.service_geocodage import statistiques_cache
+from app.services.service_qpv_index import statistiques_prefiltre
+from app.services.service_pappers import statistiques_cache_pappers
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def get_metrics():
+    """Compteurs et latences (p50/p95) du processus courant"""
+    data = metrics.snapshot()
+    data["geocodage_cache"] = statistiques_cache()
+    data["qpv_prefiltre"] = statistiques_prefiltre()
+    data["pappers_cache"] = statistiques_cache_pappers()
+    return data
@@ -1,13 +1,20 @@
-from fastapi import APIRouter,Request
+from fastapi import APIRouter,Request,HTTPException
+from fastapi.responses import FileResponse
 from app.schemas.schema_qpv import Adresse
 from app.services.service_qpv import verif_qpv
+from app.services.service_qpv_cartes import FORMATS, obtenir_carte
+import re
 import time
 
 router = APIRouter()
 
 # On va dans un premier temps récupérer l'adresse géographique et le valider
 @router.post("/qpv_check")
-async def get_adresse(address:Adresse, request: Request) :
+async def get_adresse(address:Adresse, request: Request, image_encoded: bool = False) :
+    """
+    Verdict QPV de l'adresse. La carte est rendue à la demande via `carte` /
+    `image_url` ; `image_encoded=true` renvoie en plus le PNG en base64.
+    """
 
     start_time = time.time()  # ⏱️ début
     data = address.model_dump()
@@ -39,7 +46,7 @@ async def get_adresse(address:Adresse, request: Request) :
         }
 
     # Si tout est OK, on continue la vérification QPV
-    recherche = await verif_qpv(data, request)
+    recherche = await verif_qpv(data, request, image_encoded=image_encoded)
 
     duration = round(time.time() - start_time, 2)
 
@@ -48,3 +55,16 @@ async def get_adresse(address:Adresse, request: Request) :
     print(f"⏱️ execution_time_sec: {duration}")
 
     return recherche
+
+@router.get("/qpv/map/{cle}")
+async def get_carte_qpv(cle: str, format: str = "html"):
+    """Carte QPV (HTML ou PNG), rendue au premier accès puis servie depuis le disque"""
+    if format not in FORMATS or not re.fullmatch(r"[0-9a-f]{8,64}", cle):
+        raise HTTPException(status_code=400, detail="Clé ou format de carte invalide")
+
+    chemin = await obtenir_carte(cle, format)
+    if chemin is None:
+        raise HTTPException(status_code=404, detail="Carte introuvable ou expirée")
+
+    media_type = "text/html" if format == "html" else "image/png"
+    return FileResponse(chemin, media_type=media_type)
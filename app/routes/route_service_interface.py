@@ -13,11 +13,13 @@ from app.services import service_digiforma,service_qpv,service_generate_pdf_from
 from app.utils.template import build_success_result_html
 from fastapi import UploadFile
 import aiofiles
-from app.config import  FICHIERS_DIR,  TEMPLATE_DIR, get_static_url
+from app.config import  FICHIERS_DIR, JOBS_DIR, TEMPLATE_DIR, get_static_url, get_base_url
 from app.utils.traiter_zip_excel import traiter_zip_entier  # ajuste selon ton arborescence
 import shutil
 from app.utils.temp_dir import create_temp_file, delete_temp_dir
-from app.services.service_QPV_QueryGroup import recherche_groupqpv
+from app.services import service_QPV_QueryGroup  # noqa: F401 — enregistre le type de job "qpv_groupe"
+from app.services.service_jobs import creer_job
+import uuid
 
 # ✅ Monter le dossier "templates" pour qu'il soit accessible via "/templates/"
 
@@ -206,30 +208,29 @@ async def process_service(
                 request.session["result"] = get_result_template(msg, type_="error")
                 return RedirectResponse(url="/", status_code=303)
     
-            # Enregistrer le fichier temporairement
-            temp_dir, input_path=create_temp_file(html_file.filename)
+            # Enregistrer le fichier d'entrée là où le worker de jobs le retrouvera
+            type = "xlsx" if filename.lower().endswith(".xlsx") else "csv"
+            input_path = os.path.join(JOBS_DIR, f"{uuid.uuid4().hex}.{type}")
 
             print(f"✅ DEBUG Input path : {input_path}")
             async with aiofiles.open(input_path, "wb") as f:
                 content = await html_file.read()
                 await f.write(content)
 
-            
-
-            if filename.lower().endswith(".xlsx"):
-                output_path = os.path.join(FICHIERS_DIR, "resultats_qpv.xlsx")
-                type="xlsx"
-            else :
-                output_path = os.path.join(FICHIERS_DIR, "resultats_qpv.xlsx")
-                type="csv"
+            # ⏳ Traitement en arrière-plan : on rend la main tout de suite
+            job_id = await creer_job("qpv_groupe", {
+                "input_path": input_path,
+                "file_type": type,
+                "base_url": get_base_url(request),
+                "nom_fichier": filename,
+            })
 
-            await recherche_groupqpv(input_path, output_path, type, request)
-
-            message = "✅ Le fichier avec les résultats QPV est prêt."
-            result = build_success_result_html(message, download_url="/static/fichiers/resultats_qpv.xlsx", filename="resultats_qpv.xlsx")
-            request.session["result"] = result
-
-            delete_temp_dir(temp_dir)
+            suivi_url = f"/api-mca/v1/jobs/{job_id}"
+            msg = (
+                f"⏳ Le fichier {filename} est en cours de traitement (job {job_id}).<br>"
+                f"🔗 <a href=\"{suivi_url}\" target=\"_blank\">Suivre l'avancement et télécharger le résultat</a>"
+            )
+            request.session["result"] = get_result_template(msg, type_="info")
             return RedirectResponse(url="/", status_code=303)
         
         elif service == "check_groupeqpv" and html_file is None:
@@ -0,0 +1,41 @@
+import os
+import uuid
+
+import aiofiles
+from fastapi import APIRouter, File, HTTPException, UploadFile
+
+from app.config import JOBS_DIR
+from app.schemas.schema_siret import SiretLotRequest
+from app.services import service_siret_lot  # noqa: F401  (enregistre le type de job "siret_lot")
+from app.services.service_jobs import creer_job
+
+router = APIRouter()
+
+def _reponse_job(job_id: str) -> dict:
+    return {"job_id": job_id, "statut_url": f"/api-mca/v1/jobs/{job_id}"}
+
+@router.post("/siret/lot")
+async def enrichir_fichier_sirets(fichier: UploadFile = File(...)):
+    """
+    Enrichit un fichier CSV/XLSX de SIRET ou SIREN (colonne 'SIRET' ou 'SIREN').
+    Le traitement tourne en arrière-plan : suivre `statut_url`, le fichier enrichi
+    est disponible via `download_url` une fois le job terminé.
+    """
+    filename = fichier.filename or ""
+    if not filename.lower().endswith((".csv", ".xlsx")):
+        raise HTTPException(status_code=400, detail="Seuls les fichiers .csv et .xlsx sont acceptés.")
+
+    file_type = "xlsx" if filename.lower().endswith(".xlsx") else "csv"
+    input_path = os.path.join(JOBS_DIR, f"{uuid.uuid4().hex}.{file_type}")
+    async with aiofiles.open(input_path, "wb") as f:
+        while bloc := await fichier.read(1024 * 1024):
+            await f.write(bloc)
+
+    job_id = await creer_job("siret_lot", {"input_path": input_path, "file_type": file_type, "nom_fichier": filename})
+    return _reponse_job(job_id)
+
+@router.post("/siret/lot/json")
+async def enrichir_liste_sirets(demande: SiretLotRequest):
+    """Même traitement que /siret/lot pour une liste JSON de numéros."""
+    job_id = await creer_job("siret_lot", {"numeros": demande.numeros})
+    return _reponse_job(job_id)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Request
-from app.services.service_siret_pappers import get_entreprise_process
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.services.service_siret_pappers import get_entreprise_process, obtenir_export_comptes
 from app.schemas.schema_siret import SiretRequest
+import re
 import time
 
 router = APIRouter()
@@ -34,7 +36,9 @@ async def get_entreprise(siret_request: SiretRequest, request: Request):
 
     print("🔄 [ROUTE] Appel du service get_entreprise_process...")
     try:
-        infosentreprise = await get_entreprise_process(numero_siret, request)
+        infosentreprise = await get_entreprise_process(
+            numero_siret, request, sans_cache=siret_request.sans_cache, avec_base64=siret_request.csv_base64
+        )
         print("✅ [ROUTE] Service exécuté avec succès")
     except Exception as e:
         print(f"❌ [ROUTE] Erreur lors de l'appel au service: {str(e)}")
@@ -45,4 +49,24 @@ async def get_entreprise(siret_request: SiretRequest, request: Request):
 
     print("✨ [ROUTE] Envoi de la réponse au client")
     return infosentreprise
-    
\ No newline at end of file
+    
+
+@router.get("/siret/comptes/{artefact_id}")
+async def telecharger_comptes(artefact_id: str):
+    """CSV des comptes d'une entreprise, identifié par "<siren>-<empreinte>" (download_url de /siret)"""
+    if not re.fullmatch(r"[0-9]{9}-[0-9a-f]{32}", artefact_id):
+        raise HTTPException(status_code=404, detail="Export introuvable")
+    contenu = await obtenir_export_comptes(artefact_id)
+    if contenu is None:
+        raise HTTPException(status_code=404, detail="Export introuvable ou expiré")
+
+    siren = artefact_id.split("-", 1)[0]
+    return StreamingResponse(
+        iter([contenu]),
+        media_type="text/csv; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="comptes_{siren}.csv"',
+            "Content-Length": str(len(contenu)),
+            "ETag": f'"{artefact_id}"',
+        },
+    )
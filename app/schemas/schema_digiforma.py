@@ -3,6 +3,8 @@ from app.config import settings
 
 class DigiformaInput(BaseModel):
     Password: str = Field(..., title="Entrer votre mot de passe pour accéder aux données")
+    content_base64: bool = Field(False, title="Retourner le ZIP encodé en base64 dans une réponse JSON (Power Automate)")
+    forcer_rafraichissement: bool = Field(False, title="Reconstruire l'export en arrière-plan, même s'il est récent")
 
     @field_validator("Password")
     @classmethod
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, field_validator
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
 
 class SiretRequest(BaseModel):
     numero_siret: str
+    sans_cache: bool = False  # True : interroge Pappers même si la fiche est en cache
+    csv_base64: bool = False  # True : CSV des comptes joint en base64 dans la réponse
 
     @field_validator("numero_siret")
     @classmethod
@@ -10,4 +14,8 @@ class SiretRequest(BaseModel):
             raise ValueError("Le numéro SIRET/SIREN ne doit contenir que des chiffres.")
         if len(v) not in [9, 14]:
             raise ValueError("Merci de saisir un numéro SIREN (9 chiffres) ou SIRET (14 chiffres).")
-        return v
\ No newline at end of file
+        return v
+
+
+class SiretLotRequest(BaseModel):
+    numeros: List[str] = Field(..., min_length=1)  # SIRET ou SIREN, validés ligne à ligne par le traitement
@@ -1,10 +1,32 @@
+import os
 import pandas as pd
-from time import sleep
-from app.services.service_qpv import verif_qpv  # Adapte ce chemin si nécessaire
+from app.services.service_qpv_batch import COLONNES_RESULTAT, traiter_colonne_qpv, trouver_colonne_adresse
+from app.services.service_qpv_flux import recherche_groupqpv_flux
+from app.services.service_jobs import enregistrer_type_job
+from app.config import FICHIERS_DIR, get_base_url, settings
+from app.utils.progression import Progression
 from fastapi import  Request
+from typing import Optional
+
+async def recherche_groupqpv(input_path: str, output_path: str, file_type:str , request: Optional[Request] = None, mode: str = "bulk", flux: bool = None,
+                             base_url: Optional[str] = None, progression: Optional[Progression] = None):
+    """
+    Ajoute les colonnes QPV à un fichier d'adresses.
+
+    mode="bulk"     : géocodage de toute la colonne via /search/csv/ (par lots), puis QPV en parallèle
+    mode="unitaire" : un appel /search/ par ligne, en parallèle sous limite de débit
+    flux            : traitement par lots avec reprise (par défaut au-delà de QPV_FLUX_SEUIL_OCTETS)
+
+    Les adresses répétées ne sont évaluées qu'une fois ; retourne les statistiques
+    de déduplication. Hors requête HTTP (worker de jobs), passer `base_url` à la place de `request`.
+    """
+    if flux is None:
+        flux = os.path.getsize(input_path) > settings.QPV_FLUX_SEUIL_OCTETS
+    if flux:
+        return await recherche_groupqpv_flux(
+            input_path, output_path, file_type, request, mode, base_url=base_url, progression=progression
+        )
 
-async def recherche_groupqpv(input_path: str, output_path: str, file_type:str , request: Request):
-    
     # 📥 Lire le fichier
     if file_type == "xlsx":
         df = pd.read_excel(input_path)
@@ -13,51 +35,24 @@ async def recherche_groupqpv(input_path: str, output_path: str, file_type:str ,
     else:
         raise ValueError("❌ Format de fichier non supporté.")
 
-    
+
     # 📌 Vérification de la colonne d’adresse
-    possible_columns = ["Adresse complete"]
-    adresse_col = next((col for col in df.columns if col.strip().lower() in [c.lower() for c in possible_columns]), None)
+    adresse_col = trouver_colonne_adresse(df.columns)
 
     if not adresse_col:
         raise ValueError("❌ Le fichier doit contenir une colonne intitulée 'Adresse' ou 'Adresse complete'.")
 
-    # Ajouter les colonnes de résultat
-    df["nom_qpv"] = ""
-    df["carte_qpv"] = ""
-    df["distance_qpv_en_metre"] = ""
+    base_url = base_url or get_base_url(request)
+    if progression is not None:
+        progression.definir_total(len(df))
 
-    # Traiter chaque ligne
-    for index, row in df.iterrows():
-        payload = {
-            "address": row["Adresse complete"]
-        }
-        address = str(payload.get("address")) if payload.get("address") is not None else ""
-        try:
-            print(f"🔍 Envoi du payload à verif_qpv : {payload}")
+    # ⚙️ Traitement parallèle des adresses uniques (résultats dans l'ordre du fichier)
+    resultats, statistiques = await traiter_colonne_qpv(df[adresse_col], base_url, mode, progression)
+    df[COLONNES_RESULTAT] = resultats
 
-            # 🔒 Vérification de la qualité du champ avant appel API
-            if (
-                not address or
-                len(address) < 5 or
-                len(address.split()) < 3
-            ) :
-                continue
-                
-            result = await verif_qpv(payload, request)  # appel direct à la fonction
-            
-
-            if result is None:
-                raise ValueError(f"⚠️ Aucun résultat pour l'adresse : {payload['address']}")
-            
-            df.at[index, "nom_qpv"] = result.get("nom_qp", "")
-            df.at[index, "carte_qpv"] = result.get("carte", "")
-            df.at[index, "distance_qpv_en_metre"] = result.get("distance_m", "")
-
-        except Exception as e:
-            print(f"❌ Erreur ligne {index+1} : {e}")
-            break  
-
-        sleep(1)  # pause facultative
+    nb_erreurs = int(df["statut_qpv"].str.startswith("erreur").sum())
+    print(f"📊 {len(df)} lignes traitées ({statistiques['adresses_uniques']} adresses uniques, "
+          f"taux de déduplication {statistiques['taux_deduplication']:.0%}), {nb_erreurs} en erreur")
 
     # 💾 Sauvegarder les résultats
      # 💾 Export
@@ -66,4 +61,21 @@ async def recherche_groupqpv(input_path: str, output_path: str, file_type:str ,
     else:
         df.to_csv(output_path, index=False)
 
-    print(f"✅ Fichier avec résultats enregistré à : {output_path}")
\ No newline at end of file
+    print(f"✅ Fichier avec résultats enregistré à : {output_path}")
+    return statistiques
+
+@enregistrer_type_job("qpv_groupe")
+async def job_recherche_groupqpv(job_id: str, parametres: dict, progression: Progression) -> str:
+    """Exécution de check_groupeqpv par le worker de jobs ; retourne le nom du fichier de résultats."""
+    file_type = parametres["file_type"]
+    nom_sortie = f"resultats_qpv_{job_id}.{file_type}"
+    await recherche_groupqpv(
+        parametres["input_path"],
+        os.path.join(FICHIERS_DIR, nom_sortie),
+        file_type,
+        mode=parametres.get("mode", "bulk"),
+        base_url=parametres["base_url"],
+        progression=progression,
+    )
+    os.remove(parametres["input_path"])
+    return nom_sortie
@@ -0,0 +1,117 @@
+"""
+Rendu statique des cartes QPV en PNG avec Pillow (sans navigateur).
+
+Le polygone du QPV et le point de l'adresse sont projetés en Web Mercator puis
+cadrés sur un canevas de taille fixe. On dessine le remplissage du polygone, le
+marqueur, une échelle et le cartouche d'information.
+"""
+import math
+from typing import Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+LARGEUR = 800
+HAUTEUR = 600
+MARGE = 60
+RAYON_TERRE = 6378137
+FENETRE_MIN_M = 800  # Étendue minimale affichée autour de l'adresse
+
+COULEUR_FOND = (238, 240, 242)
+COULEUR_GRILLE = (225, 228, 232)
+COULEUR_QPV = (173, 216, 230, 150)  # lightblue, comme la carte folium
+COULEUR_CONTOUR = (0, 0, 255)
+COULEUR_MARQUEUR = (214, 39, 40)
+
+
+def _police(taille: int):
+    try:
+        return ImageFont.load_default(size=taille)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def projeter(lon: float, lat: float) -> tuple:
+    """Web Mercator (EPSG:3857), en mètres projetés."""
+    x = RAYON_TERRE * math.radians(lon)
+    y = RAYON_TERRE * math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+    return x, y
+
+
+def generer_carte_png(
+    chemin_png: str,
+    lat: float,
+    lon: float,
+    anneau: Optional[list] = None,
+    lignes_info: Optional[list] = None,
+):
+    """
+    Écrit la carte PNG de l'adresse (lat, lon) et, s'il est fourni, du contour
+    du QPV `anneau` (liste de [lon, lat]).
+    """
+    point = projeter(lon, lat)
+    contour = [projeter(x, y) for x, y in anneau] if anneau else []
+
+    # Cadrage : emprise du polygone et du point, avec une étendue minimale
+    echelle_sol = math.cos(math.radians(lat))  # mètres au sol par mètre projeté
+    demi_fenetre = FENETRE_MIN_M / 2 / echelle_sol
+    xs = [p[0] for p in contour] + [point[0] - demi_fenetre, point[0] + demi_fenetre]
+    ys = [p[1] for p in contour] + [point[1] - demi_fenetre, point[1] + demi_fenetre]
+    xmin, xmax, ymin, ymax = min(xs), max(xs), min(ys), max(ys)
+
+    echelle = min((LARGEUR - 2 * MARGE) / (xmax - xmin), (HAUTEUR - 2 * MARGE) / (ymax - ymin))
+    centre_x, centre_y = (xmin + xmax) / 2, (ymin + ymax) / 2
+
+    def en_pixels(p):
+        return (
+            LARGEUR / 2 + (p[0] - centre_x) * echelle,
+            HAUTEUR / 2 - (p[1] - centre_y) * echelle,
+        )
+
+    image = Image.new("RGBA", (LARGEUR, HAUTEUR), COULEUR_FOND + (255,))
+    draw = ImageDraw.Draw(image)
+
+    for x in range(0, LARGEUR, 50):
+        draw.line([(x, 0), (x, HAUTEUR)], fill=COULEUR_GRILLE, width=1)
+    for y in range(0, HAUTEUR, 50):
+        draw.line([(0, y), (LARGEUR, y)], fill=COULEUR_GRILLE, width=1)
+
+    # Polygone du QPV (remplissage semi-transparent puis contour)
+    if len(contour) > 2:
+        pixels = [en_pixels(p) for p in contour]
+        calque = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        ImageDraw.Draw(calque).polygon(pixels, fill=COULEUR_QPV)
+        image = Image.alpha_composite(image, calque)
+        draw = ImageDraw.Draw(image)
+        draw.line(pixels + [pixels[0]], fill=COULEUR_CONTOUR, width=3, joint="curve")
+
+    # Marqueur de l'adresse (épingle)
+    px, py = en_pixels(point)
+    draw.polygon([(px - 7, py - 14), (px + 7, py - 14), (px, py)], fill=COULEUR_MARQUEUR)
+    draw.ellipse([px - 10, py - 32, px + 10, py - 12], fill=COULEUR_MARQUEUR, outline="white", width=2)
+    draw.ellipse([px - 3, py - 25, px + 3, py - 19], fill="white")
+
+    # Échelle (en bas à droite)
+    metres_par_pixel = echelle_sol / echelle
+    longueur_m = next(
+        (m for m in (50, 100, 200, 300, 500, 1000, 2000, 5000) if m / metres_par_pixel >= 80),
+        10000
+    )
+    longueur_px = longueur_m / metres_par_pixel
+    x1, y1 = LARGEUR - 20, HAUTEUR - 25
+    draw.line([(x1 - longueur_px, y1), (x1, y1)], fill="black", width=3)
+    draw.text((x1 - longueur_px, y1 - 18), f"{longueur_m} m", fill="black", font=_police(12))
+
+    # Cartouche d'information (en haut à gauche)
+    if lignes_info:
+        police = _police(14)
+        hauteur_ligne = 20
+        largeur_texte = max(draw.textlength(ligne, font=police) for ligne in lignes_info)
+        cadre = [10, 10, 10 + largeur_texte + 20, 10 + hauteur_ligne * len(lignes_info) + 16]
+        calque = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        ImageDraw.Draw(calque).rounded_rectangle(cadre, radius=5, fill=(255, 255, 255, 210))
+        image = Image.alpha_composite(image, calque)
+        draw = ImageDraw.Draw(image)
+        for i, ligne in enumerate(lignes_info):
+            draw.text((20, 18 + i * hauteur_ligne), ligne, fill="black", font=police)
+
+    image.convert("RGB").save(chemin_png, "PNG")
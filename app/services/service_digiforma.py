@@ -1,213 +1,181 @@
-import requests
-from fastapi import HTTPException, Request
-import pandas as pd
-from app.config import settings
+import asyncio
+import base64
+import csv
+import hashlib
+import hmac
+import io
 import time
-from datetime import date
 import zipfile
-import os
-
-from app.config import get_base_url, FICHIERS_DIR
-from app.config import settings
-from app.schemas.schema_digiforma import DigiformaInput
-from app.utils.file_encoded import encode_file_to_base64
-
-DIGIFORMA_GRAPHQL_URL = "https://app.digiforma.com/api/v1/graphql"
-
-def digiforma_graphql_post(query: str, timeout: int = 50, debug: bool = False) -> dict:
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {settings.DIGIFORMA_API_KEY}"
-    }
+from datetime import date
+from typing import AsyncIterator, Optional
 
-    payload = {"query": query}
+import httpx
+from fastapi import HTTPException, Request
 
+from app.config import get_base_url, settings
+from app.schemas.schema_digiforma import DigiformaInput
+from app.services.service_digiforma_sync import (
+    COLONNES_EXPORT_INSCRIPTIONS, COLONNES_EXPORT_SESSIONS,
+    lignes_export_inscriptions, lignes_export_sessions, synchroniser_digiforma
+)
+from app.utils import metrics
+
+NOM_ZIP = "exported_files.zip"
+URL_EXPORT = "/api-mca/v1/digiforma/export"
+TAILLE_BLOC_ZIP = 64 * 1024  # Octets compressés accumulés avant d'être envoyés au client
+
+# Dernier export construit : {"contenu": octets du ZIP, "etag": empreinte du contenu, "genere_le": timestamp}
+_export: Optional[dict] = None
+_reconstruction: Optional[asyncio.Task] = None
+_reconstruction_complete = False
+
+
+class _SortieZip:
+    """Flux d'écriture non positionnable : zipfile y écrit, le générateur vide les octets produits."""
+
+    def __init__(self):
+        self._tampon = io.BytesIO()
+
+    def write(self, donnees: bytes) -> int:
+        return self._tampon.write(donnees)
+
+    def flush(self):
+        pass
+
+    def taille(self) -> int:
+        return self._tampon.tell()
+
+    def vider(self) -> bytes:
+        donnees = self._tampon.getvalue()
+        self._tampon = io.BytesIO()
+        return donnees
+
+
+async def flux_zip_digiforma() -> AsyncIterator[bytes]:
+    """ZIP des deux CSV, produit au fil de la lecture des tables locales, sans fichier intermédiaire."""
+    entrees = [
+        ("df_customer_trainees_data.csv", COLONNES_EXPORT_INSCRIPTIONS, lignes_export_inscriptions()),
+        ("df_sessions.csv", COLONNES_EXPORT_SESSIONS, lignes_export_sessions(date(date.today().year, 1, 1))),
+    ]
+    sortie = _SortieZip()
+    with zipfile.ZipFile(sortie, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for nom, colonnes, lignes in entrees:
+            with zipf.open(nom, "w") as entree:
+                texte = io.TextIOWrapper(entree, encoding="utf-8", newline="")
+                writer = csv.writer(texte)
+                writer.writerow(colonnes)
+                async for ligne in lignes:
+                    writer.writerow(ligne)
+                    if sortie.taille() >= TAILLE_BLOC_ZIP:
+                        texte.flush()
+                        yield sortie.vider()
+                texte.flush()
+                texte.detach()  # L'entrée est fermée par le bloc with, pas par le TextIOWrapper
+    yield sortie.vider()
+
+
+async def construire_export(complete: bool = False, apres: Optional[asyncio.Task] = None) -> dict:
+    """
+    Synchronise Digiforma (toute l'année si `complete`), construit le ZIP en
+    mémoire et remplace l'export en cache. `apres` : reconstruction en cours à
+    laisser terminer d'abord.
+    """
+    global _export
+    if apres is not None:
+        await asyncio.wait([apres])
+    await synchroniser_digiforma(complete=complete)
+    contenu = io.BytesIO()
+    with metrics.chronometrer("digiforma.export.construction"):
+        async for bloc in flux_zip_digiforma():
+            contenu.write(bloc)
+    donnees = contenu.getvalue()
+    etag = f'"{hashlib.sha256(donnees).hexdigest()[:32]}"'
+    if _export is not None and _export["etag"] == etag:
+        print("✅ Export Digiforma reconstruit : contenu inchangé")
+    _export = {"contenu": donnees, "etag": etag, "genere_le": time.time()}
+    return _export
+
+
+def _journaliser_echec(tache: asyncio.Task):
+    if not tache.cancelled() and tache.exception() is not None:
+        print(f"⚠️ Reconstruction de l'export Digiforma impossible : {str(tache.exception())}")
+
+
+def _lancer_reconstruction(complete: bool = False) -> asyncio.Task:
+    """
+    Une seule reconstruction à la fois : les appels simultanés attendent la même
+    tâche. Une reconstruction complète demandée pendant une reconstruction
+    incrémentale est enchaînée après elle.
+    """
+    global _reconstruction, _reconstruction_complete
+    en_cours = _reconstruction is not None and not _reconstruction.done()
+    if en_cours and (_reconstruction_complete or not complete):
+        return _reconstruction
+    _reconstruction = asyncio.create_task(construire_export(complete, apres=_reconstruction if en_cours else None))
+    _reconstruction.add_done_callback(_journaliser_echec)
+    _reconstruction_complete = complete
+    return _reconstruction
+
+
+def export_frais() -> bool:
+    return _export is not None and time.time() - _export["genere_le"] < settings.DIGIFORMA_EXPORT_FRAICHEUR_MIN * 60
+
+
+async def obtenir_export(forcer: bool = False) -> dict:
+    """
+    Export en cache s'il a moins de DIGIFORMA_EXPORT_FRAICHEUR_MIN minutes, sinon
+    reconstruit. `forcer=True` lance en arrière-plan une reconstruction avec
+    relecture complète de l'année et sert l'export existant (attend la
+    reconstruction s'il n'y en a pas encore).
+    """
+    if forcer:
+        metrics.incrementer("digiforma.export.rafraichissement_force")
+        tache = _lancer_reconstruction(complete=True)
+        return _export if _export is not None else await asyncio.shield(tache)
+    if export_frais():
+        metrics.incrementer("digiforma.export.cache_hit")
+        return _export
+    metrics.incrementer("digiforma.export.cache_miss")
+    return await asyncio.shield(_lancer_reconstruction())
+
+
+def jeton_export(validite_minutes: int = None) -> str:
+    """Lien de téléchargement signé (HMAC de la date d'expiration), valable quelques minutes."""
+    expire = int(time.time()) + 60 * (validite_minutes or settings.DIGIFORMA_LIEN_VALIDITE_MIN)
+    signature = hmac.new(settings.SECRET_KEY.encode(), str(expire).encode(), hashlib.sha256).hexdigest()
+    return f"{expire}.{signature}"
+
+
+def verifier_jeton_export(jeton: str) -> bool:
+    expire, _, signature = jeton.partition(".")
+    if not expire.isdigit() or int(expire) < time.time():
+        return False
+    attendue = hmac.new(settings.SECRET_KEY.encode(), expire.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, attendue)
+
+
+async def extract_digiforma_data(data: DigiformaInput, request: Request, avec_base64: bool = False):
+    """
+    📌 Retourne un lien signé vers le ZIP des CSV (export en cache, voir obtenir_export).
+    Le contenu base64 du ZIP n'est ajouté que si `avec_base64` est demandé.
+    """
     try:
-        response = requests.post(DIGIFORMA_GRAPHQL_URL, json=payload, headers=headers, timeout=timeout)
-        if debug:
-            print(f"✅ [DEBUG] Digiforma response status: {response.status_code}")
-
-        response.raise_for_status()
-        result = response.json()
+        # ✅ Export en cache, ou synchronisation incrémentale puis construction du ZIP
+        export = await obtenir_export(forcer=data.forcer_rafraichissement)
 
-        if "errors" in result:
-            raise HTTPException(status_code=500, detail=f"❌ Erreur Digiforma : {result['errors'][0]['message']}")
+        zip_content_base64 = base64.b64encode(export["contenu"]).decode("utf-8") if avec_base64 else ""
 
-        return result.get("data", {})
-
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur de connexion à Digiforma : {str(e)}")
-
-async def extract_digiforma_data(data: DigiformaInput,request:Request):
-    """ 📌 Récupère les données de Digiforma et retourne un fichier ZIP contenant les CSV """
-    start_date = date.today().strftime("%Y-01-01")
-    try:
-        
-        query_test =  f""" 
-            query {{ trainingSessions(filters: {{ startedAfter: "{start_date}" }})
-                {{
-                    id 
-                }}
-            }}"""    
-
-        test_response = digiforma_graphql_post(query_test, debug=True)
-        print("✅ DEBUG Test connexion réussi")
-        
-        # ✅ Requêtes GraphQL
-        query_all_Session = f""" 
-            query {{ trainingSessions(filters: {{ startedAfter: "{start_date}" }})
-                {{
-                    id name code pipelineState program {{ name trainingType  }}
-                    trainees {{ firstname lastname civility handicaped grades{{scoreResult}} }}
-                    dates {{ date endTime startTime  }}endDate
-                    evaluationScore {{ totalScores {{ evaluationType score  }} }}
-                 }}
-            }}"""
-       
-        # ✅ Requête sessions
-        dataSession = digiforma_graphql_post(query_all_Session, debug=True)
-
-        # ✅ Vérification de la structure JSON
-        if "trainingSessions" in dataSession:
-            sessions = dataSession["trainingSessions"]
-        else:
-            raise HTTPException(status_code=500, detail="❌ Erreur : Structure de réponse incorrecte.")
-
-        # ✅ Structuration des sessions
-        sessions_data = []
-        for session in sessions:
-            data_ord = sorted(session["dates"], key=lambda d: d["date"])
-            sessions_data.append({
-                "Date de mise à jour": date.today(),
-                "Id_session": session["id"],
-                "Libelle session": session["name"],
-                "Code": session["code"],
-                "Pipeline": session["pipelineState"],
-                "Programme": session["program"]["name"] if session.get("program") else "",
-                "Date début": data_ord[0]["date"] if data_ord else None,
-                "Date fin": session["endDate"],
-                "Total score": next((round(ev["score"],2) for ev in session.get("evaluationScore", [{}])[0].get("totalScores", []) if ev["evaluationType"] == "TOTAL"), 0.0),
-                "Total PRE": next((round(ev["score"],2) for ev in session.get("evaluationScore", [{}])[0].get("totalScores", []) if ev["evaluationType"] == "PRE"), 0.0),
-                "Total HOT": next((round(ev["score"],2) for ev in session.get("evaluationScore", [{}])[0].get("totalScores", []) if ev["evaluationType"] == "HOT"), 0.0),
-                "Total COLD": next((round(ev["score"],2) for ev in session.get("evaluationScore", [{}])[0].get("totalScores", []) if ev["evaluationType"] == "COLD"), 0.0),
-                "Apprenants": ", ".join([f"{tr['firstname']} {tr['lastname']}" for tr in session.get("trainees", [])])
-            })
-
-        # ✅ Requête trainees (Pause pour éviter le throttling)
-        time.sleep(5)
-
-        query_all_Trainee = """ 
-            query { customers {
-                customerTrainees {
-                    trainee { id civility firstname lastname handicaped }         
-                    passed sessionCompletion signatures {
-                        signature type dates { date slot subsession { name id } }
-                    }
-                }               
-                trainingSession { id name code }
-            }}
-        """   
-        dataCustomers = digiforma_graphql_post(query_all_Trainee, debug=True) 
-
-        if "customers" in dataCustomers:
-            customers = dataCustomers["customers"]
-        else:
-            raise HTTPException(status_code=500, detail="❌ Erreur : Structure de réponse incorrecte.")
-
-        # ✅ Extraction des trainees
-        customer_trainees_data = []
-        for customer in customers:  # Parcourir chaque client
-            trainingSession = customer.get("trainingSession", {})  # Récupérer la session
-            session_id = trainingSession.get("id", "")
-            session_name = trainingSession.get("name", "")
-            session_code = trainingSession.get("code", "")
-
-            for trainee in customer.get("customerTrainees", []):  # Parcourir chaque trainee
-                T = trainee.get("trainee", {})  # Récupérer trainee info
-
-                # Vérifier s'il y a des signatures et des dates associées
-                if "signatures" in trainee and trainee["signatures"]:
-                    for signature in trainee["signatures"]:
-                        for date_info in signature.get("dates", []):
-                            customer_trainees_data.append({
-                                "Date de mise à jour": date.today(),
-                                "Id_session": session_id,
-                                "Nom_session": session_name,
-                                "Code_session": session_code,
-                                "Id_trainee": T.get("id", ""),
-                                "Civility": T.get("civility", ""),
-                                "Nom Trainee": T.get("lastname", ""),
-                                "Prénom Trainee": T.get("firstname", ""),
-                                "Handicapé": T.get("handicaped", False),
-                                "Réussite": trainee.get("passed", False),
-                                "Completion Session": trainee.get("sessionCompletion", 0),
-                                "Signature": signature.get("signature", ""),
-                                "Type Signature": signature.get("type", ""),
-                                "Date Signature": date_info.get("date", ""),
-                                "Slot Signature": date_info.get("slot", ""),
-                                "Sous-session": date_info.get("subsession", {}).get("name", ""),
-                                "Id Sous-session": date_info.get("subsession", {}).get("id", ""),
-                            })
-                else:
-                    # Ajouter une ligne même s'il n'y a pas de signature
-                    customer_trainees_data.append({
-                        "Date de mise à jour": date.today(),
-                        "Id_session": session_id,
-                        "Nom_session": session_name,
-                        "Code_session": session_code,
-                        "Id_trainee": T.get("id", ""),
-                        "Civility": T.get("civility", ""),
-                        "Nom Trainee": T.get("lastname", ""),
-                        "Prénom Trainee": T.get("firstname", ""),
-                        "Handicapé": T.get("handicaped", False),
-                        "Réussite": trainee.get("passed", False),
-                        "Completion Session": trainee.get("sessionCompletion", 0),
-                        "Signature": "",
-                        "Type Signature": "",
-                        "Date Signature": "",
-                        "Slot Signature": "",
-                        "Sous-session": "",
-                        "Id Sous-session": "",
-                    })
-        # ✅ Création des DataFrames
-        df_customers = pd.DataFrame(customer_trainees_data)
-        df_sessions = pd.DataFrame(sessions_data)
-
-        # ✅ Sauvegarde en CSV
-        customer_file = "df_customer_trainees_data.csv"
-        session_file = "df_sessions.csv"
-
-        df_customers.to_csv(customer_file, index=False)
-        df_sessions.to_csv(session_file, index=False)
-
-        # ✅ Création du ZIP
-        zip_url = os.path.join(FICHIERS_DIR, "exported_files.zip")
-
-        with zipfile.ZipFile(zip_url, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(customer_file)
-            zipf.write(session_file)
-
-         # Vérifie si l’image existe avant d’essayer de l’encoder
-        if os.path.exists(zip_url):
-            zip_content_base64 = encode_file_to_base64(zip_url)
-        else:
-            zip_content_base64 = None  # Si l’image n’existe pas
-
-        # ✅ Suppression des fichiers CSV après création du ZIP
-        os.remove(customer_file)
-        os.remove(session_file)
-        
         base_url = get_base_url(request)  # Récupérer l'URL dynamique
-        
-        # ✅ Retour du fichier ZIP à Power Automate
-        # ✅ Réponse JSON contenant la base64 du ZIP
+
+        # ✅ Réponse JSON : lien de téléchargement (et base64 du ZIP pour Power Automate si demandé)
         return {
-        "filename": "exported_files.zip",
-        "download_url": f"{base_url}/fichiers/exported_files.zip",
-        "content_base64": zip_content_base64
+            "filename": NOM_ZIP,
+            "download_url": f"{base_url}{URL_EXPORT}/{jeton_export()}",
+            "content_base64": zip_content_base64,
+            "etag": export["etag"]
         }
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Erreur de connexion à Digiforma : {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"❌ Erreur interne : {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"❌ Erreur interne : {str(e)}")
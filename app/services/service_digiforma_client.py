@@ -0,0 +1,91 @@
+"""
+Client GraphQL Digiforma : requêtes via le client HTTP partagé (pool de
+connexions, délais, retries 429/5xx avec jitter) sous une limite de débit
+commune, et pagination des listes par vagues de pages demandées en parallèle.
+"""
+import asyncio
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.http_client import requete
+from app.utils.rate_limiter import TokenBucket
+
+DIGIFORMA_GRAPHQL_URL = "https://app.digiforma.com/api/v1/graphql"
+
+# Débit partagé par toutes les requêtes GraphQL vers Digiforma
+limiteur_digiforma = TokenBucket(settings.DIGIFORMA_REQ_PAR_SEC)
+
+REQUETE_SESSIONS = """
+    query { trainingSessions(filters: { startedAfter: "__DEBUT__" }, __PAGINATION__)
+        {
+            id name code pipelineState program { name trainingType  }
+            trainees { firstname lastname civility handicaped grades{scoreResult} }
+            dates { date endTime startTime  }endDate
+            evaluationScore { totalScores { evaluationType score  } }
+         }
+    }"""
+
+REQUETE_CLIENTS = """
+    query { customers(__PAGINATION__) {
+        id
+        customerTrainees {
+            trainee { id civility firstname lastname handicaped }
+            passed sessionCompletion signatures {
+                signature type dates { date slot subsession { name id } }
+            }
+        }
+        trainingSession { id name code }
+    }}
+"""
+
+
+async def digiforma_graphql_post(query: str, debug: bool = False) -> dict:
+    """Requête GraphQL via le client HTTP partagé (pool, timeouts, retries 429/5xx) sous limite de débit."""
+    headers = {"Authorization": f"Bearer {settings.DIGIFORMA_API_KEY}"}
+    await limiteur_digiforma.acquerir()
+    with metrics.chronometrer("digiforma.requete"):
+        response = await requete(
+            "POST", DIGIFORMA_GRAPHQL_URL, json={"query": query}, headers=headers,
+            timeout=settings.DIGIFORMA_TIMEOUT_SEC,
+        )
+    if debug:
+        print(f"✅ [DEBUG] Digiforma response status: {response.status_code}")
+
+    response.raise_for_status()
+    result = response.json()
+
+    if "errors" in result:
+        raise HTTPException(status_code=500, detail=f"❌ Erreur Digiforma : {result['errors'][0]['message']}")
+
+    return result.get("data", {})
+
+
+async def recuperer_pages(champ: str, gabarit: str, taille_page: Optional[int] = None) -> list:
+    """
+    Récupère toute la liste `champ` page par page. Les pages sont demandées par
+    vagues de DIGIFORMA_CONCURRENCE requêtes simultanées ; la première page
+    incomplète marque la fin de la liste. L'ordre des éléments est conservé.
+    """
+    taille_page = taille_page or settings.DIGIFORMA_TAILLE_PAGE
+    concurrence = settings.DIGIFORMA_CONCURRENCE
+
+    async def page(numero: int) -> list:
+        query = gabarit.replace("__PAGINATION__", f"pagination: {{ page: {numero}, size: {taille_page} }}")
+        data = await digiforma_graphql_post(query)
+        if champ not in data:
+            raise HTTPException(status_code=500, detail="❌ Erreur : Structure de réponse incorrecte.")
+        return data[champ] or []
+
+    elements = []
+    debut = 0
+    while True:
+        pages = await asyncio.gather(*(page(n) for n in range(debut, debut + concurrence)))
+        for contenu in pages:
+            elements.extend(contenu)
+            if len(contenu) < taille_page:
+                print(f"📄 Digiforma {champ} : {len(elements)} éléments")
+                return elements
+        debut += concurrence
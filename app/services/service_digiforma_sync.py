@@ -0,0 +1,303 @@
+"""
+Synchronisation incrémentale de Digiforma dans les tables locales
+(digiforma_sessions, digiforma_inscriptions, digiforma_signatures).
+
+- Sessions : le filtre Digiforma `startedAfter` est ramené au début de la plus
+  ancienne session encore ouverte lors de la dernière synchronisation (moins
+  DIGIFORMA_SYNC_MARGE_JOURS) ; les sessions terminées avant ne sont plus
+  téléchargées. Pour rattraper leurs modifications tardives (évaluations COLD,
+  annulations...), toute l'année est relue au moins toutes les
+  DIGIFORMA_SYNC_COMPLETE_HEURES, au premier passage de l'année, et quand
+  `complete=True` (rafraîchissement forcé de l'export). Les sessions sans date
+  font partie de chaque fenêtre.
+- Inscriptions et signatures : l'API n'offre pas de filtre de date sur
+  `customers`, la liste est relue puis comparée par identifiant et empreinte ;
+  seules les inscriptions nouvelles, modifiées ou disparues sont écrites.
+  L'identifiant d'une inscription est "<session>:<client>:<apprenant>", suffixé
+  de sa position quand l'apprenant n'a pas d'identifiant ou apparaît deux fois.
+
+Le point de reprise (high-water mark) de chaque entité est conservé dans
+digiforma_sync_etat. L'export CSV est ensuite lu en flux depuis ces tables, en
+une requête par fichier.
+"""
+import asyncio
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.models import DigiformaInscription, DigiformaSession, DigiformaSignature, DigiformaSyncEtat
+from app.services.service_digiforma_client import REQUETE_CLIENTS, REQUETE_SESSIONS, recuperer_pages
+from app.utils import metrics
+
+TAILLE_LOT_ECRITURE = 500
+
+COLONNES_EXPORT_SESSIONS = [
+    "Date de mise à jour", "Id_session", "Libelle session", "Code", "Pipeline", "Programme",
+    "Date début", "Date fin", "Total score", "Total PRE", "Total HOT", "Total COLD", "Apprenants",
+]
+COLONNES_EXPORT_INSCRIPTIONS = [
+    "Date de mise à jour", "Id_session", "Nom_session", "Code_session", "Id_trainee", "Civility",
+    "Nom Trainee", "Prénom Trainee", "Handicapé", "Réussite", "Completion Session", "Signature",
+    "Type Signature", "Date Signature", "Slot Signature", "Sous-session", "Id Sous-session",
+]
+
+
+COLONNES_SIGNATURE = ("signature", "type", "date", "creneau", "sous_session", "id_sous_session")
+TYPES_EVALUATION = {"TOTAL": "total_score", "PRE": "total_pre", "HOT": "total_hot", "COLD": "total_cold"}
+
+
+def empreinte(valeurs) -> str:
+    """Empreinte de valeurs dans un ordre de colonnes fixe (listes / tuples, sans tri de clés)."""
+    return hashlib.sha256(json.dumps(valeurs, default=str, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _date(valeur) -> Optional[date]:
+    return date.fromisoformat(str(valeur)[:10]) if valeur else None
+
+
+def _scores(session: dict) -> dict:
+    """{colonne: score arrondi} en un seul parcours de evaluationScore (premier score de chaque type)."""
+    scores = (session.get("evaluationScore") or [{}])[0].get("totalScores") or []
+    trouves = {ev["evaluationType"]: round(ev["score"], 2) for ev in reversed(scores)}
+    return {colonne: trouves.get(type_evaluation, 0.0) for type_evaluation, colonne in TYPES_EVALUATION.items()}
+
+
+def ligne_session(session: dict) -> dict:
+    """Ligne de digiforma_sessions à partir d'une trainingSession Digiforma."""
+    premiere_date = min((d["date"] for d in session.get("dates") or []), default=None)
+    ligne = {
+        "id": str(session["id"]),
+        "nom": session.get("name"),
+        "code": session.get("code"),
+        "pipeline": session.get("pipelineState"),
+        "programme": session["program"]["name"] if session.get("program") else "",
+        "date_debut": _date(premiere_date),
+        "date_fin": _date(session.get("endDate")),
+        **_scores(session),
+        "apprenants": ", ".join(f"{tr['firstname']} {tr['lastname']}" for tr in session.get("trainees") or []),
+    }
+    ligne["empreinte"] = empreinte(list(ligne.values()))
+    return ligne
+
+
+def lignes_inscriptions(customers: list) -> list:
+    """
+    [(ligne de digiforma_inscriptions, [signatures])] à partir des customers, en un
+    parcours. Les signatures restent des tuples aux colonnes COLONNES_SIGNATURE :
+    elles ne servent qu'à l'empreinte, sauf pour les inscriptions modifiées
+    (voir lignes_signatures).
+    """
+    resultats = {}
+    for customer in customers:
+        session = customer.get("trainingSession") or {}
+        session_id, nom_session, code_session = session.get("id"), session.get("name"), session.get("code")
+        for position, inscrit in enumerate(customer.get("customerTrainees") or []):
+            apprenant = inscrit.get("trainee") or {}
+            trainee_id = apprenant.get("id")
+            cle = f"{session_id or ''}:{customer.get('id') or ''}:{trainee_id or ''}"
+            if not trainee_id or cle in resultats:
+                cle = f"{cle}#{position}"
+            ligne = {
+                "id": cle,
+                "session_id": session_id,
+                "nom_session": nom_session,
+                "code_session": code_session,
+                "trainee_id": trainee_id,
+                "civilite": apprenant.get("civility"),
+                "nom": apprenant.get("lastname"),
+                "prenom": apprenant.get("firstname"),
+                "handicape": apprenant.get("handicaped", False),
+                "reussite": inscrit.get("passed", False),
+                "completion": inscrit.get("sessionCompletion", 0),
+            }
+            signatures = [
+                (signature.get("signature"), signature.get("type"), date_info.get("date"), date_info.get("slot"),
+                 *((sous_session.get("name"), sous_session.get("id"))
+                   if (sous_session := date_info.get("subsession")) else (None, None)))
+                for signature in inscrit.get("signatures") or []
+                for date_info in signature.get("dates") or []
+            ]
+            ligne["empreinte"] = empreinte([list(ligne.values()), signatures])
+            resultats[ligne["id"]] = (ligne, signatures)
+    return list(resultats.values())
+
+
+def lignes_signatures(inscriptions: list, ids: set) -> list:
+    """Lignes de digiforma_signatures à insérer pour les inscriptions `ids`."""
+    return [
+        dict(zip(COLONNES_SIGNATURE, signature), inscription_id=ligne["id"])
+        for ligne, signatures in inscriptions if ligne["id"] in ids
+        for signature in signatures
+    ]
+
+
+async def _upsert(db, modele, lignes: list):
+    for debut in range(0, len(lignes), TAILLE_LOT_ECRITURE):
+        lot = lignes[debut:debut + TAILLE_LOT_ECRITURE]
+        stmt = insert(modele).values(lot)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[modele.id],
+            set_={col: stmt.excluded[col] for col in lot[0] if col != "id"},
+        )
+        await db.execute(stmt)
+
+
+async def _fusionner(db, modele, lignes: list, portee=None) -> tuple:
+    """
+    Écrit les lignes dont l'empreinte a changé et supprime les identifiants
+    absents (dans la `portee` relue). Retourne (ids modifiés, nombre supprimé).
+    """
+    requete = select(modele.id, modele.empreinte)
+    if portee is not None:
+        requete = requete.where(portee)
+    existantes = dict((await db.execute(requete)).all())
+
+    maintenant = datetime.utcnow()
+    modifiees = [{**l, "synchronise_le": maintenant} for l in lignes if existantes.get(l["id"]) != l["empreinte"]]
+    await _upsert(db, modele, modifiees)
+
+    disparues = list(set(existantes) - {l["id"] for l in lignes})
+    for debut in range(0, len(disparues), TAILLE_LOT_ECRITURE):
+        await db.execute(delete(modele).where(modele.id.in_(disparues[debut:debut + TAILLE_LOT_ECRITURE])))
+    return [l["id"] for l in modifiees], len(disparues)
+
+
+def _portee_sessions(debut: date):
+    """Sessions relues par une synchronisation démarrant à `debut` (les sessions sans date en font partie)."""
+    return or_(DigiformaSession.date_debut >= debut, DigiformaSession.date_debut.is_(None))
+
+
+async def _debut_fenetre_sessions(db, complete: bool) -> tuple:
+    """
+    (début de la fenêtre, relecture complète ?) : 1er janvier si une relecture
+    complète est due, sinon high-water mark = plus ancienne session encore
+    ouverte à la dernière synchronisation.
+    """
+    debut_annee = date(date.today().year, 1, 1)
+    etat = await db.get(DigiformaSyncEtat, "sessions")
+    etat_complete = await db.get(DigiformaSyncEtat, "sessions_complete")
+    if (
+        complete or etat is None or etat_complete is None
+        or etat_complete.derniere_synchro.date() < debut_annee
+        or datetime.utcnow() - etat_complete.derniere_synchro > timedelta(hours=settings.DIGIFORMA_SYNC_COMPLETE_HEURES)
+    ):
+        return debut_annee, True
+
+    seuil = (etat.derniere_synchro - timedelta(days=settings.DIGIFORMA_SYNC_MARGE_JOURS)).date()
+    plus_ancienne_ouverte = (await db.execute(
+        select(func.min(DigiformaSession.date_debut)).where(
+            DigiformaSession.date_debut >= debut_annee,
+            or_(DigiformaSession.date_fin.is_(None), DigiformaSession.date_fin >= seuil),
+        )
+    )).scalar()
+    return max(debut_annee, min(plus_ancienne_ouverte or seuil, seuil)), False
+
+
+async def _enregistrer_etat(db, entite: str, filtre: Optional[str], lus: int, modifies: int):
+    stmt = insert(DigiformaSyncEtat).values(
+        entite=entite, derniere_synchro=datetime.utcnow(), filtre=filtre,
+        elements_lus=lus, elements_modifies=modifies,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DigiformaSyncEtat.entite],
+        set_={col: stmt.excluded[col] for col in ("derniere_synchro", "filtre", "elements_lus", "elements_modifies")},
+    )
+    await db.execute(stmt)
+
+
+async def synchroniser_digiforma(complete: bool = False) -> dict:
+    """
+    Met à jour les tables locales depuis Digiforma ; retourne le bilan par entité.
+    `complete=True` relit toutes les sessions de l'année, quel que soit le point de reprise.
+    """
+    async with AsyncSessionLocal() as db:
+        debut, complete = await _debut_fenetre_sessions(db, complete)
+    print(f"🔄 Synchronisation Digiforma{' complète' if complete else ''} : sessions démarrées depuis le {debut}")
+
+    with metrics.chronometrer("digiforma.sync.telechargement"):
+        sessions, customers = await asyncio.gather(
+            recuperer_pages("trainingSessions", REQUETE_SESSIONS.replace("__DEBUT__", debut.isoformat())),
+            recuperer_pages("customers", REQUETE_CLIENTS),
+        )
+
+    lignes_sessions = [ligne_session(s) for s in sessions]
+    inscriptions = lignes_inscriptions(customers)
+
+    async with AsyncSessionLocal() as db:
+        sessions_modifiees, sessions_supprimees = await _fusionner(
+            db, DigiformaSession, lignes_sessions, portee=_portee_sessions(debut)
+        )
+        inscriptions_modifiees, inscriptions_supprimees = await _fusionner(
+            db, DigiformaInscription, [ligne for ligne, _ in inscriptions]
+        )
+
+        # Signatures des inscriptions modifiées : remplacées en bloc
+        modifiees = set(inscriptions_modifiees)
+        for debut_lot in range(0, len(inscriptions_modifiees), TAILLE_LOT_ECRITURE):
+            ids = inscriptions_modifiees[debut_lot:debut_lot + TAILLE_LOT_ECRITURE]
+            await db.execute(delete(DigiformaSignature).where(DigiformaSignature.inscription_id.in_(ids)))
+        signatures = lignes_signatures(inscriptions, modifiees)
+        for debut_lot in range(0, len(signatures), TAILLE_LOT_ECRITURE):
+            await db.execute(insert(DigiformaSignature).values(signatures[debut_lot:debut_lot + TAILLE_LOT_ECRITURE]))
+
+        await _enregistrer_etat(db, "sessions", f"startedAfter={debut}", len(lignes_sessions),
+                                len(sessions_modifiees) + sessions_supprimees)
+        await _enregistrer_etat(db, "inscriptions", None, len(inscriptions),
+                                len(inscriptions_modifiees) + inscriptions_supprimees)
+        if complete:
+            await _enregistrer_etat(db, "sessions_complete", f"startedAfter={debut}", len(lignes_sessions),
+                                    len(sessions_modifiees) + sessions_supprimees)
+        await db.commit()
+
+    bilan = {
+        "complete": complete,
+        "sessions": {"lues": len(lignes_sessions), "modifiees": len(sessions_modifiees), "supprimees": sessions_supprimees},
+        "inscriptions": {"lues": len(inscriptions), "modifiees": len(inscriptions_modifiees), "supprimees": inscriptions_supprimees},
+    }
+    metrics.incrementer("digiforma.sync.sessions_modifiees", len(sessions_modifiees))
+    metrics.incrementer("digiforma.sync.inscriptions_modifiees", len(inscriptions_modifiees))
+    print(f"✅ Synchronisation Digiforma terminée : {bilan}")
+    return bilan
+
+
+async def lignes_export_sessions(depuis: date) -> AsyncIterator[tuple]:
+    """Sessions démarrées depuis `depuis` (puis sans date), aux colonnes de l'export historique, lues en flux."""
+    aujourd_hui = date.today()
+    async with AsyncSessionLocal() as db:
+        res = await db.stream(
+            select(
+                DigiformaSession.id, DigiformaSession.nom, DigiformaSession.code, DigiformaSession.pipeline,
+                DigiformaSession.programme, DigiformaSession.date_debut, DigiformaSession.date_fin,
+                DigiformaSession.total_score, DigiformaSession.total_pre, DigiformaSession.total_hot,
+                DigiformaSession.total_cold, DigiformaSession.apprenants,
+            )
+            .where(_portee_sessions(depuis))
+            .order_by(DigiformaSession.date_debut.asc().nulls_last(), DigiformaSession.id)
+        )
+        async for ligne in res:
+            yield (aujourd_hui, *ligne)
+
+
+async def lignes_export_inscriptions() -> AsyncIterator[tuple]:
+    """Une ligne par signature (ou par inscription sans signature), en une seule requête lue en flux."""
+    i, s = DigiformaInscription, DigiformaSignature
+    aujourd_hui = date.today()
+    async with AsyncSessionLocal() as db:
+        res = await db.stream(
+            select(
+                i.session_id, i.nom_session, i.code_session, i.trainee_id, i.civilite, i.nom, i.prenom,
+                i.handicape, i.reussite, i.completion,
+                s.signature, s.type, s.date, s.creneau, s.sous_session, s.id_sous_session,
+            )
+            .select_from(i)
+            .outerjoin(s, s.inscription_id == i.id)
+            .order_by(i.id, s.id)
+        )
+        async for ligne in res:
+            yield (aujourd_hui, *ligne[:10], *("" if v is None else v for v in ligne[10:]))
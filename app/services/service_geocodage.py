@@ -0,0 +1,296 @@
+"""
+Géocodage des adresses via api-adresse.data.gouv.fr, avec cache à deux niveaux :
+- un cache LRU en mémoire (par processus) ;
+- une table Postgres `geocodage_cache` partagée, avec une durée de validité (TTL).
+
+Une adresse introuvable n'est gardée que dans le cache mémoire, pendant
+GEOCODAGE_CACHE_TTL_NEGATIF_MIN minutes : une base d'adresses corrigée ou une
+panne passagère ne la condamne pas pour GEOCODAGE_CACHE_TTL_JOURS jours.
+
+La clé de cache est l'adresse normalisée (minuscules, accents supprimés,
+ponctuation réduite à un espace) : "12, Rue de l'Église" et "12 rue de l eglise"
+ne coûtent qu'un seul appel à l'API.
+"""
+import asyncio
+import csv
+import io
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pandas as pd
+import requests
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.models import GeocodageCache
+from app.utils import metrics
+from app.utils.cache_lru import CacheLRU
+from app.utils.rate_limiter import TokenBucket
+
+_ABSENT = object()
+
+cache_geocodage = CacheLRU(
+    taille_max=settings.GEOCODAGE_CACHE_TAILLE,
+    ttl=settings.GEOCODAGE_CACHE_TTL_JOURS * 86400,
+)
+
+# Débit partagé par tous les appels à api-adresse du processus
+limiteur_api_adresse = TokenBucket(settings.API_ADRESSE_REQ_PAR_SEC)
+
+
+def normaliser_adresse(adresse) -> str:
+    """Minuscules, accents repliés, ponctuation et espaces multiples réduits à un espace."""
+    adresse = unicodedata.normalize("NFKD", str(adresse or ""))
+    adresse = "".join(c for c in adresse if not unicodedata.combining(c))
+    adresse = re.sub(r"[^a-z0-9]+", " ", adresse.lower())
+    return adresse.strip()
+
+
+def _depuis_feature(feature: dict) -> dict:
+    """Extrait les champs utiles d'une feature GeoJSON renvoyée par api-adresse."""
+    coords = feature["geometry"]["coordinates"]
+    proprietes = feature.get("properties", {})
+    return {
+        "latitude": coords[1],
+        "longitude": coords[0],
+        "score": proprietes.get("score"),
+        "label": proprietes.get("label"),
+        "code_postal": proprietes.get("postcode"),
+        "code_commune": proprietes.get("citycode"),
+    }
+
+
+def _depuis_ligne(ligne: GeocodageCache) -> dict:
+    return {
+        "latitude": ligne.latitude,
+        "longitude": ligne.longitude,
+        "score": ligne.score,
+        "label": ligne.label,
+        "code_postal": ligne.code_postal,
+        "code_commune": ligne.code_commune,
+    }
+
+
+def _memoriser(cle: str, resultat: Optional[dict]):
+    """Met un résultat dans le cache mémoire ; une adresse introuvable n'y reste que peu de temps."""
+    ttl = settings.GEOCODAGE_CACHE_TTL_NEGATIF_MIN * 60 if resultat is None else None
+    cache_geocodage.set(cle, resultat, ttl=ttl)
+
+
+async def lire_cache_db(cles: list) -> dict:
+    """
+    Retourne {cle: resultat} pour les entrées encore valides de la table de cache.
+    Les lignes sans coordonnées (anciennes adresses introuvables) sont ignorées.
+    """
+    if not cles or not settings.GEOCODAGE_CACHE_DB:
+        return {}
+    limite = datetime.utcnow() - timedelta(days=settings.GEOCODAGE_CACHE_TTL_JOURS)
+    try:
+        async with AsyncSessionLocal() as session:
+            res = await session.execute(
+                select(GeocodageCache).where(
+                    GeocodageCache.cle.in_(cles),
+                    GeocodageCache.latitude.is_not(None),
+                    GeocodageCache.updated_at >= limite
+                )
+            )
+            return {ligne.cle: _depuis_ligne(ligne) for ligne in res.scalars().all()}
+    except Exception as e:
+        print(f"⚠️ Lecture du cache de géocodage impossible : {str(e)}")
+        return {}
+
+
+async def ecrire_cache_db(entrees: dict):
+    """Insère ou met à jour {cle: (adresse, resultat)} dans la table de cache (hors adresses introuvables)."""
+    if not settings.GEOCODAGE_CACHE_DB:
+        return
+    valeurs = []
+    for cle, (adresse, resultat) in entrees.items():
+        if resultat is None:
+            continue
+        valeurs.append({
+            "cle": cle,
+            "adresse": adresse,
+            "latitude": resultat.get("latitude"),
+            "longitude": resultat.get("longitude"),
+            "score": resultat.get("score"),
+            "label": resultat.get("label"),
+            "code_postal": resultat.get("code_postal"),
+            "code_commune": resultat.get("code_commune"),
+            "updated_at": datetime.utcnow(),
+        })
+    if not valeurs:
+        return
+    stmt = insert(GeocodageCache).values(valeurs)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GeocodageCache.cle],
+        set_={col: stmt.excluded[col] for col in valeurs[0] if col != "cle"}
+    )
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"⚠️ Écriture du cache de géocodage impossible : {str(e)}")
+
+
+def _appeler_api_adresse(adresse: str) -> Optional[dict]:
+    """Appel bloquant à /search/ ; lève requests.RequestException en cas d'erreur réseau."""
+    response = requests.get(
+        f"{settings.API_ADRESSE_URL}/search/",
+        params={"q": adresse, "limit": 1},
+        timeout=settings.GEOCODAGE_TIMEOUT_SEC
+    )
+    response.raise_for_status()
+    features = response.json().get("features")
+    return _depuis_feature(features[0]) if features else None
+
+
+async def geocoder_adresse(adresse: str) -> Optional[dict]:
+    """
+    Retourne {latitude, longitude, score, label, code_postal, code_commune}
+    ou None si l'adresse est introuvable. Les erreurs réseau sont propagées.
+    """
+    cle = normaliser_adresse(adresse)
+
+    resultat = cache_geocodage.get(cle, _ABSENT)
+    if resultat is not _ABSENT:
+        metrics.incrementer("geocodage.cache_lru.hit")
+        return resultat
+
+    cache_db = await lire_cache_db([cle])
+    if cle in cache_db:
+        metrics.incrementer("geocodage.cache_db.hit")
+        _memoriser(cle, cache_db[cle])
+        return cache_db[cle]
+
+    metrics.incrementer("geocodage.cache.miss")
+    await limiteur_api_adresse.acquerir()
+    with metrics.chronometrer("geocodage.api_adresse"):
+        resultat = await asyncio.to_thread(_appeler_api_adresse, adresse)
+
+    _memoriser(cle, resultat)
+    await ecrire_cache_db({cle: (adresse, resultat)})
+    return resultat
+
+
+def _appeler_api_adresse_csv(adresses: list) -> list:
+    """
+    Géocode un lot d'adresses en un seul appel multipart à /search/csv/.
+    Retourne une liste alignée sur `adresses` (None pour les adresses introuvables).
+    """
+    fichier = io.StringIO()
+    writer = csv.writer(fichier)
+    writer.writerow(["id", "adresse"])
+    for i, adresse in enumerate(adresses):
+        writer.writerow([i, adresse])
+
+    response = requests.post(
+        f"{settings.API_ADRESSE_URL}/search/csv/",
+        files={"data": ("adresses.csv", fichier.getvalue().encode("utf-8"), "text/csv")},
+        data=[
+            ("columns", "adresse"),
+            ("result_columns", "latitude"),
+            ("result_columns", "longitude"),
+            ("result_columns", "result_score"),
+            ("result_columns", "result_label"),
+            ("result_columns", "result_postcode"),
+            ("result_columns", "result_citycode"),
+        ],
+        timeout=settings.GEOCODAGE_CSV_TIMEOUT_SEC
+    )
+    response.raise_for_status()
+
+    df = pd.read_csv(io.StringIO(response.content.decode("utf-8-sig")), dtype=str, keep_default_na=False)
+    df["id"] = df["id"].astype(int)
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    df["result_score"] = pd.to_numeric(df["result_score"], errors="coerce")
+    df = df.set_index("id").reindex(range(len(adresses)))
+
+    resultats = [None] * len(adresses)
+    trouves = df[df["latitude"].notna() & df["longitude"].notna()]
+    for i, ligne in zip(trouves.index, trouves.itertuples(index=False)):
+        resultats[i] = {
+            "latitude": float(ligne.latitude),
+            "longitude": float(ligne.longitude),
+            "score": None if pd.isna(ligne.result_score) else float(ligne.result_score),
+            "label": ligne.result_label or None,
+            "code_postal": ligne.result_postcode or None,
+            "code_commune": ligne.result_citycode or None,
+        }
+    return resultats
+
+
+async def geocoder_adresses(adresses) -> dict:
+    """
+    Géocode un ensemble d'adresses en masse. Les adresses déjà en cache (mémoire
+    puis Postgres) ne sont pas renvoyées à l'API ; les autres partent par lots de
+    GEOCODAGE_CSV_TAILLE_LOT vers /search/csv/.
+    Retourne {adresse normalisée: resultat ou None}. Un lot en échec (erreur HTTP,
+    délai dépassé) n'interrompt pas les suivants : ses adresses sont absentes du
+    résultat, à géocoder une par une par l'appelant.
+    """
+    originales = {}
+    for adresse in adresses:
+        cle = normaliser_adresse(adresse)
+        if cle:
+            originales.setdefault(cle, str(adresse))
+
+    resultats = {}
+    manquantes = []
+    for cle in originales:
+        resultat = cache_geocodage.get(cle, _ABSENT)
+        if resultat is _ABSENT:
+            manquantes.append(cle)
+        else:
+            resultats[cle] = resultat
+    metrics.incrementer("geocodage.cache_lru.hit", len(resultats))
+
+    cache_db = await lire_cache_db(manquantes)
+    metrics.incrementer("geocodage.cache_db.hit", len(cache_db))
+    for cle, resultat in cache_db.items():
+        resultats[cle] = resultat
+        _memoriser(cle, resultat)
+
+    a_geocoder = [cle for cle in manquantes if cle not in cache_db]
+    metrics.incrementer("geocodage.cache.miss", len(a_geocoder))
+    print(f"📦 Géocodage en masse : {len(originales)} adresses uniques, {len(a_geocoder)} à interroger")
+
+    taille_lot = settings.GEOCODAGE_CSV_TAILLE_LOT
+    for debut in range(0, len(a_geocoder), taille_lot):
+        lot = a_geocoder[debut:debut + taille_lot]
+        await limiteur_api_adresse.acquerir()
+        try:
+            with metrics.chronometrer("geocodage.api_adresse_csv"):
+                resultats_lot = await asyncio.to_thread(_appeler_api_adresse_csv, [originales[cle] for cle in lot])
+        except Exception as e:
+            print(f"⚠️ Géocodage en masse : lot de {len(lot)} adresses en échec ({str(e)})")
+            metrics.incrementer("geocodage.api_adresse_csv.erreurs")
+            continue
+
+        nouveaux = {}
+        for cle, resultat in zip(lot, resultats_lot):
+            resultats[cle] = resultat
+            _memoriser(cle, resultat)
+            nouveaux[cle] = (originales[cle], resultat)
+        await ecrire_cache_db(nouveaux)
+
+    return resultats
+
+
+def statistiques_cache() -> dict:
+    compteurs = metrics.snapshot()["compteurs"]
+    hits = compteurs.get("geocodage.cache_lru.hit", 0) + compteurs.get("geocodage.cache_db.hit", 0)
+    misses = compteurs.get("geocodage.cache.miss", 0)
+    return {
+        "entrees_lru": len(cache_geocodage),
+        "hits_lru": compteurs.get("geocodage.cache_lru.hit", 0),
+        "hits_db": compteurs.get("geocodage.cache_db.hit", 0),
+        "misses": misses,
+        "taux_hit": metrics.taux(hits, misses),
+    }
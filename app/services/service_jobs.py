@@ -0,0 +1,251 @@
+"""
+Jobs en arrière-plan persistés dans la table `jobs_batch`.
+
+Une route crée le job (creer_job) et rend la main immédiatement ; le worker
+démarré dans le lifespan réserve les jobs en attente (SELECT ... FOR UPDATE
+SKIP LOCKED, plusieurs processus peuvent tourner) et exécute la fonction
+enregistrée pour leur type. L'avancement est écrit en base toutes les
+JOBS_INTERVALLE_PROGRESSION_SEC secondes et sert de battement de cœur : un job
+"en_cours" dont le worker a disparu (redémarrage) est repris après
+JOBS_DELAI_ABANDON_SEC.
+
+    @enregistrer_type_job("qpv_groupe")
+    async def job_qpv(job_id, parametres, progression) -> str:  # nom du fichier produit
+        ...
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.models import JobBatch, StatutJob
+from app.utils import metrics
+from app.utils.progression import Progression
+
+HandlerJob = Callable[[str, dict, Progression], Awaitable[Optional[str]]]
+
+_handlers = {}
+_worker = None
+_reveil = None
+
+
+def enregistrer_type_job(type_job: str):
+    """Décorateur : associe une coroutine d'exécution à un type de job."""
+    def decorateur(handler: HandlerJob) -> HandlerJob:
+        _handlers[type_job] = handler
+        return handler
+    return decorateur
+
+
+async def creer_job(type_job: str, parametres: dict) -> str:
+    """Enregistre un job en attente et réveille le worker. Retourne l'identifiant du job."""
+    if type_job not in _handlers:
+        raise ValueError(f"❌ Type de job inconnu : {type_job}")
+
+    job_id = uuid.uuid4().hex
+    async with AsyncSessionLocal() as session:
+        session.add(JobBatch(
+            id=job_id,
+            type=type_job,
+            statut=StatutJob.EN_ATTENTE.value,
+            parametres=parametres,
+            lignes_traitees=0,
+            lignes_reprises=0,
+            tentatives=0,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        ))
+        await session.commit()
+
+    metrics.incrementer(f"jobs.{type_job}.crees")
+    print(f"📥 Job {type_job} créé : {job_id}")
+    if _reveil is not None:
+        _reveil.set()
+    return job_id
+
+
+async def get_job(job_id: str) -> Optional[JobBatch]:
+    async with AsyncSessionLocal() as session:
+        return await session.get(JobBatch, job_id)
+
+
+def etat_job(job: JobBatch) -> dict:
+    """État public d'un job : avancement, débit (lignes/s), ETA et lien de téléchargement."""
+    debit = None
+    eta_secondes = None
+    if job.started_at and job.statut in (StatutJob.EN_COURS.value, StatutJob.TERMINE.value):
+        duree = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        faites = job.lignes_traitees - job.lignes_reprises
+        if duree > 0 and faites > 0:
+            debit = round(faites / duree, 2)
+        if debit and job.lignes_total and job.statut == StatutJob.EN_COURS.value:
+            eta_secondes = round(max(job.lignes_total - job.lignes_traitees, 0) / debit)
+
+    return {
+        "job_id": job.id,
+        "type": job.type,
+        "statut": job.statut,
+        "lignes_traitees": job.lignes_traitees,
+        "lignes_total": job.lignes_total,
+        "lignes_par_seconde": debit,
+        "eta_secondes": eta_secondes,
+        "download_url": f"/fichiers/{job.fichier_sortie}" if job.statut == StatutJob.TERMINE.value and job.fichier_sortie else None,
+        "erreur": job.erreur,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def _maj_job(job_id: str, **valeurs):
+    valeurs["updated_at"] = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(JobBatch).where(JobBatch.id == job_id).values(**valeurs))
+        await session.commit()
+
+
+async def _maj_job_sans_echec(job_id: str, **valeurs):
+    """_maj_job qui journalise au lieu de lever : l'état final d'un job ne doit pas arrêter le worker."""
+    try:
+        await _maj_job(job_id, **valeurs)
+    except Exception as e:
+        print(f"⚠️ Mise à jour du job {job_id} impossible : {e}")
+
+
+async def _reserver_job() -> Optional[JobBatch]:
+    """Passe en "en_cours" le plus ancien job en attente (ou abandonné) et le retourne."""
+    maintenant = datetime.utcnow()
+    abandon = maintenant - timedelta(seconds=settings.JOBS_DELAI_ABANDON_SEC)
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(
+            select(JobBatch)
+            .where(or_(
+                JobBatch.statut == StatutJob.EN_ATTENTE.value,
+                and_(JobBatch.statut == StatutJob.EN_COURS.value, JobBatch.updated_at < abandon),
+            ))
+            .order_by(JobBatch.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = res.scalar_one_or_none()
+        if job is None:
+            return None
+
+        job.tentatives += 1
+        job.updated_at = maintenant
+        if job.tentatives > settings.JOBS_TENTATIVES_MAX:
+            job.statut = StatutJob.ERREUR.value
+            job.erreur = f"Abandonné après {settings.JOBS_TENTATIVES_MAX} tentatives"
+            job.finished_at = maintenant
+            await session.commit()
+            return None
+
+        job.statut = StatutJob.EN_COURS.value
+        job.started_at = maintenant
+        await session.commit()
+        return job
+
+
+async def _suivre_progression(job_id: str, progression: Progression):
+    """Écrit périodiquement l'avancement (et donc le battement de cœur) du job."""
+    while True:
+        await asyncio.sleep(settings.JOBS_INTERVALLE_PROGRESSION_SEC)
+        try:
+            await _maj_job(
+                job_id,
+                lignes_traitees=progression.faites,
+                lignes_total=progression.total,
+                lignes_reprises=progression.reprises,
+            )
+        except Exception as e:
+            print(f"⚠️ Mise à jour de l'avancement du job {job_id} impossible : {e}")
+
+
+async def _executer(job: JobBatch):
+    progression = Progression()
+    suivi = asyncio.create_task(_suivre_progression(job.id, progression))
+    print(f"⚙️ Job {job.type} {job.id} démarré (tentative {job.tentatives})")
+    try:
+        with metrics.chronometrer(f"jobs.{job.type}.duree"):
+            fichier_sortie = await _handlers[job.type](job.id, job.parametres, progression)
+    except asyncio.CancelledError:
+        # Arrêt de l'application : le job sera repris au prochain démarrage
+        suivi.cancel()
+        await _maj_job_sans_echec(job.id, statut=StatutJob.EN_ATTENTE.value, lignes_traitees=progression.faites)
+        raise
+    except Exception as e:
+        suivi.cancel()
+        print(f"❌ Job {job.type} {job.id} en erreur : {e}")
+        metrics.incrementer(f"jobs.{job.type}.erreurs")
+        await _maj_job_sans_echec(
+            job.id,
+            statut=StatutJob.ERREUR.value,
+            erreur=str(e),
+            lignes_traitees=progression.faites,
+            finished_at=datetime.utcnow(),
+        )
+        return
+
+    suivi.cancel()
+    await _maj_job_sans_echec(
+        job.id,
+        statut=StatutJob.TERMINE.value,
+        fichier_sortie=fichier_sortie,
+        lignes_traitees=progression.faites,
+        lignes_total=progression.total if progression.total is not None else progression.faites,
+        lignes_reprises=progression.reprises,
+        finished_at=datetime.utcnow(),
+    )
+    metrics.incrementer(f"jobs.{job.type}.termines")
+    print(f"✅ Job {job.type} {job.id} terminé : {fichier_sortie}")
+
+
+async def _iteration_worker():
+    """Réserve et exécute un job, ou attend le prochain réveil s'il n'y en a pas."""
+    job = await _reserver_job()
+    if job is None:
+        _reveil.clear()
+        try:
+            await asyncio.wait_for(_reveil.wait(), timeout=settings.JOBS_INTERVALLE_SONDAGE_SEC)
+        except asyncio.TimeoutError:
+            pass
+        return
+
+    if job.type not in _handlers:
+        await _maj_job(job.id, statut=StatutJob.ERREUR.value, erreur=f"Type de job inconnu : {job.type}")
+        return
+    await _executer(job)
+
+
+async def _boucle_worker():
+    """Une erreur passagère (base indisponible...) est journalisée ; le worker ne s'arrête qu'à l'annulation."""
+    while True:
+        try:
+            await _iteration_worker()
+        except Exception as e:
+            print(f"⚠️ Erreur du worker de jobs, nouvel essai dans {settings.JOBS_INTERVALLE_SONDAGE_SEC} s : {e}")
+            metrics.incrementer("jobs.worker.erreurs")
+            await asyncio.sleep(settings.JOBS_INTERVALLE_SONDAGE_SEC)
+
+
+def demarrer_worker_jobs():
+    global _worker, _reveil
+    if _worker is None:
+        _reveil = asyncio.Event()
+        _worker = asyncio.create_task(_boucle_worker())
+        print(f"✅ Worker de jobs démarré ({', '.join(sorted(_handlers)) or 'aucun type'})")
+
+
+async def arreter_worker_jobs():
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
@@ -0,0 +1,170 @@
+"""
+Pool de navigateurs Chrome headless pour la capture des cartes folium
+(QPV_MAP_RENDERER="navigateur").
+
+Les N drivers sont démarrés une fois dans le lifespan de l'application et
+distribués via une asyncio.Queue. Un driver est recyclé après
+NAVIGATEUR_CAPTURES_MAX captures ou dès qu'il plante. La capture attend que
+les tuiles Leaflet soient chargées au lieu d'un time.sleep fixe.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from PIL import Image
+
+from app.config import settings
+from app.utils import metrics
+
+# Vrai dès que toutes les tuiles Leaflet visibles sont chargées (ou qu'il n'y en a pas)
+SCRIPT_TUILES_CHARGEES = """
+    const tuiles = Array.from(document.querySelectorAll('img.leaflet-tile'));
+    if (!document.querySelector('.leaflet-container')) { return false; }
+    return tuiles.every(t => t.complete && t.classList.contains('leaflet-tile-loaded'));
+"""
+
+_pool = None
+
+
+class _Navigateur:
+    def __init__(self, driver):
+        self.driver = driver
+        self.captures = 0
+        self.hors_service = False
+
+
+class PoolNavigateurs:
+    def __init__(self, taille: int, captures_max: int):
+        self.taille = taille
+        self.captures_max = captures_max
+        self.file = asyncio.Queue()
+        self._chemin_driver = None
+
+    def _creer_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")  # Exécution sans interface graphique
+        options.add_argument("--no-sandbox")  # Évite les erreurs de sandboxing
+        options.add_argument("--disable-dev-shm-usage")  # Évite les problèmes de mémoire dans Docker
+        options.add_argument("--window-size=800x600")  # Définit une taille fixe pour la capture
+        options.add_argument("--disable-gpu")  # Désactive l'accélération GPU
+        options.add_argument("--disable-software-rasterizer")  # Évite certains crashs graphiques
+
+        driver = webdriver.Chrome(service=Service(self._chemin_driver), options=options)
+        metrics.incrementer("navigateur.drivers_crees")
+        return driver
+
+    async def demarrer(self):
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        # Résolution du ChromeDriver une seule fois pour tout le pool
+        self._chemin_driver = await asyncio.to_thread(lambda: ChromeDriverManager().install())
+        for _ in range(self.taille):
+            driver = await asyncio.to_thread(self._creer_driver)
+            self.file.put_nowait(_Navigateur(driver))
+        self._publier()
+        print(f"✅ Pool de navigateurs démarré ({self.taille} Chrome headless)")
+
+    async def arreter(self):
+        while not self.file.empty():
+            navigateur = self.file.get_nowait()
+            await asyncio.to_thread(self._quitter, navigateur.driver)
+        self._publier()
+
+    @staticmethod
+    def _quitter(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"⚠️ Fermeture du navigateur impossible : {e}")
+
+    def _publier(self):
+        metrics.definir("navigateur.pool_taille", self.taille)
+        metrics.definir("navigateur.pool_disponibles", self.file.qsize())
+
+    @asynccontextmanager
+    async def acquerir(self):
+        """Prête un driver du pool ; il est recyclé si la capture échoue ou s'il a trop servi."""
+        debut = time.perf_counter()
+        navigateur = await self.file.get()
+        metrics.observer("navigateur.attente_pool", (time.perf_counter() - debut) * 1000)
+        self._publier()
+        try:
+            yield navigateur
+        except Exception:
+            navigateur.hors_service = True
+            raise
+        finally:
+            navigateur.captures += 1
+            if navigateur.hors_service or navigateur.captures >= self.captures_max:
+                metrics.incrementer("navigateur.recyclages")
+                await asyncio.to_thread(self._quitter, navigateur.driver)
+                try:
+                    navigateur = _Navigateur(await asyncio.to_thread(self._creer_driver))
+                except Exception as e:
+                    # On garde la place dans le pool ; le prochain emprunteur recréera le driver
+                    print(f"❌ Impossible de recréer un navigateur : {e}")
+                    navigateur.hors_service = True
+            self.file.put_nowait(navigateur)
+            self._publier()
+
+    async def capturer(self, map_path: str, image_path: str):
+        async with self.acquerir() as navigateur:
+            if navigateur.hors_service:
+                navigateur.driver = await asyncio.to_thread(self._creer_driver)
+                navigateur.hors_service = False
+            with metrics.chronometrer("navigateur.capture"):
+                await asyncio.to_thread(capturer_carte, navigateur.driver, map_path, image_path)
+
+
+def capturer_carte(driver, map_path: str, image_path: str):
+    """Charge la carte HTML, attend le chargement des tuiles Leaflet puis fait la capture."""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    driver.get("file://" + os.path.abspath(map_path))  # Charger le fichier HTML
+
+    debut = time.perf_counter()
+    try:
+        WebDriverWait(driver, settings.NAVIGATEUR_ATTENTE_TUILES_SEC, poll_frequency=0.05).until(
+            lambda d: d.execute_script(SCRIPT_TUILES_CHARGEES)
+        )
+    except TimeoutException:
+        # Tuiles indisponibles (réseau) : on capture quand même la carte
+        metrics.incrementer("navigateur.attente_tuiles_expiree")
+    metrics.observer("navigateur.attente_tuiles", (time.perf_counter() - debut) * 1000)
+
+    # Capture d'écran et enregistrement
+    driver.save_screenshot(image_path)
+
+    # Convertir et optimiser l’image avec Pillow
+    img = Image.open(image_path)
+    img = img.convert("RGB")
+    img.save(image_path, "PNG")
+
+
+async def demarrer_pool_navigateurs() -> PoolNavigateurs:
+    global _pool
+    pool = PoolNavigateurs(settings.NAVIGATEUR_POOL_TAILLE, settings.NAVIGATEUR_CAPTURES_MAX)
+    try:
+        await pool.demarrer()
+    except Exception:
+        await pool.arreter()
+        raise
+    _pool = pool
+    return _pool
+
+
+async def arreter_pool_navigateurs():
+    global _pool
+    if _pool is not None:
+        await _pool.arreter()
+        _pool = None
+
+
+def get_pool_navigateurs() -> Optional[PoolNavigateurs]:
+    return _pool
@@ -0,0 +1,155 @@
+"""
+Appels à l'API Pappers (/v2/entreprise) avec cache à deux niveaux, clé = SIREN :
+- un cache LRU en mémoire (par processus) ;
+- une table Postgres `entreprise_cache` partagée.
+
+Une fiche obtenue depuis moins de ENTREPRISE_CACHE_TTL_HEURES est servie telle
+quelle. Plus ancienne (jusqu'à ENTREPRISE_CACHE_PERIME_MAX_JOURS), elle est
+servie immédiatement et rafraîchie en arrière-plan (stale-while-revalidate) ;
+au-delà, Pappers est interrogé avant de répondre. `sans_cache=True` interroge
+toujours Pappers, et met le cache à jour.
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.models import EntrepriseCache
+from app.utils import metrics
+from app.utils.cache_lru import CacheLRU
+from app.utils.http_client import requete
+from app.utils.rate_limiter import TokenBucket
+
+SOURCE_CACHE = "cache"
+SOURCE_CACHE_PERIME = "cache_perime"
+SOURCE_PAPPERS = "pappers"
+
+# Les entrées sont gardées jusqu'à l'âge maximal servi périmé ; la fraîcheur se juge sur leur date d'obtention
+cache_entreprises = CacheLRU(
+    taille_max=settings.ENTREPRISE_CACHE_TAILLE,
+    ttl=settings.ENTREPRISE_CACHE_PERIME_MAX_JOURS * 86400,
+)
+
+# Débit partagé par tous les appels à Pappers du processus (quota de l'abonnement)
+limiteur_pappers = TokenBucket(settings.PAPPERS_REQ_PAR_SEC)
+
+_rafraichissements = {}
+
+
+async def appeler_pappers(siren: str) -> Optional[dict]:
+    """Fiche entreprise brute, None si le SIREN est inconnu ; lève httpx.HTTPError sinon."""
+    await limiteur_pappers.acquerir()
+    metrics.incrementer("pappers.appels")
+    with metrics.chronometrer("pappers.entreprise"):
+        response = await requete(
+            "GET", f"{settings.PAPPERS_URL}/v2/entreprise",
+            params={"siren": siren, "api_token": settings.PAPPERS_API_KEY},
+        )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+async def lire_cache_db(siren: str) -> Optional[tuple]:
+    """(fiche, date d'obtention) depuis la table de cache, ou None."""
+    if not settings.ENTREPRISE_CACHE_DB:
+        return None
+    try:
+        async with AsyncSessionLocal() as session:
+            ligne = await session.get(EntrepriseCache, siren)
+    except Exception as e:
+        print(f"⚠️ Lecture du cache entreprise impossible : {str(e)}")
+        return None
+    return (ligne.donnees, ligne.updated_at) if ligne is not None else None
+
+
+async def ecrire_cache_db(siren: str, donnees: dict, obtenue_le: datetime):
+    if not settings.ENTREPRISE_CACHE_DB:
+        return
+    stmt = insert(EntrepriseCache).values(siren=siren, donnees=donnees, updated_at=obtenue_le)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[EntrepriseCache.siren],
+        set_={"donnees": stmt.excluded.donnees, "updated_at": stmt.excluded.updated_at},
+    )
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"⚠️ Écriture du cache entreprise impossible : {str(e)}")
+
+
+async def _rafraichir(siren: str) -> Optional[dict]:
+    donnees = await appeler_pappers(siren)
+    if donnees is not None:
+        obtenue_le = datetime.utcnow()
+        cache_entreprises.set(siren, (donnees, obtenue_le))
+        await ecrire_cache_db(siren, donnees, obtenue_le)
+    return donnees
+
+
+def _rafraichir_en_arriere_plan(siren: str):
+    """Un seul rafraîchissement en cours par SIREN ; une erreur laisse la fiche périmée en place."""
+    if siren in _rafraichissements:
+        return
+
+    async def tache():
+        try:
+            await _rafraichir(siren)
+            metrics.incrementer("pappers.cache.rafraichie")
+        except Exception as e:
+            print(f"⚠️ Rafraîchissement de la fiche {siren} impossible : {str(e)}")
+        finally:
+            _rafraichissements.pop(siren, None)
+
+    _rafraichissements[siren] = asyncio.create_task(tache())
+
+
+async def lire_entreprise_en_cache(siren: str) -> Optional[tuple]:
+    """(fiche, date d'obtention) depuis le cache mémoire puis la table de cache, sans appeler Pappers."""
+    entree = cache_entreprises.get(siren)
+    if entree is not None:
+        metrics.incrementer("pappers.cache_lru.hit")
+        return entree
+    entree = await lire_cache_db(siren)
+    if entree is not None:
+        metrics.incrementer("pappers.cache_db.hit")
+        cache_entreprises.set(siren, entree)
+    return entree
+
+
+async def obtenir_entreprise(siren: str, sans_cache: bool = False) -> tuple:
+    """Retourne (fiche Pappers ou None si inconnue, source : cache, cache_perime ou pappers)."""
+    if not sans_cache:
+        entree = await lire_entreprise_en_cache(siren)
+        if entree is not None:
+            donnees, obtenue_le = entree
+            age = (datetime.utcnow() - obtenue_le).total_seconds()
+            if age < settings.ENTREPRISE_CACHE_TTL_HEURES * 3600:
+                return donnees, SOURCE_CACHE
+            if age < settings.ENTREPRISE_CACHE_PERIME_MAX_JOURS * 86400:
+                metrics.incrementer("pappers.cache.perime")
+                _rafraichir_en_arriere_plan(siren)
+                return donnees, SOURCE_CACHE_PERIME
+        metrics.incrementer("pappers.cache.miss")
+
+    return await _rafraichir(siren), SOURCE_PAPPERS
+
+
+def statistiques_cache_pappers() -> dict:
+    compteurs = metrics.snapshot()["compteurs"]
+    hits = compteurs.get("pappers.cache_lru.hit", 0) + compteurs.get("pappers.cache_db.hit", 0)
+    misses = compteurs.get("pappers.cache.miss", 0)
+    return {
+        "entrees_lru": len(cache_entreprises),
+        "hits_lru": compteurs.get("pappers.cache_lru.hit", 0),
+        "hits_db": compteurs.get("pappers.cache_db.hit", 0),
+        "servies_perimees": compteurs.get("pappers.cache.perime", 0),
+        "misses": misses,
+        "appels_pappers": compteurs.get("pappers.appels", 0),
+        "taux_hit": metrics.taux(hits, misses),
+    }
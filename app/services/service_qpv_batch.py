@@ -0,0 +1,234 @@
+"""
+Moteur de traitement QPV en lot.
+
+Chaque ligne passe par les étapes géocodage -> recherche QPV -> carte. Les lignes
+sont traitées en parallèle (QPV_BATCH_CONCURRENCE au maximum), les appels aux API
+externes restant bornés par leurs limiteurs de débit respectifs. Une ligne en
+échec est retentée puis marquée en erreur, sans interrompre le reste du fichier.
+Les résultats sont renvoyés dans l'ordre des lignes d'entrée.
+
+Quand les coordonnées sont connues d'avance (géocodage en masse) et que l'index
+QPV local est chargé, la recherche QPV de toutes les lignes est faite en une
+seule requête vectorisée avant le traitement ligne à ligne. Les lignes d'un lot
+/search/csv/ en échec sont géocodées une par une, avec les mêmes tentatives.
+
+Une même adresse répétée dans le fichier (foyers, structures d'accueil) n'est
+évaluée qu'une fois : traiter_colonne_qpv regroupe les lignes par adresse
+normalisée et redistribue le résultat à toutes les lignes du groupe.
+"""
+import asyncio
+from typing import Optional
+
+import pandas as pd
+
+from app.config import settings
+from app.services.service_geocodage import geocoder_adresse, geocoder_adresses, normaliser_adresse
+from app.services.service_qpv import evaluer_qpv, verdict_qpv
+from app.services.service_qpv_index import get_qpv_index
+from app.utils import metrics
+from app.utils.progression import Progression
+
+STATUT_OK = "ok"
+STATUT_INVALIDE = "adresse invalide"
+STATUT_INTROUVABLE = "adresse introuvable"
+
+A_GEOCODER = "a_geocoder"  # Coordonnée d'une ligne dont le géocodage en masse a échoué
+
+COLONNES_RESULTAT = ["nom_qpv", "carte_qpv", "distance_qpv_en_metre", "statut_qpv"]
+COLONNES_ADRESSE = ["adresse complete"]
+
+
+def trouver_colonne_adresse(colonnes) -> Optional[str]:
+    """📌 Colonne d'adresse du fichier (comparaison insensible à la casse)."""
+    return next((col for col in colonnes if str(col).strip().lower() in COLONNES_ADRESSE), None)
+
+
+def adresse_valide(address) -> bool:
+    """🔒 Vérification de la qualité du champ avant appel API"""
+    address = str(address) if address is not None and not pd.isna(address) else ""
+    return not (
+        not address or
+        len(address) < 5 or
+        len(address.split()) < 3
+    )
+
+
+def _resultat(statut: str, result: Optional[dict] = None) -> dict:
+    result = result or {}
+    return {
+        "nom_qpv": result.get("nom_qp", ""),
+        "carte_qpv": result.get("carte", ""),
+        "distance_qpv_en_metre": result.get("distance_m", ""),
+        "statut_qpv": statut,
+    }
+
+
+async def traiter_lignes_qpv(
+    adresses: list,
+    base_url: str,
+    coordonnees: Optional[list] = None,
+    concurrence: Optional[int] = None,
+    progression: Optional[Progression] = None,
+    poids: Optional[list] = None,
+) -> list:
+    """
+    Évalue chaque adresse et retourne une liste de résultats alignée sur `adresses`.
+
+    `coordonnees` (optionnel) contient pour chaque ligne un tuple (lat, lon) déjà
+    géocodé, None si l'adresse est introuvable, ou A_GEOCODER ; sans coordonnée
+    connue, la ligne est géocodée ici.
+    `progression` (optionnel) est avancé à chaque ligne terminée, de `poids[i]`
+    lignes du fichier si l'adresse en représente plusieurs.
+    """
+    semaphore = asyncio.Semaphore(concurrence or settings.QPV_BATCH_CONCURRENCE)
+    tentatives = settings.QPV_BATCH_TENTATIVES
+    qpvs = rechercher_qpv_lot(coordonnees) if coordonnees is not None else {}
+
+    async def traiter_et_compter(i: int) -> dict:
+        resultat = await traiter(i)
+        if progression is not None:
+            progression.avancer(poids[i] if poids is not None else 1)
+        return resultat
+
+    async def traiter(i: int) -> dict:
+        address = adresses[i]
+        if not adresse_valide(address):
+            return _resultat(STATUT_INVALIDE)
+        address = str(address)
+
+        async with semaphore:
+            for tentative in range(1, tentatives + 1):
+                try:
+                    if coordonnees is not None and coordonnees[i] != A_GEOCODER:
+                        if coordonnees[i] is None:
+                            return _resultat(STATUT_INTROUVABLE)
+                        lat, lon = coordonnees[i]
+                    else:
+                        geocodage = await geocoder_adresse(address)
+                        if not geocodage:
+                            return _resultat(STATUT_INTROUVABLE)
+                        lat, lon = geocodage["latitude"], geocodage["longitude"]
+
+                    with metrics.chronometrer("qpv_batch.ligne"):
+                        if i in qpvs:
+                            result = await verdict_qpv(address, lat, lon, qpvs[i], base_url)
+                        else:
+                            result = await evaluer_qpv(address, lat, lon, base_url)
+                    if "error" in result:
+                        raise RuntimeError(result["error"])
+
+                    metrics.incrementer("qpv_batch.lignes_ok")
+                    return _resultat(STATUT_OK, result)
+
+                except Exception as e:
+                    if tentative == tentatives:
+                        print(f"❌ Erreur ligne {i+1} après {tentatives} tentatives : {e}")
+                        metrics.incrementer("qpv_batch.lignes_erreur")
+                        return _resultat(f"erreur : {e}")
+                    metrics.incrementer("qpv_batch.retries")
+                    await asyncio.sleep(settings.QPV_BATCH_DELAI_RETRY_SEC * 2 ** (tentative - 1))
+
+    return await asyncio.gather(*(traiter_et_compter(i) for i in range(len(adresses))))
+
+
+async def traiter_colonne_qpv(
+    colonne: pd.Series,
+    base_url: str,
+    mode: str = "bulk",
+    progression: Optional[Progression] = None,
+) -> tuple:
+    """
+    Évalue une colonne d'adresses en ne traitant qu'une fois chaque adresse unique
+    (clé normalisée), puis redistribue les résultats sur toutes les lignes.
+
+    Retourne (DataFrame des COLONNES_RESULTAT aligné sur l'index de `colonne`,
+    statistiques de déduplication).
+    """
+    valides = colonne.map(adresse_valide)
+    cles = colonne.where(valides).map(normaliser_adresse, na_action="ignore")
+    occurrences = cles[valides].value_counts()
+    uniques = cles[valides].drop_duplicates()  # Première graphie rencontrée de chaque adresse
+    adresses = colonne[uniques.index]
+
+    if progression is not None:
+        progression.avancer(int((~valides).sum()))
+    coordonnees = await geocoder_colonne(adresses) if mode == "bulk" and len(adresses) else None
+    resultats = await traiter_lignes_qpv(
+        adresses.tolist(), base_url, coordonnees,
+        progression=progression, poids=occurrences[uniques].tolist(),
+    )
+
+    # 🔀 Redistribution vectorisée sur la clé normalisée (ordre des lignes conservé)
+    par_cle = pd.DataFrame(
+        resultats, index=pd.Index(uniques.tolist(), name="_cle"), columns=COLONNES_RESULTAT
+    ).astype(object)
+    df = cles.to_frame("_cle").join(par_cle, on="_cle").drop(columns="_cle")
+    invalide = _resultat(STATUT_INVALIDE)
+    df.loc[~valides, COLONNES_RESULTAT] = [invalide[c] for c in COLONNES_RESULTAT]
+
+    lignes_valides = int(valides.sum())
+    statistiques = {
+        "lignes": len(colonne),
+        "lignes_valides": lignes_valides,
+        "adresses_uniques": len(uniques),
+        "taux_deduplication": round(1 - len(uniques) / lignes_valides, 4) if lignes_valides else 0.0,
+    }
+    metrics.incrementer("qpv_batch.adresses_uniques", len(uniques))
+    metrics.incrementer("qpv_batch.lignes_dedupliquees", lignes_valides - len(uniques))
+    return df, statistiques
+
+
+def cumuler_statistiques(total: Optional[dict], statistiques: dict) -> dict:
+    """Additionne les statistiques de deux lots et recalcule le taux de déduplication."""
+    if total is None:
+        return dict(statistiques)
+    cumul = {cle: total[cle] + statistiques[cle] for cle in ("lignes", "lignes_valides", "adresses_uniques")}
+    cumul["taux_deduplication"] = (
+        round(1 - cumul["adresses_uniques"] / cumul["lignes_valides"], 4) if cumul["lignes_valides"] else 0.0
+    )
+    return cumul
+
+
+def rechercher_qpv_lot(coordonnees: list) -> dict:
+    """
+    Recherche vectorisée (un query_nearest pour tout le lot) du QPV de chaque ligne
+    géocodée. Retourne {indice de ligne: qpv ou None}, vide si l'index local est absent.
+    """
+    index = get_qpv_index()
+    lignes = [i for i, c in enumerate(coordonnees) if isinstance(c, tuple)]
+    if index is None or not lignes:
+        return {}
+    with metrics.chronometrer("qpv_batch.recherche_vectorisee"):
+        qpvs = index.rechercher_lot(
+            [coordonnees[i][1] for i in lignes],
+            [coordonnees[i][0] for i in lignes],
+        )
+    return dict(zip(lignes, qpvs))
+
+
+async def geocoder_colonne(colonne: pd.Series) -> list:
+    """
+    Géocode toute la colonne d'adresses en une passe (cache + /search/csv/) et
+    retourne, pour chaque ligne, (lat, lon), None si introuvable, ou A_GEOCODER
+    si son lot /search/csv/ a échoué.
+    """
+    valides = colonne.map(adresse_valide)
+    cles = colonne.where(valides).map(normaliser_adresse, na_action="ignore")
+
+    # 🌍 Géocodage des adresses uniques
+    geocodages = await geocoder_adresses(colonne[valides].astype(str).tolist())
+    coords = pd.DataFrame(
+        [(cle, r["latitude"], r["longitude"]) for cle, r in geocodages.items() if r],
+        columns=["_cle", "latitude", "longitude"]
+    ).set_index("_cle")
+
+    # Fusion vectorisée des coordonnées sur la clé normalisée (ordre des lignes conservé)
+    geo = cles.to_frame("_cle").join(coords, on="_cle")
+    print(f"📍 {int(geo['latitude'].notna().sum())}/{len(colonne)} lignes géocodées")
+
+    trouvees = geo["latitude"].notna()
+    en_echec = valides & ~cles.isin(list(geocodages))
+    return [
+        (lat, lon) if ok else A_GEOCODER if echec else None
+        for ok, echec, lat, lon in zip(trouvees, en_echec, geo["latitude"], geo["longitude"])
+    ]
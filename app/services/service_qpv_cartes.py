@@ -0,0 +1,352 @@
+"""
+Cartes QPV (HTML folium et PNG) rendues à la demande.
+
+La vérification QPV n'enregistre qu'une petite description de la carte
+(adresse, point, contour du QPV, verdict) sous une clé ; la carte elle-même
+n'est rendue qu'au premier accès à /qpv/map/{cle}, puis resservie depuis le
+disque. Le verdict (nom_qp, distance_m) est ainsi rendu sans attendre le rendu.
+
+La clé est une empreinte de tout ce qu'affiche la carte (adresse normalisée,
+point arrondi à ~1 m, QPV, verdict et distance, date, version du rendu) : deux
+graphies de la même adresse partagent la même carte le même jour, et une carte
+n'affiche jamais un verdict ou une date périmés. Tous les fichiers sont écrits
+dans un fichier temporaire puis renommés (os.replace), et un index des derniers
+accès permet au nettoyage d'évincer les cartes non consultées plutôt que les
+plus anciennes.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from datetime import date
+from typing import Optional
+
+import folium
+from folium.features import DivIcon
+
+from app.config import QPV_CARTES_DIR, settings
+from app.services.service_carte_statique import generer_carte_png
+from app.services.service_geocodage import normaliser_adresse
+from app.services.service_navigateur_pool import capturer_carte, get_pool_navigateurs
+from app.utils import metrics
+
+URL_CARTES = "/api-mca/v1/qpv/map"
+FORMATS = ("html", "png")
+VERSION_RENDU = 1  # À incrémenter quand le rendu des cartes change
+PRECISION_COORDS = 5  # ~1 m
+FICHIER_INDEX_ACCES = "index_acces.json"
+INTERVALLE_PERSISTANCE_SEC = 60
+
+_verrous = weakref.WeakValueDictionary()  # Un verrou disparaît quand plus personne ne l'attend
+_acces = {}  # {cle: horodatage du dernier accès} pas encore persisté
+_acces_lock = threading.Lock()
+_derniere_persistance = time.time()
+
+
+def cle_carte(address: str, lat: float, lon: float, qpv: Optional[dict], etat_qpv: Optional[str], jour: str) -> str:
+    """Empreinte du contenu affiché : adresse normalisée, point arrondi, QPV, verdict, date et version du rendu."""
+    if qpv:
+        id_qpv = f"{qpv.get('code_qp') or qpv.get('nom_qp')}|{etat_qpv}|{qpv.get('distance_m')}"
+    else:
+        id_qpv = "aucun"
+    contenu = "|".join([
+        normaliser_adresse(address), str(round(lat, PRECISION_COORDS)), str(round(lon, PRECISION_COORDS)),
+        id_qpv, jour, f"v{VERSION_RENDU}",
+    ])
+    return hashlib.sha256(contenu.encode("utf-8")).hexdigest()[:32]
+
+
+def _ecrire_atomique(chemin: str, ecrire):
+    """Appelle ecrire(chemin_temporaire) puis renomme : un lecteur ne voit jamais de fichier partiel."""
+    racine, extension = os.path.splitext(chemin)
+    tmp = f"{racine}.{uuid.uuid4().hex}.tmp{extension}"
+    try:
+        ecrire(tmp)
+        os.replace(tmp, chemin)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def enregistrer_carte(address: str, lat: float, lon: float, qpv: Optional[dict], etat_qpv: Optional[str]) -> str:
+    """
+    Enregistre la description de la carte et retourne sa clé (rien n'est rendu ici).
+    Si la même carte existe déjà, elle est réutilisée telle quelle.
+    """
+    jour = date.today().isoformat()
+    cle = cle_carte(address, lat, lon, qpv, etat_qpv, jour)
+    marquer_acces(cle)
+    chemin_spec = chemins_carte(cle)["json"]
+    if os.path.exists(chemin_spec):
+        metrics.incrementer("qpv_carte.reutilisee")
+        return cle
+
+    spec = {
+        "address": address,
+        "lat": lat,
+        "lon": lon,
+        "date": jour,
+        "etat_qpv": etat_qpv,
+        "qpv": qpv,
+    }
+
+    def ecrire(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(spec, f, ensure_ascii=False)
+
+    _ecrire_atomique(chemin_spec, ecrire)
+    return cle
+
+
+def url_carte(base_url: str, cle: str, format: str = "html") -> str:
+    url = f"{base_url.strip()}{URL_CARTES}/{cle}"
+    return url if format == "html" else f"{url}?format={format}"
+
+
+def _lire_spec(cle: str) -> Optional[dict]:
+    chemin = chemins_carte(cle)["json"]
+    if not os.path.exists(chemin):
+        return None
+    with open(chemin, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def chemins_carte(cle: str) -> dict:
+    return {ext: os.path.join(QPV_CARTES_DIR, f"{cle}.{ext}") for ext in ("json", "html", "png")}
+
+
+def marquer_acces(cle: str):
+    """Note l'accès en mémoire ; l'index sur disque est mis à jour au plus une fois par minute."""
+    with _acces_lock:
+        _acces[cle] = time.time()
+    if time.time() - _derniere_persistance > INTERVALLE_PERSISTANCE_SEC:
+        persister_index_acces()
+
+
+def _lire_index_acces() -> dict:
+    chemin = os.path.join(QPV_CARTES_DIR, FICHIER_INDEX_ACCES)
+    try:
+        with open(chemin, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _ecrire_index_acces(index: dict):
+    def ecrire(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+
+    _ecrire_atomique(os.path.join(QPV_CARTES_DIR, FICHIER_INDEX_ACCES), ecrire)
+
+
+def persister_index_acces() -> dict:
+    """Fusionne les accès en mémoire dans l'index sur disque (le plus récent l'emporte)."""
+    global _derniere_persistance
+    with _acces_lock:
+        index = _lire_index_acces()
+        for cle, instant in _acces.items():
+            index[cle] = max(instant, index.get(cle, 0))
+        _acces.clear()
+        _ecrire_index_acces(index)
+        _derniere_persistance = time.time()
+    return index
+
+
+def evincer_cartes(age_limite_minutes: int) -> list:
+    """Supprime les cartes non consultées depuis `age_limite_minutes` ; retourne les clés évincées."""
+    index = persister_index_acces()
+    limite = time.time() - age_limite_minutes * 60
+    evincees = []
+
+    for nom in os.listdir(QPV_CARTES_DIR):
+        cle, extension = os.path.splitext(nom)
+        if extension != ".json" or nom == FICHIER_INDEX_ACCES:
+            continue
+        chemins = chemins_carte(cle)
+        # Sans trace d'accès (index perdu), on se rabat sur la date du fichier
+        dernier_acces = index.get(cle) or os.path.getmtime(chemins["json"])
+        if dernier_acces > limite:
+            continue
+        for chemin in chemins.values():
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+        evincees.append(cle)
+
+    if evincees:
+        with _acces_lock:
+            # Relu sous le verrou : les accès persistés pendant l'éviction sont conservés
+            index = _lire_index_acces()
+            for cle in evincees:
+                index.pop(cle, None)
+            _ecrire_index_acces({cle: instant for cle, instant in index.items() if instant > limite})
+        metrics.incrementer("qpv_carte.evincees", len(evincees))
+    return evincees
+
+
+def _date_fr(spec: dict) -> str:
+    return date.fromisoformat(spec["date"]).strftime("%d/%m/%Y")
+
+
+def lignes_info(spec: dict) -> list:
+    """Cartouche du rendu PNG statique."""
+    qpv = spec["qpv"]
+    if qpv:
+        return [
+            f"Aujourd'hui : {_date_fr(spec)}",
+            spec["address"],
+            f"{spec['etat_qpv']} : {qpv['nom_qp']}",
+            f"Distance : {qpv['distance_m']} mètres",
+            "Source : OpenDataSoft",
+        ]
+    return [
+        f"Aujourd'hui : {_date_fr(spec)}",
+        spec["address"],
+        "Quartier Prioritaire : Aucun QPV trouvé",
+        "Source : OpenDataSoft",
+    ]
+
+
+def construire_carte_folium(spec: dict) -> folium.Map:
+    lat, lon, qpv = spec["lat"], spec["lon"], spec["qpv"]
+    m = folium.Map(location=(lat, lon), zoom_start=14)
+
+    if qpv:
+        folium.PolyLine([(y, x) for x, y in qpv["anneau"]], color="blue", fill=True, fill_color="lightblue",
+                        weight=2.5, fill_opacity=0.6).add_to(m)
+        ligne_qpv = f"""✅ {spec['etat_qpv']} : {qpv['nom_qp']}<br>
+                📏 Distance : {qpv['distance_m']} mètres <br>"""
+    else:
+        ligne_qpv = "🚫 Quartier Prioritaire : Aucun QPV trouvé <br>"
+
+    # Ajouter le point de l'adresse à notre carte
+    folium.Marker(
+        location=(lat, lon),
+        icon=folium.Icon(color="red", icon="info-sign")
+    ).add_to(m)
+
+    # 🔥 Ajouter une couche de texte (affichage permanent)
+    info_text = f"""
+        <div style="
+            background-color: rgba(255, 255, 255, 0.8);
+            padding: 10px;
+            border-radius: 5px;
+            font-size: 12px;
+            font-weight: bold;
+            text-align: left;
+            width: 400px;">
+            📅 Aujourd'hui : {_date_fr(spec)}<br>
+            📍 <b>{spec['address']}</b><br>
+            {ligne_qpv}
+            🔗 <a href="https://public.opendatasoft.com/api/explore/v2.1/console" target="_blank" style="color:blue; text-decoration:none;">
+                Source OpenDataSoft
+                </a>
+        </div>
+    """
+    # Ajouter le texte comme un "marqueur invisible" sur la carte
+    folium.Marker(
+        location=(lat, lon),  # Position sur la carte
+        icon=DivIcon(
+            icon_size=(350, 50),  # Taille de l'affichage
+            icon_anchor=(0, 0),  # Ancrage en haut à gauche
+            html=info_text,  # Contenu HTML
+        ),
+    ).add_to(m)
+    return m
+
+
+async def obtenir_carte(cle: str, format: str = "html") -> Optional[str]:
+    """
+    Retourne le chemin du fichier de la carte, rendu au premier accès.
+    None si la clé est inconnue.
+    """
+    chemins = chemins_carte(cle)
+    if os.path.exists(chemins[format]):
+        metrics.incrementer(f"qpv_carte.{format}.hit")
+        marquer_acces(cle)
+        return chemins[format]
+
+    # Un seul rendu à la fois par carte et par format
+    verrou = _verrous.get((cle, format))
+    if verrou is None:
+        verrou = _verrous[(cle, format)] = asyncio.Lock()
+    async with verrou:
+        if os.path.exists(chemins[format]):
+            return chemins[format]
+
+        spec = await asyncio.to_thread(_lire_spec, cle)
+        if spec is None:
+            return None
+        marquer_acces(cle)
+
+        metrics.incrementer(f"qpv_carte.{format}.rendu")
+        with metrics.chronometrer(f"qpv_carte.{format}.rendu"):
+            if format == "html" or settings.QPV_MAP_RENDERER == "navigateur":
+                if not os.path.exists(chemins["html"]):
+                    m = construire_carte_folium(spec)
+                    await asyncio.to_thread(_ecrire_atomique, chemins["html"], m.save)
+            if format == "png":
+                anneau = spec["qpv"]["anneau"] if spec["qpv"] else None
+                tmp = f"{cle}.{uuid.uuid4().hex}.tmp.png"
+                tmp = os.path.join(QPV_CARTES_DIR, tmp)
+                try:
+                    await generer_image_carte(chemins["html"], tmp, spec["lat"], spec["lon"], anneau, lignes_info(spec))
+                    if os.path.exists(tmp):
+                        os.replace(tmp, chemins["png"])
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+
+    return chemins[format] if os.path.exists(chemins[format]) else None
+
+
+async def generer_image_carte(map_path, image_path, lat, lon, coord_qpv, lignes_info):
+    """
+    Génère le PNG de la carte : rendu statique Pillow par défaut (quelques ms),
+    ou capture de la carte folium par Chrome headless si QPV_MAP_RENDERER="navigateur".
+    """
+    if settings.QPV_MAP_RENDERER != "navigateur":
+        await asyncio.to_thread(generer_carte_png, image_path, lat, lon, coord_qpv, lignes_info)
+        return
+
+    pool = get_pool_navigateurs()
+    try:
+        if pool is not None:
+            await pool.capturer(map_path, image_path)
+        else:
+            await asyncio.to_thread(save_map_as_image, map_path, image_path)
+    except Exception as e:
+        print(f"❌ Erreur lors de la capture : {e}")
+
+
+def save_map_as_image(map_path, image_path):
+    """Capture une image d'une page HTML avec un Chrome headless éphémère (hors pool)."""
+    # Imports locaux : Chrome et Selenium ne sont nécessaires qu'en mode "navigateur"
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")  # Exécution sans interface graphique
+    options.add_argument("--no-sandbox")  # Évite les erreurs de sandboxing
+    options.add_argument("--disable-dev-shm-usage")  # Évite les problèmes de mémoire dans Docker
+    options.add_argument("--window-size=800x600")  # Définit une taille fixe pour la capture
+    options.add_argument("--disable-gpu")  # Désactive l'accélération GPU
+    options.add_argument("--disable-software-rasterizer")  # Évite certains crashs graphiques
+
+    # Installer automatiquement le bon ChromeDriver
+    service = Service(ChromeDriverManager().install())
+    driver = webdriver.Chrome(service=service, options=options)
+
+    try:
+        capturer_carte(driver, map_path, image_path)
+    except Exception as e:
+        print(f"❌ Erreur lors de la capture : {e}")
+    finally:
+        driver.quit()  # Fermer le navigateur
@@ -0,0 +1,253 @@
+"""
+Traitement QPV en flux pour les gros fichiers (dizaines de milliers de lignes).
+
+Le fichier d'entrée n'est jamais chargé en entier : le CSV est lu par blocs
+(pd.read_csv(chunksize=...)) et le XLSX ligne à ligne (openpyxl en read_only).
+Chaque lot traité est ajouté à un fichier intermédiaire JSON Lines puis un point
+de reprise est enregistré, tous deux dans JOBS_DIR (non servi, purgé par le
+nettoyage) ; un traitement interrompu reprend au dernier lot terminé. La sortie finale est écrite ligne à ligne (csv.writer ou xlsxwriter en
+constant_memory), la mémoire reste donc constante quelle que soit la taille.
+
+Le traitement tourne dans le worker de jobs du processus de l'API : toutes les
+lectures et écritures de fichiers passent par asyncio.to_thread pour ne pas
+bloquer la boucle d'événements (et donc les requêtes HTTP) sur les gros fichiers.
+"""
+import asyncio
+import csv
+import hashlib
+import json
+import os
+from typing import Iterator, Optional
+
+import pandas as pd
+from fastapi import Request
+
+from app.config import JOBS_DIR, get_base_url, settings
+from app.services.service_qpv_batch import (
+    COLONNES_RESULTAT, cumuler_statistiques, traiter_colonne_qpv, trouver_colonne_adresse
+)
+from app.utils import metrics
+from app.utils.progression import Progression
+
+
+def empreinte_fichier(chemin: str) -> str:
+    """SHA-256 du fichier, lu par blocs : identifie le traitement pour la reprise."""
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def lire_entetes(input_path: str, file_type: str) -> list:
+    if file_type == "csv":
+        return list(pd.read_csv(input_path, nrows=0).columns)
+    if file_type == "xlsx":
+        from openpyxl import load_workbook
+
+        wb = load_workbook(input_path, read_only=True, data_only=True)
+        try:
+            premiere = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+            return [c for c in premiere]
+        finally:
+            wb.close()
+    raise ValueError("❌ Format de fichier non supporté.")
+
+
+def compter_lignes(input_path: str, file_type: str) -> int:
+    """Nombre de lignes de données, sans charger le fichier en mémoire."""
+    if file_type == "csv":
+        return sum(len(bloc) for bloc in pd.read_csv(input_path, usecols=[0], chunksize=50_000, dtype=str))
+    from openpyxl import load_workbook
+
+    wb = load_workbook(input_path, read_only=True)
+    try:
+        return max((wb.active.max_row or 1) - 1, 0)
+    finally:
+        wb.close()
+
+
+def lire_lots(input_path: str, file_type: str, taille_lot: int, deja_traitees: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Itère sur le fichier par DataFrames de `taille_lot` lignes, en sautant les
+    `deja_traitees` premiers enregistrements (et non lignes physiques : une
+    cellule CSV entre guillemets peut contenir des retours à la ligne).
+    """
+    if file_type == "csv":
+        lecteur = pd.read_csv(input_path, chunksize=taille_lot, dtype=str, keep_default_na=False)
+        a_sauter = deja_traitees
+        with lecteur:
+            for lot in lecteur:
+                if a_sauter >= len(lot):
+                    a_sauter -= len(lot)
+                    continue
+                if a_sauter:
+                    lot, a_sauter = lot.iloc[a_sauter:], 0
+                yield lot
+        return
+
+    if file_type != "xlsx":
+        raise ValueError("❌ Format de fichier non supporté.")
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        lignes = wb.active.iter_rows(values_only=True)
+        entetes = list(next(lignes, ()))
+        lot = []
+        for i, ligne in enumerate(lignes):
+            if i < deja_traitees:
+                continue
+            lot.append(ligne)
+            if len(lot) == taille_lot:
+                yield pd.DataFrame.from_records(lot, columns=entetes)
+                lot = []
+        if lot:
+            yield pd.DataFrame.from_records(lot, columns=entetes)
+    finally:
+        wb.close()
+
+
+def chemins_reprise(output_path: str) -> tuple:
+    """(fichier partiel, point de reprise) d'une sortie, dans JOBS_DIR : jamais servis avec les résultats."""
+    nom = f"qpv_flux_{hashlib.sha256(os.path.abspath(output_path).encode('utf-8')).hexdigest()[:16]}"
+    return os.path.join(JOBS_DIR, f"{nom}.partiel.jsonl"), os.path.join(JOBS_DIR, f"{nom}.reprise.json")
+
+
+def _charger_reprise(chemin_reprise: str, chemin_partiel: str, empreinte: str) -> tuple:
+    """Retourne (lignes déjà traitées, taille valide du fichier partiel) si la reprise est possible."""
+    if not (os.path.exists(chemin_reprise) and os.path.exists(chemin_partiel)):
+        return 0, 0
+    try:
+        with open(chemin_reprise, "r", encoding="utf-8") as f:
+            reprise = json.load(f)
+    except (OSError, ValueError):
+        return 0, 0
+    if reprise.get("empreinte") != empreinte:
+        return 0, 0
+    return reprise["lignes_traitees"], reprise["octets"]
+
+
+def _enregistrer_reprise(chemin_reprise: str, empreinte: str, lignes_traitees: int, octets: int):
+    tmp = chemin_reprise + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"empreinte": empreinte, "lignes_traitees": lignes_traitees, "octets": octets}, f)
+    os.replace(tmp, chemin_reprise)
+
+
+def _tronquer(chemin: str, octets: int):
+    """Repart de la fin du dernier lot validé (écriture éventuellement tronquée)."""
+    with open(chemin, "a+b") as f:
+        f.truncate(octets)
+
+
+def _ajouter_lot(partiel, lot: pd.DataFrame, resultats: pd.DataFrame) -> int:
+    """Ajoute les lignes du lot et leurs résultats au fichier partiel, synchronisé sur disque ; retourne sa taille."""
+    lignes = zip(lot.itertuples(index=False, name=None), resultats.itertuples(index=False, name=None))
+    for ligne, resultat in lignes:
+        valeurs = [_valeur(v) for v in ligne + resultat]
+        partiel.write((json.dumps(valeurs, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+    partiel.flush()
+    os.fsync(partiel.fileno())
+    return partiel.tell()
+
+
+def _terminer(chemin_partiel: str, chemin_reprise: str, output_path: str, file_type: str, entetes: list):
+    ecrire_sortie(chemin_partiel, output_path, file_type, entetes)
+    os.remove(chemin_partiel)
+    os.remove(chemin_reprise)
+
+
+def _valeur(v):
+    """Valeur sérialisable en JSON (NaN -> None, dates et types numpy -> natifs ou texte)."""
+    if v is None:
+        return None
+    if isinstance(v, float) and v != v:
+        return None
+    if hasattr(v, "item"):
+        return v.item()
+    return v
+
+
+def ecrire_sortie(chemin_partiel: str, output_path: str, file_type: str, entetes: list):
+    """Convertit le fichier JSON Lines intermédiaire en CSV ou XLSX, ligne à ligne."""
+    with open(chemin_partiel, "r", encoding="utf-8") as source:
+        lignes = (json.loads(l) for l in source if l.strip())
+
+        if file_type == "xlsx":
+            import xlsxwriter
+
+            wb = xlsxwriter.Workbook(output_path, {"constant_memory": True, "nan_inf_to_errors": True})
+            ws = wb.add_worksheet()
+            ws.write_row(0, 0, entetes)
+            for i, ligne in enumerate(lignes, start=1):
+                ws.write_row(i, 0, ligne)
+            wb.close()
+        else:
+            with open(output_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(entetes)
+                for ligne in lignes:
+                    writer.writerow(["" if v is None else v for v in ligne])
+
+
+async def recherche_groupqpv_flux(
+    input_path: str,
+    output_path: str,
+    file_type: str,
+    request: Optional[Request] = None,
+    mode: str = "bulk",
+    taille_lot: Optional[int] = None,
+    base_url: Optional[str] = None,
+    progression: Optional[Progression] = None,
+):
+    """
+    Même résultat que recherche_groupqpv, mais en flux et avec reprise : relancer
+    sur le même fichier d'entrée reprend au dernier lot enregistré. Les adresses
+    sont dédoublonnées à l'intérieur de chaque lot.
+    """
+    taille_lot = taille_lot or settings.QPV_FLUX_TAILLE_LOT
+    entetes = await asyncio.to_thread(lire_entetes, input_path, file_type)
+    adresse_col = trouver_colonne_adresse(entetes)
+    if not adresse_col:
+        raise ValueError("❌ Le fichier doit contenir une colonne intitulée 'Adresse' ou 'Adresse complete'.")
+
+    base_url = base_url or get_base_url(request)
+    chemin_partiel, chemin_reprise = chemins_reprise(output_path)
+
+    empreinte = await asyncio.to_thread(empreinte_fichier, input_path)
+    deja_traitees, octets = await asyncio.to_thread(_charger_reprise, chemin_reprise, chemin_partiel, empreinte)
+    if deja_traitees:
+        print(f"🔁 Reprise du traitement à la ligne {deja_traitees + 1}")
+    if progression is not None:
+        progression.definir_total(await asyncio.to_thread(compter_lignes, input_path, file_type))
+        progression.reprendre(deja_traitees)
+
+    await asyncio.to_thread(_tronquer, chemin_partiel, octets)
+
+    traitees = deja_traitees
+    statistiques = None
+    lots = lire_lots(input_path, file_type, taille_lot, deja_traitees)
+    try:
+        with open(chemin_partiel, "ab") as partiel:
+            while (lot := await asyncio.to_thread(next, lots, None)) is not None:
+                resultats, stats_lot = await traiter_colonne_qpv(lot[adresse_col], base_url, mode, progression)
+                statistiques = cumuler_statistiques(statistiques, stats_lot)
+
+                octets = await asyncio.to_thread(_ajouter_lot, partiel, lot, resultats)
+                traitees += len(lot)
+                await asyncio.to_thread(_enregistrer_reprise, chemin_reprise, empreinte, traitees, octets)
+                metrics.incrementer("qpv_flux.lignes", len(lot))
+                print(f"📊 {traitees} lignes traitées")
+    finally:
+        await asyncio.to_thread(lots.close)  # Ferme le lecteur pandas / le classeur openpyxl
+
+    await asyncio.to_thread(
+        _terminer, chemin_partiel, chemin_reprise, output_path, file_type, entetes + COLONNES_RESULTAT
+    )
+    if statistiques is not None:
+        print(f"📊 {statistiques['adresses_uniques']} adresses uniques, "
+              f"taux de déduplication {statistiques['taux_deduplication']:.0%}")
+    print(f"✅ Fichier avec résultats enregistré à : {output_path}")
+    return statistiques
@@ -0,0 +1,317 @@
+"""
+Index local des Quartiers Prioritaires de la politique de la Ville (QPV).
+
+Le snapshot national des QPV (GeoJSON exporté depuis OpenDataSoft) est chargé une
+seule fois en mémoire : les polygones sont projetés en Lambert-93 (ou dans un
+plan local outre-mer) puis rangés dans un STRtree par territoire.
+Le test "dans le QPV / à moins de 300 m" se fait alors en local, sans appel réseau.
+
+Rafraîchir le snapshot :
+    python -m app.services.service_qpv_index refresh            # depuis OpenDataSoft
+    python -m app.services.service_qpv_index refresh chemin.geojson
+"""
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+import requests
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+from app.config import QPV_SNAPSHOT_PATH, settings
+from app.utils import lambert93, metrics
+
+RAYON_TERRE = 6371008.8
+MARGE_ECHELLE = 1.005  # Facteur d'échelle maximal des projections utilisées, arrondi au-dessus
+
+# Territoires hors Lambert-93 : projection équirectangulaire locale centrée sur
+# le territoire (erreur d'échelle < 0,5 % à l'échelle d'une île, négligeable à 300 m)
+ZONES_OUTRE_MER = {
+    "guadeloupe": (-61.9, 15.8, -60.9, 16.6),
+    "martinique": (-61.3, 14.3, -60.7, 15.0),
+    "guyane": (-54.7, 2.0, -51.5, 6.0),
+    "reunion": (55.1, -21.5, 55.9, -20.8),
+    "mayotte": (44.9, -13.1, 45.4, -12.5),
+    "saint_martin": (-63.2, 17.8, -62.7, 18.2),
+}
+
+_index = None
+_index_lock = threading.RLock()
+
+
+class _Zone:
+    """Polygones d'un territoire, projetés une fois dans un plan métrique et indexés."""
+
+    def __init__(self, nom: str, emprise: Optional[tuple]):
+        self.nom = nom
+        self.emprise = emprise
+        self.ids = []  # Indices dans QPVIndex.geometries
+        self.geometries = []  # Géométries projetées (mètres)
+        self.arbre = None
+        if emprise is None:
+            self._centre = None
+        else:
+            self._centre = ((emprise[0] + emprise[2]) / 2, (emprise[1] + emprise[3]) / 2)
+
+    def contient(self, lon, lat):
+        if self.emprise is None:
+            return lambert93.dans_emprise(lon, lat)
+        xmin, ymin, xmax, ymax = self.emprise
+        return (lon >= xmin) & (lon <= xmax) & (lat >= ymin) & (lat <= ymax)
+
+    def projeter(self, lon, lat):
+        if self._centre is None:
+            return lambert93.projeter(lon, lat)
+        lon0, lat0 = self._centre
+        x = RAYON_TERRE * np.cos(np.radians(lat0)) * np.radians(np.asarray(lon) - lon0)
+        y = RAYON_TERRE * np.radians(np.asarray(lat) - lat0)
+        return x, y
+
+    def facteur_echelle(self, lat):
+        """Longueur projetée / longueur au sol."""
+        if self._centre is None:
+            return lambert93.facteur_echelle(lat)
+        return np.ones_like(np.asarray(lat, dtype=float))
+
+    def ajouter(self, i: int, geom):
+        self.ids.append(i)
+        self.geometries.append(shapely.transform(geom, lambda c: np.column_stack(self.projeter(c[:, 0], c[:, 1]))))
+
+    def construire(self, distance_m: float, taille_cellule: float):
+        self.ids = np.asarray(self.ids, dtype=int)
+        self.arbre = STRtree(self.geometries)
+        self._construire_prefiltre(distance_m * MARGE_ECHELLE, taille_cellule)
+
+    def _construire_prefiltre(self, distance: float, taille: float):
+        """
+        Grille de pré-filtrage : cellule (cx, cy) -> QPV dont la zone tampon de
+        `distance` mètres touche la cellule. Un point dont la cellule est absente
+        n'a aucun QPV à moins de `distance` : inutile d'interroger l'arbre.
+        """
+        self.taille_cellule = taille
+        self.distance_prefiltre = distance
+        cellules = defaultdict(list)
+        for j, geom in enumerate(self.geometries):
+            xmin, ymin, xmax, ymax = geom.bounds
+            cxs = np.arange(math.floor((xmin - distance) / taille), math.floor((xmax + distance) / taille) + 1)
+            cys = np.arange(math.floor((ymin - distance) / taille), math.floor((ymax + distance) / taille) + 1)
+            cx, cy = (grille.ravel() for grille in np.meshgrid(cxs, cys))
+            boites = shapely.box(cx * taille, cy * taille, (cx + 1) * taille, (cy + 1) * taille)
+            proches = shapely.distance(geom, boites) <= distance
+            for a, b in zip(cx[proches], cy[proches]):
+                cellules[(int(a), int(b))].append(j)
+        self.cellules = {cle: np.asarray(ids, dtype=int) for cle, ids in cellules.items()}
+
+    def filtrer(self, x, y, distance_plane_max: float):
+        """Masque des points ayant au moins un QPV candidat dans leur cellule."""
+        if distance_plane_max > self.distance_prefiltre:
+            return np.ones(len(x), dtype=bool)  # Grille construite pour une distance plus petite
+        cx = np.floor(np.asarray(x) / self.taille_cellule).astype(int)
+        cy = np.floor(np.asarray(y) / self.taille_cellule).astype(int)
+        return np.fromiter(((a, b) in self.cellules for a, b in zip(cx, cy)), dtype=bool, count=len(cx))
+
+
+class QPVIndex:
+    """
+    Polygones QPV indexés spatialement. Les géométries sont projetées une seule
+    fois au chargement (Lambert-93 en métropole) : la distance au QPV est une
+    distance plane exacte au polygone (multi-polygones et trous compris),
+    ramenée au sol par le facteur d'échelle de la projection.
+    """
+
+    def __init__(self, features: list):
+        self.geometries = []  # WGS84, pour l'affichage des cartes
+        self.proprietes = []
+        self.zones = [_Zone("metropole", None)] + [_Zone(nom, emprise) for nom, emprise in ZONES_OUTRE_MER.items()]
+
+        for feature in features:
+            geometry = feature.get("geometry")
+            if not geometry:
+                continue
+            geom = shape(geometry)
+            if geom.is_empty:
+                continue
+            if not geom.is_valid:
+                geom = geom.buffer(0)  # Répare les polygones auto-intersectés
+
+            centre = geom.representative_point()
+            zone = next((z for z in self.zones if z.contient(centre.x, centre.y)), None)
+            if zone is None:
+                print(f"⚠️ QPV hors des territoires gérés ignoré : {(feature.get('properties') or {}).get('nom_qp')}")
+                continue
+
+            zone.ajouter(len(self.geometries), geom)
+            self.geometries.append(geom)
+            self.proprietes.append(feature.get("properties") or {})
+
+        self.zones = [z for z in self.zones if z.geometries]
+        for zone in self.zones:
+            zone.construire(settings.QPV_DISTANCE_LIMITE_M, settings.QPV_PREFILTRE_CELLULE_M)
+        self.charge_le = time.time()
+
+    def __len__(self):
+        return len(self.geometries)
+
+    @classmethod
+    def depuis_fichier(cls, chemin) -> "QPVIndex":
+        """Construit l'index à partir d'un fichier GeoJSON (FeatureCollection)."""
+        with open(chemin, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("features", []))
+
+    def rechercher(self, lon: float, lat: float, distance_max_m: Optional[int] = None) -> Optional[dict]:
+        """
+        Retourne le QPV contenant le point ou le plus proche dans la limite de
+        `distance_max_m` mètres, ou None si aucun QPV n'est assez proche.
+        """
+        return self.rechercher_lot([lon], [lat], distance_max_m)[0]
+
+    def rechercher_lot(self, lons, lats, distance_max_m: Optional[int] = None) -> list:
+        """
+        Version vectorisée de rechercher() : un seul query_nearest par territoire
+        pour tous les points. Retourne une liste alignée sur les points.
+        """
+        if distance_max_m is None:
+            distance_max_m = settings.QPV_DISTANCE_LIMITE_M
+
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        resultats = [None] * len(lons)
+
+        for zone in self.zones:
+            masque = zone.contient(lons, lats)
+            if not masque.any():
+                continue
+            positions = np.flatnonzero(masque)
+            x, y = zone.projeter(lons[positions], lats[positions])
+            k = zone.facteur_echelle(lats[positions])
+            # Distance plane maximale : distance au sol x facteur d'échelle
+            distance_plane_max = distance_max_m * float(np.max(k))
+
+            # Pré-filtre : les points loin de tout QPV sont écartés sans calcul géométrique
+            candidats = zone.filtrer(x, y, distance_plane_max)
+            metrics.incrementer("qpv.prefiltre.court_circuit", int((~candidats).sum()))
+            metrics.incrementer("qpv.prefiltre.candidats", int(candidats.sum()))
+            if not candidats.any():
+                continue
+            positions, x, y, k = positions[candidats], x[candidats], y[candidats], k[candidats]
+            points = shapely.points(x, y)
+
+            (entrees, voisins), distances = zone.arbre.query_nearest(
+                points, max_distance=distance_plane_max, return_distance=True
+            )
+            distances_sol = distances / k[entrees]
+            for entree, voisin, distance_m in zip(entrees, voisins, distances_sol):
+                position = positions[entree]
+                if distance_m > distance_max_m or resultats[position] is not None:
+                    continue  # Hors limite, ou ex aequo déjà retenu
+                resultats[position] = self._resultat(
+                    int(zone.ids[voisin]), int(round(distance_m)), zone.geometries[voisin], points[entree]
+                )
+
+        return resultats
+
+    def _resultat(self, i: int, distance_m: int, geom_projetee, point_projete) -> dict:
+        proprietes = self.proprietes[i]
+        geom = self.geometries[i]
+        # Contour extérieur de la partie du QPV la plus proche de l'adresse, pour la carte
+        parties = list(getattr(geom, "geoms", [geom]))
+        parties_projetees = list(getattr(geom_projetee, "geoms", [geom_projetee]))
+        if len(parties) == len(parties_projetees):
+            polygone = parties[int(np.argmin([p.distance(point_projete) for p in parties_projetees]))]
+        else:
+            polygone = max(parties, key=lambda g: g.area)
+        return {
+            "nom_qp": proprietes.get("nom_qp"),
+            "code_qp": proprietes.get("code_qp") or proprietes.get("code_quartier"),
+            "distance_m": distance_m,
+            "anneau": [list(c) for c in polygone.exterior.coords],
+        }
+
+
+def statistiques_prefiltre() -> dict:
+    compteurs = metrics.snapshot()["compteurs"]
+    courts_circuits = compteurs.get("qpv.prefiltre.court_circuit", 0)
+    candidats = compteurs.get("qpv.prefiltre.candidats", 0)
+    return {
+        "cellules": sum(len(zone.cellules) for zone in _index.zones) if _index is not None else 0,
+        "courts_circuits": courts_circuits,
+        "candidats": candidats,
+        "taux_court_circuit": metrics.taux(courts_circuits, candidats),
+    }
+
+
+def charger_index_qpv(chemin=QPV_SNAPSHOT_PATH) -> Optional[QPVIndex]:
+    """Charge (ou recharge) l'index depuis le snapshot local s'il existe."""
+    global _index
+    if not os.path.exists(chemin):
+        print(f"⚠️ Snapshot QPV introuvable : {chemin} (recherche en ligne OpenDataSoft)")
+        return None
+
+    start_time = time.time()
+    index = QPVIndex.depuis_fichier(chemin)
+    with _index_lock:
+        _index = index
+    print(f"✅ Index QPV chargé : {len(index)} quartiers en {round(time.time() - start_time, 2)} s")
+    return index
+
+
+def get_qpv_index() -> Optional[QPVIndex]:
+    """Retourne l'index QPV courant (chargé paresseusement au premier appel)."""
+    if _index is None and os.path.exists(QPV_SNAPSHOT_PATH):
+        with _index_lock:
+            if _index is None:
+                charger_index_qpv()
+    return _index
+
+
+def rafraichir_index_qpv(source: Optional[str] = None, chemin=QPV_SNAPSHOT_PATH) -> QPVIndex:
+    """
+    Remplace le snapshot local par `source` (URL ou fichier GeoJSON, par défaut
+    l'export OpenDataSoft) puis reconstruit l'index.
+    """
+    source = source or settings.QPV_SNAPSHOT_URL
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+
+    fd, chemin_tmp = tempfile.mkstemp(suffix=".geojson", dir=os.path.dirname(chemin))
+    os.close(fd)
+    try:
+        if source.startswith(("http://", "https://")):
+            print(f"🌐 Téléchargement du snapshot QPV : {source}")
+            with requests.get(source, stream=True, timeout=300) as response:
+                response.raise_for_status()
+                with open(chemin_tmp, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+        else:
+            print(f"📁 Copie du snapshot QPV : {source}")
+            shutil.copyfile(source, chemin_tmp)
+
+        # On valide le nouveau snapshot avant de remplacer l'ancien
+        index = QPVIndex.depuis_fichier(chemin_tmp)
+        os.replace(chemin_tmp, chemin)
+    finally:
+        if os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+
+    global _index
+    with _index_lock:
+        _index = index
+    print(f"✅ Index QPV reconstruit : {len(index)} quartiers")
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "refresh":
+        print("Usage : python -m app.services.service_qpv_index refresh [URL|fichier.geojson]")
+        sys.exit(1)
+    rafraichir_index_qpv(sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,157 @@
+"""
+Enrichissement d'une liste de SIRET / SIREN avec les fiches Pappers (job "siret_lot").
+
+Les numéros sont nettoyés puis dédoublonnés par SIREN : chaque SIREN unique est
+résolu une seule fois (cache entreprise, puis Pappers sous limite de débit), en
+parallèle. Le fichier produit reprend chaque ligne d'entrée, suivie d'un statut
+et des champs de extraire_infos_entreprise ; il est écrit ligne à ligne.
+"""
+import asyncio
+import csv
+import json
+import os
+import re
+from typing import Optional
+
+import pandas as pd
+
+from app.config import FICHIERS_DIR, settings
+from app.services.service_jobs import enregistrer_type_job
+from app.services.service_pappers import obtenir_entreprise
+from app.services.service_siret_pappers import comptes_avec_pdf, extraire_infos_entreprise, verifier_diffusion
+from app.utils import metrics
+from app.utils.progression import Progression
+
+STATUT_OK = "ok"
+STATUT_INVALIDE = "numéro invalide"
+STATUT_INTROUVABLE = "entreprise introuvable"
+
+COLONNES_SIRET = ["siret", "siren", "numero siret", "numéro siret", "n° siret", "numero_siret"]
+COLONNE_STATUT = "statut_siret"
+
+
+def aplatir(infos: dict) -> dict:
+    """Fiche à plat pour un tableur : siege.x -> siege_x, listes et objets en JSON."""
+    ligne = {}
+    for cle, valeur in infos.items():
+        if cle == "siege" and isinstance(valeur, dict):
+            ligne.update({f"siege_{k}": v for k, v in valeur.items()})
+        elif isinstance(valeur, (list, dict)):
+            ligne[cle] = json.dumps(valeur, ensure_ascii=False) if valeur else ""
+        else:
+            ligne[cle] = valeur
+    return ligne
+
+
+COLONNES_ENTREPRISE = list(aplatir(extraire_infos_entreprise({}, [])))
+
+
+def trouver_colonne_siret(colonnes) -> Optional[str]:
+    return next((col for col in colonnes if str(col).strip().lower() in COLONNES_SIRET), None)
+
+
+def nettoyer_numero(valeur) -> Optional[str]:
+    """SIREN (9 chiffres) extrait d'un SIRET ou SIREN saisi librement, None si invalide."""
+    if valeur is None or (isinstance(valeur, float) and valeur != valeur):
+        return None
+    numero = str(valeur).strip()
+    if numero.endswith(".0"):  # Numéro lu comme un nombre dans un tableur, avant de retirer les séparateurs
+        numero = numero[:-2]
+    numero = re.sub(r"[\s.\-]", "", numero)
+    if numero.isdigit() and len(numero) in (7, 8, 12, 13):
+        # Cellule numérique d'un tableur : les zéros de tête du SIREN ont été perdus
+        numero = numero.zfill(9 if len(numero) <= 8 else 14)
+    if not numero.isdigit() or len(numero) not in (9, 14):
+        return None
+    return numero[:9]
+
+
+async def resoudre_sirens(
+    sirens: list,
+    concurrence: Optional[int] = None,
+    progression: Optional[Progression] = None,
+    poids: Optional[dict] = None,
+) -> dict:
+    """Retourne {siren: (statut, fiche à plat ou {})} ; une erreur n'interrompt pas le lot."""
+    semaphore = asyncio.Semaphore(concurrence or settings.SIRET_LOT_CONCURRENCE)
+
+    async def resoudre(siren: str) -> tuple:
+        async with semaphore:
+            try:
+                data, _ = await obtenir_entreprise(siren)
+                if data is None:
+                    return STATUT_INTROUVABLE, {}
+                refus = verifier_diffusion(data)
+                if refus:
+                    return refus[0], {}
+                metrics.incrementer("siret_lot.ok")
+                return STATUT_OK, aplatir(extraire_infos_entreprise(data, comptes_avec_pdf(data)))
+            except Exception as e:
+                print(f"❌ SIREN {siren} : {e}")
+                metrics.incrementer("siret_lot.erreurs")
+                return f"erreur : {e}", {}
+            finally:
+                if progression is not None:
+                    progression.avancer(poids[siren] if poids is not None else 1)
+
+    resultats = await asyncio.gather(*(resoudre(siren) for siren in sirens))
+    return dict(zip(sirens, resultats))
+
+
+async def enrichir_sirets(df: pd.DataFrame, colonne: str, output_path: str,
+                          progression: Optional[Progression] = None) -> dict:
+    """Écrit le CSV enrichi et retourne les statistiques du lot."""
+    sirens = df[colonne].map(nettoyer_numero)
+    occurrences = sirens.value_counts()
+    uniques = occurrences.index.tolist()
+    if progression is not None:
+        progression.definir_total(len(df))
+        progression.avancer(int(sirens.isna().sum()))
+    print(f"🏢 {len(df)} lignes, {len(uniques)} SIREN uniques à résoudre")
+
+    resolus = await resoudre_sirens(uniques, progression=progression, poids=occurrences.to_dict())
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(list(df.columns) + [COLONNE_STATUT] + COLONNES_ENTREPRISE)
+        for ligne, siren in zip(df.itertuples(index=False, name=None), sirens):
+            statut, fiche = resolus[siren] if isinstance(siren, str) else (STATUT_INVALIDE, {})
+            writer.writerow(list(ligne) + [statut] + [fiche.get(c, "") for c in COLONNES_ENTREPRISE])
+
+    return {
+        "lignes": len(df),
+        "sirens_uniques": len(uniques),
+        "ok": sum(1 for statut, _ in resolus.values() if statut == STATUT_OK),
+    }
+
+
+def lire_fichier_sirets(input_path: str, file_type: str) -> tuple:
+    """(DataFrame en texte, colonne des numéros) ; lève ValueError si la colonne est absente."""
+    if file_type == "xlsx":
+        df = pd.read_excel(input_path, dtype=str, keep_default_na=False).fillna("")
+    elif file_type == "csv":
+        df = pd.read_csv(input_path, dtype=str, sep=None, engine="python", keep_default_na=False)
+    else:
+        raise ValueError("❌ Format de fichier non supporté.")
+    colonne = trouver_colonne_siret(df.columns)
+    if not colonne:
+        raise ValueError("❌ Le fichier doit contenir une colonne intitulée 'SIRET' ou 'SIREN'.")
+    return df, colonne
+
+
+@enregistrer_type_job("siret_lot")
+async def job_enrichir_sirets(job_id: str, parametres: dict, progression: Progression) -> str:
+    """Exécution par le worker de jobs ; retourne le nom du fichier enrichi dans FICHIERS_DIR."""
+    if "numeros" in parametres:
+        df, colonne = pd.DataFrame({"siret": parametres["numeros"]}), "siret"
+    else:
+        df, colonne = lire_fichier_sirets(parametres["input_path"], parametres["file_type"])
+
+    nom_sortie = f"entreprises_{job_id}.csv"
+    statistiques = await enrichir_sirets(df, colonne, os.path.join(FICHIERS_DIR, nom_sortie), progression)
+    print(f"📊 {statistiques['lignes']} lignes, {statistiques['sirens_uniques']} SIREN uniques, "
+          f"{statistiques['ok']} fiches trouvées")
+
+    if "input_path" in parametres:
+        os.remove(parametres["input_path"])
+    return nom_sortie
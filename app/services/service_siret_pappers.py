@@ -1,36 +1,202 @@
 from fastapi import Request
+import base64
 import csv
-from app.config import get_base_url
-from app.utils.file_encoded import encode_file_to_base64
-from app.config import FICHIERS_DIR
-import os
-import requests
-from fastapi import HTTPException
-from app.config import settings
+import hashlib
+import io
+from app.config import get_base_url, settings
+import httpx
+from typing import Optional
+from app.services.service_pappers import lire_entreprise_en_cache, obtenir_entreprise
+from app.utils.cache_lru import CacheLRU
+
+URL_EXPORTS_COMPTES = "/api-mca/v1/siret/comptes"
+
+ENTETES_COMPTES = [
+    "Nom Entreprise", "Siret", "Adresse", "Effectif",
+    "Date Création", "Code NAF", "Activité",
+    "Année clôture", "Date dépôt", "Type comptes",
+    "Nom fichier PDF", "Tokens"
+]
+
+# CSV des comptes générés récemment, par identifiant "<siren>-<empreinte>"
+exports_comptes = CacheLRU(
+    taille_max=settings.COMPTES_CSV_CACHE_TAILLE,
+    ttl=settings.COMPTES_CSV_TTL_MINUTES * 60,
+)
       
-async def get_entreprise_process(numero_siret: str, request: Request):
+def comptes_avec_pdf(data: dict) -> list:
+    return [compte for compte in data.get("comptes", []) if compte.get("nom_fichier_pdf") is not None]
+
+
+def generer_csv_comptes(data: dict) -> bytes:
+    """CSV (séparateur ;) des comptes déposés avec PDF, construit en mémoire."""
+    tampon = io.StringIO()
+    writer = csv.writer(tampon, delimiter=";")
+    writer.writerow(ENTETES_COMPTES)
+    siege = data.get("siege") or {}
+    for compte in comptes_avec_pdf(data):
+        writer.writerow([
+            data.get("nom_entreprise", "N/A"),
+            siege.get("siret", "Adresse non disponible"),
+            siege.get("adresse", "Adresse non disponible"),
+            data.get("effectif", "Non renseigné"),
+            data.get("date_creation", "N/A"),
+            data.get("code_naf", "N/A"),
+            data.get("activite", "N/A"),
+            compte.get("annee_cloture", "N/A"),
+            compte.get("date_depot_formate", "N/A"),
+            compte.get("type_comptes", "N/A"),
+            compte.get("nom_fichier_pdf", "N/A"),
+            compte.get("token", "N/A")
+        ])
+    return tampon.getvalue().encode("utf-8")
+
+
+def id_export_comptes(siren: str, contenu: bytes) -> str:
+    return f"{siren}-{hashlib.sha256(contenu).hexdigest()[:32]}"
+
+
+def enregistrer_export_comptes(siren: str, contenu: bytes) -> str:
+    """Garde le CSV en mémoire et retourne son identifiant (même contenu, même identifiant)."""
+    artefact_id = id_export_comptes(siren, contenu)
+    exports_comptes.set(artefact_id, contenu)
+    return artefact_id
+
+
+async def obtenir_export_comptes(artefact_id: str) -> Optional[bytes]:
+    """
+    CSV d'un identifiant d'export. Absent de la mémoire (autre processus, expiré),
+    il est régénéré depuis la fiche entreprise en cache, et servi seulement si son
+    empreinte correspond encore. Pappers n'est jamais appelé : un lien de
+    téléchargement ne consomme pas de quota, il expire avec le cache.
+    """
+    contenu = exports_comptes.get(artefact_id)
+    if contenu is not None:
+        return contenu
+    siren = artefact_id.split("-", 1)[0]
+    entree = await lire_entreprise_en_cache(siren)
+    if entree is None:
+        return None
+    data, _ = entree
+    contenu = generer_csv_comptes(data)
+    if id_export_comptes(siren, contenu) != artefact_id:
+        return None  # Les comptes ont changé depuis : l'export demandé n'existe plus
+    exports_comptes.set(artefact_id, contenu)
+    return contenu
+
+
+def verifier_diffusion(data: dict) -> Optional[tuple]:
+    """(message, status_code) si la fiche ne peut pas être exploitée, None sinon."""
+    if not data.get("siren"):
+        return "Entreprise non trouvée dans la réponse", 404
+    if not data.get("diffusable", True):
+        return "Les données de cette entreprise ne sont pas diffusables", 403
+    if data.get("opposition_utilisation_commerciale", False):
+        return "Cette entreprise s'oppose à l'utilisation commerciale de ses données", 403
+    return None
+
+
+def extraire_infos_entreprise(data: dict, comptes_disponibles: list) -> dict:
+    """Champs retenus de la fiche Pappers (réponse de /siret et fichiers enrichis en lot)."""
+    return {
+        "siren": data.get("siren"),
+        "siren_formate": data.get("siren_formate"),
+        "nom_entreprise": data.get("nom_entreprise"),
+        "denomination": data.get("denomination"),
+        "forme_juridique": data.get("forme_juridique"),
+        "date_creation": data.get("date_creation"),
+        "date_creation_formate": data.get("date_creation_formate"),
+        "capital": data.get("capital"),
+        "capital_formate": data.get("capital_formate"),
+        "code_naf": data.get("code_naf"),
+        "libelle_code_naf": data.get("libelle_code_naf"),
+        "activite": data.get("objet_social"),
+        "effectif": data.get("effectif"),
+        "effectif_min": data.get("effectif_min"),
+        "effectif_max": data.get("effectif_max"),
+        "annee_effectif": data.get("annee_effectif"),
+        "tranche_effectif": data.get("tranche_effectif"),
+        
+        # Informations sur la radiation
+        "entreprise_cessee": data.get("entreprise_cessee"),
+        "date_cessation": data.get("date_cessation"),
+        "date_cessation_formate": data.get("date_cessation_formate"),
+        "statut_consolide": data.get("statut_consolide"),
+        
+        # Informations SIRENE
+        "derniere_mise_a_jour_sirene": data.get("derniere_mise_a_jour_sirene"),
+        "dernier_traitement": data.get("dernier_traitement"),
+        "diffusable": data.get("diffusable"),
+        "opposition_utilisation_commerciale": data.get("opposition_utilisation_commerciale"),
+        
+        # Informations RCS
+        "statut_rcs": data.get("statut_rcs"),
+        "greffe": data.get("greffe"),
+        "numero_rcs": data.get("numero_rcs"),
+        "date_immatriculation_rcs": data.get("date_immatriculation_rcs"),
+        "date_radiation_rcs": data.get("date_radiation_rcs"),
+        
+        # Informations RNE
+        "statut_rne": data.get("statut_rne"),
+        "date_immatriculation_rne": data.get("date_immatriculation_rne"),
+        "date_radiation_rne": data.get("date_radiation_rne"),
+        
+        # Informations TVA
+        "numero_tva_intracommunautaire": data.get("numero_tva_intracommunautaire"),
+        
+        # Informations du siège
+        "siege": {
+            "adresse": data.get("siege", {}).get("adresse_ligne_1"),
+            "code_postal": data.get("siege", {}).get("code_postal"),
+            "ville": data.get("siege", {}).get("ville"),
+            "siret": data.get("siege", {}).get("siret"),
+            "siret_formate": data.get("siege", {}).get("siret_formate"),
+            "type_etablissement": data.get("siege", {}).get("type_etablissement"),
+            "date_de_creation": data.get("siege", {}).get("date_de_creation"),
+            "etablissement_cesse": data.get("siege", {}).get("etablissement_cesse"),
+            "date_cessation": data.get("siege", {}).get("date_cessation"),
+            "latitude": data.get("siege", {}).get("latitude"),
+            "longitude": data.get("siege", {}).get("longitude")
+        },
+        
+        # Autres informations importantes
+        "representants": data.get("representants", []),
+        "beneficiaires_effectifs": data.get("beneficiaires_effectifs", []),
+        "derniers_statuts": data.get("derniers_statuts"),
+        "extrait_immatriculation": data.get("extrait_immatriculation"),
+        "publications_bodacc": data.get("publications_bodacc", []),
+        "depots_actes": data.get("depots_actes", []),
+        "conventions_collectives": data.get("conventions_collectives", []),
+        "comptes": comptes_disponibles,
+        
+        # Informations supplémentaires
+        "economie_sociale_solidaire": data.get("economie_sociale_solidaire"),
+        "societe_a_mission": data.get("societe_a_mission"),
+        "associe_unique": data.get("associe_unique"),
+        "duree_personne_morale": data.get("duree_personne_morale"),
+        "date_debut_activite": data.get("date_debut_activite"),
+        "date_debut_premiere_activite": data.get("date_debut_premiere_activite"),
+        "prochaine_date_cloture_exercice": data.get("prochaine_date_cloture_exercice"),
+        "prochaine_date_cloture_exercice_formate": data.get("prochaine_date_cloture_exercice_formate")
+    }
+
+
+async def get_entreprise_process(numero_siret: str, request: Request, sans_cache: bool = False, avec_base64: bool = False):
     print(f"🚀 [SERVICE] Début get_entreprise_process pour SIRET: {numero_siret}")
-    print(f"🔑 [SERVICE] Utilisation de l'API key: {settings.PAPPERS_API_KEY[:5]}...")
- 
-    url = f"https://api.pappers.fr/v2/entreprise?siren={numero_siret}&api_token={settings.PAPPERS_API_KEY}"
-    print(f"🌐 [SERVICE] Appel API Pappers: {url}")
 
     try:
-        print("📡 [SERVICE] Envoi de la requête à l'API Pappers...")
-        response = requests.get(url)
-        print(f"📥 [SERVICE] Réponse reçue - Status: {response.status_code}")
-        
-        if response.status_code == 404:
+        print("📡 [SERVICE] Récupération de la fiche Pappers...")
+        data, source = await obtenir_entreprise(numero_siret, sans_cache)
+        print(f"📥 [SERVICE] Fiche obtenue (source : {source})")
+
+        if data is None:
             print("❌ [SERVICE] Entreprise non trouvée (404)")
             return {
                 "message": "Entreprise non trouvée",
                 "entreprise_data": None,
                 "status_code": 404
             }
-            
-        response.raise_for_status()
-        data = response.json()
-        
+
         # Ajout de logs détaillés pour la réponse
         print("🔍 [SERVICE] Réponse brute de l'API Pappers:")
         print(f"📄 [SERVICE] SIREN: {data.get('siren')}")
@@ -42,41 +208,26 @@ async def get_entreprise_process(numero_siret: str, request: Request):
         print(f"📄 [SERVICE] Siège: {data.get('siege')}")
         print(f"✅ [SERVICE] Données JSON reçues: {bool(data)}")
                
-        if not data.get("siren"):
-            print("❌ [SERVICE] Entreprise non trouvée dans la réponse")
-            return {
-                "message": "Entreprise non trouvée dans la réponse",
-                "entreprise_data": None,
-                "status_code": 404
-            }
-
-        # Vérification de la diffusion des données
-        if not data.get("diffusable", True):
-            print("⚠️ [SERVICE] Données non diffusables")
-            return {
-                "message": "Les données de cette entreprise ne sont pas diffusables",
-                "entreprise_data": None,
-                "status_code": 403
-            }
-
-        # Vérification de l'opposition à l'utilisation commerciale
-        if data.get("opposition_utilisation_commerciale", False):
-            print("⚠️ [SERVICE] Opposition à l'utilisation commerciale")
+        # Fiche vide, non diffusable ou opposée à l'utilisation commerciale
+        refus = verifier_diffusion(data)
+        if refus:
+            message, status_code = refus
+            print(f"⚠️ [SERVICE] {message}")
             return {
-                "message": "Cette entreprise s'oppose à l'utilisation commerciale de ses données",
+                "message": message,
                 "entreprise_data": None,
-                "status_code": 403
+                "status_code": status_code
             }
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         print(f"❌ [SERVICE] Erreur HTTP: {str(e)}")
         return {
             "message": f"Erreur API Pappers : {str(e)}",
             "entreprise_data": None,
-            "status_code": response.status_code
+            "status_code": e.response.status_code
         }
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"❌ [SERVICE] Erreur de connexion: {str(e)}")
         return {
             "message": f"Erreur de connexion à Pappers : {str(e)}",
@@ -87,56 +238,20 @@ async def get_entreprise_process(numero_siret: str, request: Request):
     try:
         base_url = get_base_url(request)
         print(f"🌐 [SERVICE] URL de base: {base_url}")
-        csv_url = os.path.join(FICHIERS_DIR, "entreprise_data.csv")
-        print(f"📁 [SERVICE] Chemin du fichier CSV: {csv_url}")
-
         print("📊 [SERVICE] Traitement des données comptables...")
         comptes = data.get("comptes", [])
         print(f"📈 [SERVICE] Nombre total de comptes trouvés: {len(comptes)}")
         
-        comptes_disponibles = [
-            compte for compte in comptes if compte.get("nom_fichier_pdf") is not None
-        ]
+        comptes_disponibles = comptes_avec_pdf(data)
         print(f"📊 [SERVICE] Nombre de comptes avec PDF disponibles: {len(comptes_disponibles)}")
 
-        print("📝 [SERVICE] Génération du fichier CSV...")
-        with open(csv_url, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile, delimiter=";")
-            writer.writerow([
-                "Nom Entreprise", "Siret", "Adresse", "Effectif",
-                "Date Création", "Code NAF", "Activité",
-                "Année clôture", "Date dépôt", "Type comptes",
-                "Nom fichier PDF", "Tokens"
-            ])
-
-            for compte in comptes_disponibles:
-                writer.writerow([
-                    data.get("nom_entreprise", "N/A"),
-                    data["siege"].get("siret", "Adresse non disponible"),
-                    data["siege"].get("adresse", "Adresse non disponible"),
-                    data.get("effectif", "Non renseigné"),
-                    data.get("date_creation", "N/A"),
-                    data.get("code_naf", "N/A"),
-                    data.get("activite", "N/A"),
-                    compte.get("annee_cloture", "N/A"),
-                    compte.get("date_depot_formate", "N/A"),
-                    compte.get("type_comptes", "N/A"),
-                    compte.get("nom_fichier_pdf", "N/A"),
-                    compte.get("token", "N/A")
-                ])
-        print("✅ [SERVICE] Fichier CSV généré avec succès")
-
-        print("🔍 [SERVICE] Vérification de l'existence du fichier CSV...")
-        if os.path.exists(csv_url):
-            print("📄 [SERVICE] Encodage du fichier CSV en base64...")
-            csv_base64 = encode_file_to_base64(csv_url)
-            print("✅ [SERVICE] Encodage CSV terminé")
-        else:
-            print("⚠️ [SERVICE] Fichier CSV non trouvé")
-            csv_base64 = None
-
-        pdf_path = f"{base_url}/fichiers/entreprise_data.csv"
-        print(f"🔗 [SERVICE] URL de téléchargement générée: {pdf_path}")
+        print("📝 [SERVICE] Génération du CSV des comptes en mémoire...")
+        contenu_csv = generer_csv_comptes(data)
+        artefact_id = enregistrer_export_comptes(data["siren"], contenu_csv)
+        csv_base64 = base64.b64encode(contenu_csv).decode("utf-8") if avec_base64 else ""
+
+        download_url = f"{base_url}{URL_EXPORTS_COMPTES}/{artefact_id}"
+        print(f"🔗 [SERVICE] URL de téléchargement générée: {download_url}")
        
         print("✨ [SERVICE] Préparation de la réponse finale...")
         
@@ -145,93 +260,16 @@ async def get_entreprise_process(numero_siret: str, request: Request):
         for key in ["nom_entreprise", "denomination", "forme_juridique", "date_creation", "code_naf"]:
             print(f"📊 [SERVICE] {key}: {data.get(key)}")
         
-        entreprise_info = {
-            "siren": data.get("siren"),
-            "siren_formate": data.get("siren_formate"),
-            "nom_entreprise": data.get("nom_entreprise"),
-            "denomination": data.get("denomination"),
-            "forme_juridique": data.get("forme_juridique"),
-            "date_creation": data.get("date_creation"),
-            "date_creation_formate": data.get("date_creation_formate"),
-            "capital": data.get("capital"),
-            "capital_formate": data.get("capital_formate"),
-            "code_naf": data.get("code_naf"),
-            "libelle_code_naf": data.get("libelle_code_naf"),
-            "activite": data.get("objet_social"),
-            "effectif": data.get("effectif"),
-            "effectif_min": data.get("effectif_min"),
-            "effectif_max": data.get("effectif_max"),
-            "annee_effectif": data.get("annee_effectif"),
-            "tranche_effectif": data.get("tranche_effectif"),
-            
-            # Informations sur la radiation
-            "entreprise_cessee": data.get("entreprise_cessee"),
-            "date_cessation": data.get("date_cessation"),
-            "date_cessation_formate": data.get("date_cessation_formate"),
-            "statut_consolide": data.get("statut_consolide"),
-            
-            # Informations SIRENE
-            "derniere_mise_a_jour_sirene": data.get("derniere_mise_a_jour_sirene"),
-            "dernier_traitement": data.get("dernier_traitement"),
-            "diffusable": data.get("diffusable"),
-            "opposition_utilisation_commerciale": data.get("opposition_utilisation_commerciale"),
-            
-            # Informations RCS
-            "statut_rcs": data.get("statut_rcs"),
-            "greffe": data.get("greffe"),
-            "numero_rcs": data.get("numero_rcs"),
-            "date_immatriculation_rcs": data.get("date_immatriculation_rcs"),
-            "date_radiation_rcs": data.get("date_radiation_rcs"),
-            
-            # Informations RNE
-            "statut_rne": data.get("statut_rne"),
-            "date_immatriculation_rne": data.get("date_immatriculation_rne"),
-            "date_radiation_rne": data.get("date_radiation_rne"),
-            
-            # Informations TVA
-            "numero_tva_intracommunautaire": data.get("numero_tva_intracommunautaire"),
-            
-            # Informations du siège
-            "siege": {
-                "adresse": data.get("siege", {}).get("adresse_ligne_1"),
-                "code_postal": data.get("siege", {}).get("code_postal"),
-                "ville": data.get("siege", {}).get("ville"),
-                "siret": data.get("siege", {}).get("siret"),
-                "siret_formate": data.get("siege", {}).get("siret_formate"),
-                "type_etablissement": data.get("siege", {}).get("type_etablissement"),
-                "date_de_creation": data.get("siege", {}).get("date_de_creation"),
-                "etablissement_cesse": data.get("siege", {}).get("etablissement_cesse"),
-                "date_cessation": data.get("siege", {}).get("date_cessation"),
-                "latitude": data.get("siege", {}).get("latitude"),
-                "longitude": data.get("siege", {}).get("longitude")
-            },
-            
-            # Autres informations importantes
-            "representants": data.get("representants", []),
-            "beneficiaires_effectifs": data.get("beneficiaires_effectifs", []),
-            "derniers_statuts": data.get("derniers_statuts"),
-            "extrait_immatriculation": data.get("extrait_immatriculation"),
-            "publications_bodacc": data.get("publications_bodacc", []),
-            "depots_actes": data.get("depots_actes", []),
-            "conventions_collectives": data.get("conventions_collectives", []),
-            "comptes": comptes_disponibles,
-            
-            # Informations supplémentaires
-            "economie_sociale_solidaire": data.get("economie_sociale_solidaire"),
-            "societe_a_mission": data.get("societe_a_mission"),
-            "associe_unique": data.get("associe_unique"),
-            "duree_personne_morale": data.get("duree_personne_morale"),
-            "date_debut_activite": data.get("date_debut_activite"),
-            "date_debut_premiere_activite": data.get("date_debut_premiere_activite"),
-            "prochaine_date_cloture_exercice": data.get("prochaine_date_cloture_exercice"),
-            "prochaine_date_cloture_exercice_formate": data.get("prochaine_date_cloture_exercice_formate")
-        }
+        entreprise_info = extraire_infos_entreprise(data, comptes_disponibles)
         
         print("📊 [SERVICE] Données de l'entreprise extraites avec succès")
         
         return {
             "message": "Données extraites avec succès",
             "entreprise_data": entreprise_info,
+            "download_url": download_url,
+            "csv_file": csv_base64,
+            "source": source,
             "status_code": 200
         }
 
@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+_ABSENT = object()
+
+
+class CacheLRU:
+    """Cache LRU en mémoire, borné en taille, avec expiration optionnelle (TTL en secondes)."""
+
+    def __init__(self, taille_max: int = 1000, ttl: Optional[float] = None):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._donnees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._donnees)
+
+    def get(self, cle, defaut: Any = None):
+        with self._lock:
+            entree = self._donnees.get(cle, _ABSENT)
+            if entree is _ABSENT:
+                return defaut
+            valeur, expire_le = entree
+            if expire_le is not None and expire_le < time.time():
+                del self._donnees[cle]
+                return defaut
+            self._donnees.move_to_end(cle)
+            return valeur
+
+    def set(self, cle, valeur, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expire_le = time.time() + ttl if ttl else None
+        with self._lock:
+            self._donnees[cle] = (valeur, expire_le)
+            self._donnees.move_to_end(cle)
+            while len(self._donnees) > self.taille_max:
+                self._donnees.popitem(last=False)
+
+    def delete(self, cle):
+        with self._lock:
+            self._donnees.pop(cle, None)
+
+    def clear(self):
+        with self._lock:
+            self._donnees.clear()
@@ -1,7 +1,8 @@
 import os
 import time
 from apscheduler.schedulers.background import BackgroundScheduler
-from app.config import STATIC_IMAGES_DIR, STATIC_MAPS_DIR, FICHIERS_DIR
+from app.config import STATIC_IMAGES_DIR, STATIC_MAPS_DIR, FICHIERS_DIR, JOBS_DIR, settings
+from app.services.service_qpv_cartes import evincer_cartes
 
 # === Paramètres === 10080=Une semaine
 CLEANUP_CONFIG = [
@@ -12,7 +13,13 @@ CLEANUP_CONFIG = [
     },
     {
         "folder": FICHIERS_DIR,
-        "extensions": (".png", ".jpg", ".jpeg",".zip",".html", ".pdf", ".csv"),
+        "extensions": (".png", ".jpg", ".jpeg",".zip",".html", ".pdf", ".csv", ".xlsx"),
+        "age_limit_minutes": 3360
+    },
+    {
+        # Fichiers d'entrée des jobs en erreur ou abandonnés
+        "folder": JOBS_DIR,
+        "extensions": (".csv", ".xlsx", ".json", ".jsonl"),
         "age_limit_minutes": 3360
     },
     {
@@ -51,6 +58,14 @@ def cleanup_temp_files():
         if deleted_files:
             print(f"🧹 {len(deleted_files)} fichiers supprimés de {folder} :", deleted_files)
 
+    # Cartes QPV : éviction selon le dernier accès (index_acces.json), pas selon la date du fichier
+    try:
+        evincees = evincer_cartes(settings.QPV_CARTES_TTL_MINUTES)
+        if evincees:
+            print(f"🧹 {len(evincees)} cartes QPV non consultées supprimées")
+    except Exception as e:
+        print(f"⚠️ Erreur lors de l'éviction des cartes QPV : {e}")
+
 def start_cleanup_scheduler():
     if not scheduler.running:
         # Nettoyage quotidien à 01h00 du matin
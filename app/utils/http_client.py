@@ -0,0 +1,104 @@
+"""
+Client HTTP asynchrone partagé (httpx), créé dans le lifespan de l'application.
+
+Les connexions sont gardées ouvertes (keep-alive) et réutilisées entre les
+requêtes ; chaque appel est borné par des délais d'attente et par un nombre
+maximal de requêtes simultanées vers un même hôte. Les réponses 429 / 5xx et
+les erreurs réseau sont retentées avec un délai exponentiel aléatoire (jitter),
+en respectant l'en-tête Retry-After quand il est fourni.
+
+    response = await requete("GET", "https://api.pappers.fr/v2/entreprise", params={...})
+"""
+import asyncio
+import random
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+from app.utils import metrics
+
+STATUTS_A_RETENTER = {429, 500, 502, 503, 504}
+DELAI_RETRY_MAX_SEC = 30  # Plafond appliqué à Retry-After
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphores = {}
+
+
+def _creer_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT_SEC, connect=settings.HTTP_TIMEOUT_CONNEXION_SEC),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CONNEXIONS_MAX,
+            max_keepalive_connections=settings.HTTP_CONNEXIONS_KEEPALIVE,
+        ),
+        transport=transport,
+    )
+
+
+def demarrer_client_http(transport: Optional[httpx.AsyncBaseTransport] = None):
+    global _client
+    if _client is None:
+        _client = _creer_client(transport)
+        print("✅ Client HTTP partagé démarré")
+
+
+async def arreter_client_http():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _semaphores.clear()
+        print("✅ Client HTTP partagé fermé")
+
+
+def get_client_http() -> httpx.AsyncClient:
+    """Client partagé ; créé à la demande hors lifespan (scripts, worker isolé)."""
+    if _client is None:
+        demarrer_client_http()
+    return _client
+
+
+def _semaphore(hote: str) -> asyncio.Semaphore:
+    if hote not in _semaphores:
+        _semaphores[hote] = asyncio.Semaphore(settings.HTTP_CONCURRENCE_PAR_HOTE)
+    return _semaphores[hote]
+
+
+def _delai_retry(tentative: int, response: Optional[httpx.Response] = None) -> float:
+    """Retry-After si présent (en secondes), sinon backoff exponentiel avec jitter complet."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), DELAI_RETRY_MAX_SEC)
+    return random.uniform(0, settings.HTTP_DELAI_RETRY_SEC * 2 ** (tentative - 1))
+
+
+async def requete(methode: str, url: str, tentatives: Optional[int] = None, **kwargs) -> httpx.Response:
+    """
+    Envoie la requête via le client partagé et retourne la dernière réponse obtenue
+    (le statut est laissé à l'appelant). Lève httpx.HTTPError si toutes les
+    tentatives échouent sur une erreur réseau ou un délai dépassé.
+    """
+    tentatives = tentatives or settings.HTTP_TENTATIVES
+    hote = urlsplit(url).hostname or ""
+    client = get_client_http()
+
+    for tentative in range(1, tentatives + 1):
+        response = None
+        try:
+            async with _semaphore(hote):
+                with metrics.chronometrer(f"http.{hote}"):
+                    response = await client.request(methode, url, **kwargs)
+            if response.status_code not in STATUTS_A_RETENTER or tentative == tentatives:
+                return response
+            print(f"⚠️ {hote} a répondu {response.status_code}, tentative {tentative}/{tentatives}")
+        except httpx.TransportError as e:
+            if tentative == tentatives:
+                metrics.incrementer(f"http.{hote}.erreurs")
+                raise
+            print(f"⚠️ Erreur réseau vers {hote} ({e!r}), tentative {tentative}/{tentatives}")
+
+        metrics.incrementer(f"http.{hote}.retries")
+        await asyncio.sleep(_delai_retry(tentative, response))
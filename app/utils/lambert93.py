@@ -0,0 +1,62 @@
+"""
+Projection Lambert-93 (EPSG:2154, conique conforme sécante sur l'ellipsoïde GRS80),
+implémentée localement pour ne pas dépendre de pyproj.
+
+Les coordonnées WGS84 sont assimilées à RGF93 (écart inférieur au mètre).
+Les fonctions acceptent des scalaires ou des tableaux numpy.
+"""
+import numpy as np
+
+# Ellipsoïde GRS80
+A = 6378137.0
+F = 1 / 298.257222101
+E = np.sqrt(2 * F - F ** 2)
+
+# Paramètres Lambert-93
+LON0 = np.radians(3.0)
+LAT0 = np.radians(46.5)
+LAT1 = np.radians(44.0)
+LAT2 = np.radians(49.0)
+X0 = 700000.0
+Y0 = 6600000.0
+
+# Emprise de validité (France métropolitaine et Corse), en degrés
+EMPRISE = (-9.86, 41.15, 10.38, 51.56)
+
+
+def _m(lat):
+    return np.cos(lat) / np.sqrt(1 - (E * np.sin(lat)) ** 2)
+
+
+def _t(lat):
+    e_sin = E * np.sin(lat)
+    return np.tan(np.pi / 4 - lat / 2) / ((1 - e_sin) / (1 + e_sin)) ** (E / 2)
+
+
+N = (np.log(_m(LAT1)) - np.log(_m(LAT2))) / (np.log(_t(LAT1)) - np.log(_t(LAT2)))
+_F = _m(LAT1) / (N * _t(LAT1) ** N)
+RHO0 = A * _F * _t(LAT0) ** N
+
+
+def projeter(lon, lat):
+    """(lon, lat) en degrés -> (x, y) Lambert-93 en mètres."""
+    lon = np.radians(lon)
+    lat = np.radians(lat)
+    rho = A * _F * _t(lat) ** N
+    theta = N * (lon - LON0)
+    return X0 + rho * np.sin(theta), Y0 + RHO0 - rho * np.cos(theta)
+
+
+def facteur_echelle(lat):
+    """
+    Facteur d'échelle k de la projection à la latitude donnée : une longueur
+    projetée vaut k fois la longueur au sol (k ≈ 1 ± 0,1 % en métropole).
+    """
+    lat = np.radians(lat)
+    rho = A * _F * _t(lat) ** N
+    return rho * N / (A * _m(lat))
+
+
+def dans_emprise(lon, lat):
+    xmin, ymin, xmax, ymax = EMPRISE
+    return (lon >= xmin) & (lon <= xmax) & (lat >= ymin) & (lat <= ymax)
@@ -0,0 +1,86 @@
+"""
+Compteurs et mesures de performance en mémoire (par processus).
+
+    incrementer("geocodage.cache_lru.hit")
+    with chronometrer("qpv.geocodage"):
+        ...
+    snapshot()  # -> exposé par GET /metrics
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+TAILLE_ECHANTILLON = 1000
+
+_lock = threading.Lock()
+_compteurs = defaultdict(int)
+_jauges = {}
+_mesures = defaultdict(lambda: deque(maxlen=TAILLE_ECHANTILLON))
+
+
+def incrementer(nom: str, valeur: int = 1):
+    with _lock:
+        _compteurs[nom] += valeur
+
+
+def definir(nom: str, valeur):
+    """Fixe la valeur instantanée d'une jauge (taille de pool, etc.)."""
+    with _lock:
+        _jauges[nom] = valeur
+
+
+def observer(nom: str, valeur: float):
+    """Enregistre une mesure (en millisecondes pour les durées)."""
+    with _lock:
+        _mesures[nom].append(valeur)
+
+
+@contextmanager
+def chronometrer(nom: str):
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        observer(nom, (time.perf_counter() - debut) * 1000)
+
+
+def percentile(valeurs, p: float):
+    if not valeurs:
+        return None
+    valeurs = sorted(valeurs)
+    rang = min(len(valeurs) - 1, max(0, round(p / 100 * (len(valeurs) - 1))))
+    return valeurs[rang]
+
+
+def taux(succes: int, echecs: int):
+    total = succes + echecs
+    return round(succes / total, 4) if total else None
+
+
+def snapshot() -> dict:
+    with _lock:
+        compteurs = dict(_compteurs)
+        jauges = dict(_jauges)
+        mesures = {nom: list(valeurs) for nom, valeurs in _mesures.items()}
+
+    return {
+        "compteurs": compteurs,
+        "jauges": jauges,
+        "mesures": {
+            nom: {
+                "nombre": len(valeurs),
+                "p50": percentile(valeurs, 50),
+                "p95": percentile(valeurs, 95),
+                "max": max(valeurs) if valeurs else None,
+            }
+            for nom, valeurs in mesures.items()
+        },
+    }
+
+
+def reinitialiser():
+    with _lock:
+        _compteurs.clear()
+        _jauges.clear()
+        _mesures.clear()
@@ -0,0 +1,20 @@
+class Progression:
+    """
+    Avancement d'un traitement long, alimenté par le moteur de traitement et lu
+    périodiquement par le worker de jobs (aucune écriture en base ici).
+    """
+
+    def __init__(self):
+        self.total = None
+        self.faites = 0
+        self.reprises = 0  # Lignes déjà faites avant une reprise (exclues du débit)
+
+    def definir_total(self, total: int):
+        self.total = total
+
+    def reprendre(self, deja_faites: int):
+        self.faites = deja_faites
+        self.reprises = deja_faites
+
+    def avancer(self, n: int = 1):
+        self.faites += n
@@ -0,0 +1,33 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Limiteur de débit asynchrone (seau à jetons) : `debit` requêtes par seconde
+    en régime permanent, avec des rafales jusqu'à `capacite` requêtes.
+
+        limiteur = TokenBucket(debit=10)
+        await limiteur.acquerir()
+    """
+
+    def __init__(self, debit: float, capacite: Optional[float] = None):
+        self.debit = debit
+        self.capacite = capacite or max(1.0, debit)
+        self.jetons = self.capacite
+        self.mise_a_jour = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _remplir(self):
+        maintenant = time.monotonic()
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self.mise_a_jour) * self.debit)
+        self.mise_a_jour = maintenant
+
+    async def acquerir(self, jetons: float = 1):
+        async with self._lock:
+            self._remplir()
+            while self.jetons < jetons:
+                await asyncio.sleep((jetons - self.jetons) / self.debit)
+                self._remplir()
+            self.jetons -= jetons
@@ -0,0 +1,163 @@
+"""
+Banc de mesure de l'aplatissement des réponses Digiforma, sans appel à l'API
+ni à la base.
+
+Mesure le temps CPU de ligne_session, lignes_inscriptions (empreintes comprises)
+et lignes_signatures (toutes les inscriptions modifiées, pire cas) sur une
+réponse enregistrée, ou à défaut sur une réponse synthétique de même forme.
+
+L'étape "pandas" mesure, pour comparaison, le seul aplatissement des
+inscriptions et de leurs signatures avec pandas.json_normalize et explode, sans
+empreintes ni conversion en lignes pour la base : sur la réponse synthétique
+par défaut, il coûte déjà plus que lignes_inscriptions complet, d'où le
+constructeur de tuples en un parcours plutôt qu'un passage par des DataFrames.
+
+    python -m benchmarks.bench_digiforma
+    python -m benchmarks.bench_digiforma --payload reponse_annee.json --repetitions 10
+    python -m benchmarks.bench_digiforma --clients 5000 --sortie resultats.json
+
+Le fichier --payload contient {"trainingSessions": [...], "customers": [...]},
+c'est-à-dire les listes renvoyées par recuperer_pages pour l'année.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+# Variables minimales pour instancier les settings sans .env (aucune connexion n'est ouverte)
+for _nom, _valeur in {
+    "DB_USER": "bench", "DB_PASSWORD": "bench", "DB_NAME": "bench", "DB_HOST": "localhost",
+    "DB_PORT": "5432", "ENVIRONNEMENT": "development", "SECRET_KEY": "bench", "EMAIL_SENDER": "bench@example.org",
+}.items():
+    os.environ.setdefault(_nom, _valeur)
+
+from app.services.service_digiforma_sync import ligne_session, lignes_inscriptions, lignes_signatures  # noqa: E402
+
+TYPES_EVALUATION = ["TOTAL", "PRE", "HOT", "COLD"]
+CRENEAUX = ["morning", "afternoon"]
+
+
+def generer_payload(sessions: int, clients: int, graine: int = 1) -> dict:
+    """Réponse synthétique de la forme de REQUETE_SESSIONS / REQUETE_CLIENTS."""
+    aleatoire = random.Random(graine)
+
+    def date_aleatoire() -> str:
+        return f"2026-{aleatoire.randint(1, 12):02d}-{aleatoire.randint(1, 28):02d}"
+
+    training_sessions = [
+        {
+            "id": i, "name": f"Session {i}", "code": f"S{i:05d}", "pipelineState": "ongoing",
+            "program": {"name": f"Programme {i % 40}", "trainingType": "inter"},
+            "trainees": [
+                {"firstname": f"Prénom {j}", "lastname": f"Nom {j}", "civility": "M", "handicaped": False, "grades": []}
+                for j in range(aleatoire.randint(4, 20))
+            ],
+            "dates": [{"date": date_aleatoire(), "startTime": "09:00", "endTime": "17:00"}
+                      for _ in range(aleatoire.randint(1, 15))],
+            "endDate": date_aleatoire(),
+            "evaluationScore": [{"totalScores": [
+                {"evaluationType": t, "score": aleatoire.uniform(0, 5)} for t in TYPES_EVALUATION
+            ]}],
+        }
+        for i in range(sessions)
+    ]
+    customers = [
+        {
+            "trainingSession": {"id": str(aleatoire.randrange(sessions)), "name": "Session", "code": "S"},
+            "customerTrainees": [
+                {
+                    "trainee": {"id": f"{i}-{j}", "civility": "Mme", "firstname": "Awa", "lastname": "Diallo",
+                                "handicaped": False},
+                    "passed": aleatoire.random() < 0.8, "sessionCompletion": aleatoire.random(),
+                    "signatures": [
+                        {"signature": f"https://signatures.example.org/{i}-{j}-{k}", "type": "trainee",
+                         "dates": [{"date": date_aleatoire(), "slot": aleatoire.choice(CRENEAUX),
+                                    "subsession": {"name": "Module", "id": str(k)} if k % 2 else None}
+                                   for _ in range(aleatoire.randint(1, 6))]}
+                        for k in range(aleatoire.randint(0, 8))
+                    ],
+                }
+                for j in range(aleatoire.randint(1, 10))
+            ],
+        }
+        for i in range(clients)
+    ]
+    return {"trainingSessions": training_sessions, "customers": customers}
+
+
+def aplatir_pandas(customers: list) -> pd.DataFrame:
+    """Référence : inscriptions (json_normalize) puis une ligne par date de signature (explode) ; retourne ces dernières."""
+    inscriptions = pd.json_normalize(
+        [c for c in customers if c.get("customerTrainees")], record_path="customerTrainees",
+        meta=["id", ["trainingSession", "id"], ["trainingSession", "name"], ["trainingSession", "code"]],
+        meta_prefix="client.", errors="ignore",
+    )
+    signatures = inscriptions["signatures"].explode().dropna()
+    signatures = pd.json_normalize(signatures.tolist()).set_axis(signatures.index)
+    dates = signatures["dates"].explode().dropna()
+    dates = pd.json_normalize(dates.tolist()).set_axis(dates.index)
+    return dates
+
+
+def mesurer(fonction, repetitions: int) -> dict:
+    """Temps CPU (process_time) par répétition, en ms."""
+    durees = []
+    for _ in range(repetitions):
+        debut = time.process_time()
+        resultat = fonction()
+        durees.append((time.process_time() - debut) * 1000)
+    return {"lignes": len(resultat), "p50_ms": round(statistics.median(durees), 1), "max_ms": round(max(durees), 1)}
+
+
+def executer(args) -> dict:
+    if args.payload:
+        with open(args.payload, encoding="utf-8") as f:
+            payload = json.load(f)
+    else:
+        payload = generer_payload(args.sessions, args.clients)
+    sessions, customers = payload["trainingSessions"], payload["customers"]
+
+    inscriptions = lignes_inscriptions(customers)
+    toutes = {ligne["id"] for ligne, _ in inscriptions}
+    return {
+        "parametres": vars(args),
+        "etapes": {
+            "sessions": mesurer(lambda: [ligne_session(s) for s in sessions], args.repetitions),
+            "inscriptions": mesurer(lambda: lignes_inscriptions(customers), args.repetitions),
+            "signatures": mesurer(lambda: lignes_signatures(inscriptions, toutes), args.repetitions),
+            "pandas": mesurer(lambda: aplatir_pandas(customers), args.repetitions),
+        },
+    }
+
+
+def afficher(resultats: dict):
+    print("\n📊 === Aplatissement Digiforma : temps CPU par étape ===")
+    print(f"{'étape':<14}{'lignes':>9}{'p50 ms':>10}{'max ms':>10}")
+    for etape, mesure in resultats["etapes"].items():
+        print(f"{etape:<14}{mesure['lignes']:>9}{mesure['p50_ms']:>10}{mesure['max_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de mesure de l'aplatissement Digiforma")
+    parser.add_argument("--payload", help="Réponse Digiforma enregistrée (JSON)")
+    parser.add_argument("--sessions", type=int, default=1000, help="Sessions de la réponse synthétique")
+    parser.add_argument("--clients", type=int, default=3000, help="Customers de la réponse synthétique")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--sortie", help="Écrit les résultats en JSON dans ce fichier")
+    args = parser.parse_args(argv)
+
+    resultats = executer(args)
+    afficher(resultats)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
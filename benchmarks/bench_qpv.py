@@ -0,0 +1,218 @@
+"""
+Banc de mesure de la vérification QPV, sans appel aux services externes.
+
+Démarre les bouchons api-adresse et OpenDataSoft (tests/stubs) sur des ports
+libres, génère des adresses synthétiques puis mesure :
+- unitaire : verif_qpv adresse par adresse, avec rendu de la carte HTML, du PNG
+  et de l'encodage base64 (p50 / p95 par étape) ;
+- lot : recherche_groupqpv sur un fichier CSV, en mode bulk et unitaire (lignes/s).
+
+    python -m benchmarks.bench_qpv
+    python -m benchmarks.bench_qpv --adresses 200 --lignes 5000 --latence-ms 50
+    python -m benchmarks.bench_qpv --sans-index --sortie resultats.json
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Variables minimales pour instancier les settings sans .env (aucune connexion n'est ouverte)
+for _nom, _valeur in {
+    "DB_USER": "bench", "DB_PASSWORD": "bench", "DB_NAME": "bench", "DB_HOST": "localhost",
+    "DB_PORT": "5432", "ENVIRONNEMENT": "development", "SECRET_KEY": "bench", "EMAIL_SENDER": "bench@example.org",
+}.items():
+    os.environ.setdefault(_nom, _valeur)
+
+import uvicorn  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services import service_qpv_cartes, service_qpv_index  # noqa: E402
+from app.services.service_geocodage import cache_geocodage, limiteur_api_adresse  # noqa: E402
+from app.services.service_qpv import limiteur_opendatasoft, verif_qpv  # noqa: E402
+from app.services.service_qpv_cartes import obtenir_carte  # noqa: E402
+from app.services.service_QPV_QueryGroup import recherche_groupqpv  # noqa: E402
+from app.utils import metrics  # noqa: E402
+from tests.stubs import stub_api_adresse, stub_opendatasoft  # noqa: E402
+
+TYPES_VOIE = ["rue", "avenue", "boulevard", "impasse", "allée", "place", "chemin", "quai"]
+NOMS_VOIE = ["de la République", "Victor Hugo", "Jean Jaurès", "des Lilas", "du Général de Gaulle",
+             "Pasteur", "de la Gare", "des Écoles", "Voltaire", "du Moulin", "de Belleville", "Oberkampf"]
+COMMUNES = [("75011", "Paris"), ("75019", "Paris"), ("93100", "Montreuil"), ("93200", "Saint-Denis"),
+            ("94200", "Ivry-sur-Seine"), ("92000", "Nanterre"), ("93300", "Aubervilliers")]
+
+# Étapes rapportées : (libellé, nom de la mesure dans app.utils.metrics)
+ETAPES = [
+    ("geocodage", "qpv.geocodage"),
+    ("recherche QPV", "qpv.recherche"),
+    ("carte HTML", "qpv_carte.html.rendu"),
+    ("carte PNG", "qpv_carte.png.rendu"),
+    ("base64", "qpv.image_base64"),
+    ("total verif_qpv", "bench.verif_qpv"),
+]
+
+
+def generer_adresses(nombre: int, graine: int = 1, taux_introuvables: float = 0.05,
+                     taux_invalides: float = 0.03, taux_doublons: float = 0.1) -> list:
+    """Adresses synthétiques, avec une part d'introuvables, de saisies invalides et de doublons."""
+    aleatoire = random.Random(graine)
+    adresses = []
+    for _ in range(nombre):
+        tirage = aleatoire.random()
+        if adresses and tirage < taux_doublons:
+            # Même adresse, autre graphie
+            adresse = aleatoire.choice(adresses).upper().replace(",", "")
+        elif tirage < taux_doublons + taux_invalides:
+            adresse = aleatoire.choice(["", "12", "rue", "n/a"])
+        else:
+            code_postal, commune = aleatoire.choice(COMMUNES)
+            adresse = (f"{aleatoire.randint(1, 180)} {aleatoire.choice(TYPES_VOIE)} "
+                       f"{aleatoire.choice(NOMS_VOIE)}, {code_postal} {commune}")
+            if tirage < taux_doublons + taux_invalides + taux_introuvables:
+                adresse = f"introuvable {adresse}"
+        adresses.append(adresse)
+    return adresses
+
+
+def demarrer_bouchon(application) -> tuple:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    serveur = uvicorn.Server(uvicorn.Config(application, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=serveur.run, daemon=True)
+    thread.start()
+    while not serveur.started:
+        time.sleep(0.05)
+    return serveur, f"http://127.0.0.1:{port}"
+
+
+def requete_factice() -> Request:
+    return Request({"type": "http", "scheme": "http", "server": ("bench", 80), "path": "/", "headers": []})
+
+
+def resume_etapes() -> dict:
+    mesures = metrics.snapshot()["mesures"]
+    return {
+        libelle: {cle: mesures.get(nom, {}).get(cle) for cle in ("nombre", "p50", "p95")}
+        for libelle, nom in ETAPES
+    }
+
+
+async def bench_unitaire(adresses: list) -> dict:
+    metrics.reinitialiser()
+    cache_geocodage.clear()
+    requete = requete_factice()
+    for adresse in adresses:
+        with metrics.chronometrer("bench.verif_qpv"):
+            resultat = await verif_qpv({"address": adresse}, requete, image_encoded=True)
+            if resultat.get("carte"):
+                await obtenir_carte(resultat["carte"].rsplit("/", 1)[-1], "html")
+    return resume_etapes()
+
+
+async def bench_lot(adresses: list, mode: str, dossier: str) -> dict:
+    metrics.reinitialiser()
+    cache_geocodage.clear()
+    for compteurs in (stub_api_adresse.compteurs, stub_opendatasoft.compteurs):
+        compteurs.update(dict.fromkeys(compteurs, 0))
+    entree = os.path.join(dossier, f"entree_{mode}.csv")
+    sortie = os.path.join(dossier, f"sortie_{mode}.csv")
+    with open(entree, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Adresse complete"])
+        writer.writerows([a] for a in adresses)
+
+    debut = time.perf_counter()
+    statistiques = await recherche_groupqpv(entree, sortie, "csv", requete_factice(), mode=mode)
+    duree = time.perf_counter() - debut
+    return {
+        "lignes": len(adresses),
+        "duree_sec": round(duree, 2),
+        "lignes_par_seconde": round(len(adresses) / duree, 1),
+        "taux_deduplication": statistiques["taux_deduplication"],
+        "appels_api_adresse": dict(stub_api_adresse.compteurs),
+        "appels_opendatasoft": dict(stub_opendatasoft.compteurs),
+    }
+
+
+def afficher(resultats: dict):
+    print("\n📊 === Unitaire (verif_qpv) : latences par étape, en ms ===")
+    print(f"{'étape':<18}{'n':>7}{'p50':>10}{'p95':>10}")
+    for libelle, mesure in resultats["unitaire"].items():
+        p50 = "-" if mesure["p50"] is None else f"{mesure['p50']:.1f}"
+        p95 = "-" if mesure["p95"] is None else f"{mesure['p95']:.1f}"
+        print(f"{libelle:<18}{mesure['nombre'] or 0:>7}{p50:>10}{p95:>10}")
+
+    print("\n📦 === Lot (recherche_groupqpv) ===")
+    for mode, mesure in resultats["lot"].items():
+        print(f"{mode:<10} {mesure['lignes']} lignes en {mesure['duree_sec']} s -> {mesure['lignes_par_seconde']} lignes/s "
+              f"(déduplication {mesure['taux_deduplication']:.0%})")
+
+
+async def executer(args) -> dict:
+    dossier = tempfile.mkdtemp(prefix="bench_qpv_")
+    stub_api_adresse.LATENCE_MS = args.latence_ms
+    stub_opendatasoft.LATENCE_MS = args.latence_ms
+
+    serveur_adresse, url_adresse = demarrer_bouchon(stub_api_adresse.app)
+    serveur_ods, url_ods = demarrer_bouchon(stub_opendatasoft.app)
+    try:
+        settings.API_ADRESSE_URL = url_adresse
+        settings.OPENDATASOFT_URL = url_ods
+        settings.GEOCODAGE_CACHE_DB = False
+        # Les limiteurs sont créés à l'import : on ajuste directement leur débit
+        for limiteur in (limiteur_api_adresse, limiteur_opendatasoft):
+            limiteur.debit = limiteur.capacite = limiteur.jetons = args.debit
+        service_qpv_cartes.QPV_CARTES_DIR = dossier  # Cartes rendues hors de data/cartes
+
+        # Index local construit depuis l'export du bouchon, ou repli OpenDataSoft
+        service_qpv_index.QPV_SNAPSHOT_PATH = os.path.join(dossier, "qpv_snapshot.geojson")
+        if args.sans_index:
+            service_qpv_index._index = None
+        else:
+            service_qpv_index.rafraichir_index_qpv(
+                f"{url_ods}/api/explore/v2.1/catalog/datasets/qpv/exports/geojson",
+                chemin=service_qpv_index.QPV_SNAPSHOT_PATH,
+            )
+
+        resultats = {
+            "parametres": vars(args),
+            "unitaire": await bench_unitaire(generer_adresses(args.adresses, graine=1)),
+            "lot": {},
+        }
+        lignes = generer_adresses(args.lignes, graine=2)
+        for mode in ("bulk", "unitaire"):
+            resultats["lot"][mode] = await bench_lot(lignes, mode, dossier)
+        return resultats
+    finally:
+        serveur_adresse.should_exit = True
+        serveur_ods.should_exit = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de mesure QPV avec bouchons locaux")
+    parser.add_argument("--adresses", type=int, default=100, help="Adresses du scénario unitaire")
+    parser.add_argument("--lignes", type=int, default=2000, help="Lignes du fichier du scénario lot")
+    parser.add_argument("--latence-ms", type=float, default=30, help="Latence simulée des bouchons")
+    parser.add_argument("--debit", type=float, default=1000, help="Requêtes/s autorisées vers les bouchons")
+    parser.add_argument("--sans-index", action="store_true", help="Force le repli OpenDataSoft")
+    parser.add_argument("--sortie", help="Écrit les résultats en JSON dans ce fichier")
+    args = parser.parse_args(argv)
+
+    resultats = asyncio.run(executer(args))
+    afficher(resultats)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,19 @@
+import os
 import sys
 from pathlib import Path
 
 # Ajouter le répertoire racine au PYTHONPATH pour que les imports fonctionnent
-sys.path.append(str(Path(__file__).parent.parent)) 
\ No newline at end of file
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Variables minimales pour instancier app.config.Settings sans fichier .env
+for key, value in {
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_NAME": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "ENVIRONNEMENT": "development",
+    "SECRET_KEY": "test",
+    "EMAIL_SENDER": "test@example.com",
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,104 @@
+"""
+Serveur bouchon de api-adresse.data.gouv.fr (/search/ et /search/csv/).
+
+Les coordonnées sont déterministes (dérivées d'un hash de l'adresse, autour de Paris)
+et les adresses contenant "introuvable" ne sont pas géocodées. STUB_API_ADRESSE_ENREGISTREMENTS
+peut pointer vers des réponses enregistrées ({adresse: {latitude, longitude, result_label, ...}}),
+rejouées en priorité.
+
+    uvicorn tests.stubs.stub_api_adresse:app --port 8765
+    STUB_LATENCE_MS=80 uvicorn tests.stubs.stub_api_adresse:app --port 8765
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.responses import Response
+from typing import List, Optional
+
+app = FastAPI(title="Stub api-adresse")
+
+LATENCE_MS = float(os.environ.get("STUB_LATENCE_MS", "0"))
+compteurs = {"search": 0, "search_csv": 0, "lignes_csv": 0}
+
+
+def _charger_enregistrements() -> dict:
+    chemin = os.environ.get("STUB_API_ADRESSE_ENREGISTREMENTS")
+    if not chemin:
+        return {}
+    with open(chemin, "r", encoding="utf-8") as f:
+        return {adresse.strip().lower(): reponse for adresse, reponse in json.load(f).items()}
+
+
+enregistrements = _charger_enregistrements()
+
+
+def geocoder(adresse: str) -> Optional[dict]:
+    if adresse and adresse.strip().lower() in enregistrements:
+        return enregistrements[adresse.strip().lower()]
+    if not adresse or "introuvable" in adresse.lower():
+        return None
+    empreinte = int(hashlib.sha1(adresse.strip().lower().encode("utf-8")).hexdigest()[:8], 16)
+    return {
+        "latitude": round(48.80 + (empreinte % 10000) / 100000, 6),
+        "longitude": round(2.25 + (empreinte // 10000 % 10000) / 50000, 6),
+        "result_score": 0.9,
+        "result_label": adresse.strip(),
+        "result_postcode": "75011",
+        "result_citycode": "75111",
+        "result_status": "ok",
+    }
+
+
+async def attendre():
+    if LATENCE_MS:
+        await asyncio.sleep(LATENCE_MS / 1000)
+
+
+@app.get("/search/")
+async def search(q: str, limit: int = 5):
+    await attendre()
+    compteurs["search"] += 1
+    resultat = geocoder(q)
+    features = []
+    if resultat:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [resultat["longitude"], resultat["latitude"]]},
+            "properties": {
+                "label": resultat["result_label"],
+                "score": resultat["result_score"],
+                "postcode": resultat["result_postcode"],
+                "citycode": resultat["result_citycode"],
+            },
+        })
+    return {"type": "FeatureCollection", "features": features[:limit]}
+
+
+@app.post("/search/csv/")
+async def search_csv(
+    data: UploadFile = File(...),
+    columns: List[str] = Form([]),
+    result_columns: List[str] = Form([]),
+):
+    await attendre()
+    compteurs["search_csv"] += 1
+    contenu = (await data.read()).decode("utf-8-sig")
+    lignes = list(csv.DictReader(io.StringIO(contenu)))
+    compteurs["lignes_csv"] += len(lignes)
+
+    colonnes_resultat = result_columns or ["latitude", "longitude", "result_label", "result_score", "result_status"]
+    sortie = io.StringIO()
+    entetes = list(lignes[0].keys()) if lignes else ["id"]
+    writer = csv.DictWriter(sortie, fieldnames=entetes + colonnes_resultat)
+    writer.writeheader()
+    for ligne in lignes:
+        adresse = " ".join(ligne.get(col, "") for col in columns) if columns else " ".join(ligne.values())
+        resultat = geocoder(adresse) or {"result_status": "not-found"}
+        writer.writerow({**ligne, **{col: resultat.get(col, "") for col in colonnes_resultat}})
+
+    return Response(content=sortie.getvalue(), media_type="text/csv; charset=utf-8")
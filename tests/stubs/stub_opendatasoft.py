@@ -0,0 +1,113 @@
+"""
+Serveur bouchon du jeu de données QPV d'OpenDataSoft :
+- /api/explore/v2.1/catalog/datasets/{dataset}/records?where=within_distance(...)
+- /api/explore/v2.1/catalog/datasets/{dataset}/exports/geojson
+
+Les QPV sont lus depuis un export enregistré (STUB_QPV_GEOJSON) ou, à défaut,
+générés de façon déterministe dans la zone où le bouchon api-adresse place ses
+adresses (autour de Paris) : carrés, rectangles et un multi-polygone troué.
+
+    uvicorn tests.stubs.stub_opendatasoft:app --port 8766
+    STUB_LATENCE_MS=150 STUB_QPV_GEOJSON=qpv.geojson uvicorn tests.stubs.stub_opendatasoft:app --port 8766
+"""
+import asyncio
+import json
+import os
+import random
+import re
+
+from fastapi import FastAPI, HTTPException
+from shapely.geometry import Point, shape
+
+from app.utils import lambert93
+
+app = FastAPI(title="Stub OpenDataSoft QPV")
+
+LATENCE_MS = float(os.environ.get("STUB_LATENCE_MS", "0"))
+NOMBRE_QPV = int(os.environ.get("STUB_NOMBRE_QPV", "40"))
+compteurs = {"records": 0, "exports": 0}
+
+MOTIF_WHERE = re.compile(r"POINT\(\s*([-\d.]+)\s+([-\d.]+)\s*\)'\s*,\s*([\d.]+)\s*km")
+
+
+def _carre(lon, lat, largeur, hauteur):
+    return [[lon, lat], [lon + largeur, lat], [lon + largeur, lat + hauteur], [lon, lat + hauteur], [lon, lat]]
+
+
+def generer_qpv(nombre: int, graine: int = 42) -> list:
+    """QPV synthétiques dans la zone 48.80-48.90 / 2.25-2.45."""
+    aleatoire = random.Random(graine)
+    features = []
+    for i in range(nombre):
+        lon = 2.25 + aleatoire.random() * 0.19
+        lat = 48.80 + aleatoire.random() * 0.09
+        largeur, hauteur = aleatoire.uniform(0.002, 0.008), aleatoire.uniform(0.002, 0.006)
+        geometry = {"type": "Polygon", "coordinates": [_carre(lon, lat, largeur, hauteur)]}
+        if i == 0:
+            # Multi-polygone avec un trou, comme certains QPV réels
+            geometry = {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [_carre(lon, lat, 0.008, 0.006), _carre(lon + 0.003, lat + 0.002, 0.002, 0.002)],
+                    [_carre(lon + 0.012, lat, 0.003, 0.003)],
+                ],
+            }
+        features.append({
+            "type": "Feature",
+            "properties": {"nom_qp": f"Quartier Synthétique {i}", "code_qp": f"QN075{i:03d}"},
+            "geometry": geometry,
+        })
+    return features
+
+
+def _charger_features() -> list:
+    chemin = os.environ.get("STUB_QPV_GEOJSON")
+    if chemin:
+        with open(chemin, "r", encoding="utf-8") as f:
+            return json.load(f)["features"]
+    return generer_qpv(NOMBRE_QPV)
+
+
+FEATURES = _charger_features()
+_GEOMETRIES = [shape(feature["geometry"]) for feature in FEATURES]
+
+
+async def attendre():
+    if LATENCE_MS:
+        await asyncio.sleep(LATENCE_MS / 1000)
+
+
+def _distance_m(geom, lon: float, lat: float) -> float:
+    """Distance à l'emprise projetée du QPV : filtre un peu large, le client calcule la distance exacte."""
+    x, y = lambert93.projeter(lon, lat)
+    coords = [lambert93.projeter(cx, cy) for cx, cy in geom.envelope.exterior.coords]
+    if geom.contains(Point(lon, lat)):
+        return 0
+    enveloppe = shape({"type": "Polygon", "coordinates": [coords]})
+    return enveloppe.distance(Point(x, y))
+
+
+@app.get("/api/explore/v2.1/catalog/datasets/{dataset}/records")
+async def records(dataset: str, where: str = "", limit: int = 10):
+    await attendre()
+    compteurs["records"] += 1
+    correspondance = MOTIF_WHERE.search(where)
+    if not correspondance:
+        raise HTTPException(status_code=400, detail="Clause where non supportée par le bouchon")
+    lon, lat, distance_km = map(float, correspondance.groups())
+
+    resultats = []
+    for feature, geom in zip(FEATURES, _GEOMETRIES):
+        if _distance_m(geom, lon, lat) <= distance_km * 1000:
+            resultats.append({
+                **feature["properties"],
+                "geo_shape": {"type": "Feature", "geometry": feature["geometry"], "properties": {}},
+            })
+    return {"total_count": len(resultats), "results": resultats[:limit]}
+
+
+@app.get("/api/explore/v2.1/catalog/datasets/{dataset}/exports/geojson")
+async def export_geojson(dataset: str):
+    await attendre()
+    compteurs["exports"] += 1
+    return {"type": "FeatureCollection", "features": FEATURES}
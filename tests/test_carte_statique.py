@@ -0,0 +1,25 @@
+import pytest
+from PIL import Image
+
+from app.services.service_carte_statique import (
+    COULEUR_FOND, COULEUR_MARQUEUR, HAUTEUR, LARGEUR, generer_carte_png, projeter
+)
+
+def test_projection_web_mercator():
+    assert projeter(0, 0) == pytest.approx((0, 0), abs=1e-6)
+    assert projeter(2.3522, 48.8566) == pytest.approx((261845.7, 6250564.3), abs=1)  # Paris
+
+def test_carte_png_adresse_et_qpv(tmp_path):
+    """PNG de taille fixe : marqueur au centre sans QPV, polygone dessiné autour de l'adresse sinon"""
+    seule = tmp_path / "seule.png"
+    generer_carte_png(str(seule), 48.8566, 2.3522)
+    image = Image.open(seule).convert("RGB")
+    assert image.size == (LARGEUR, HAUTEUR)
+    assert image.getpixel((LARGEUR // 2, HAUTEUR // 2 - 14)) == COULEUR_MARQUEUR  # Épingle sur l'adresse
+    assert image.getpixel((LARGEUR // 2 + 137, HAUTEUR // 2 + 113)) == COULEUR_FOND
+
+    avec_qpv = tmp_path / "qpv.png"
+    anneau = [[2.345, 48.852], [2.360, 48.852], [2.360, 48.861], [2.345, 48.861], [2.345, 48.852]]
+    generer_carte_png(str(avec_qpv), 48.8566, 2.3522, anneau=anneau, lignes_info=["Adresse : Paris", "QPV : test"])
+    r, g, b = Image.open(avec_qpv).convert("RGB").getpixel((LARGEUR // 2 + 137, HAUTEUR // 2 + 113))
+    assert b > r  # Remplissage bleu du QPV autour de l'adresse
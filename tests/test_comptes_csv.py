@@ -0,0 +1,59 @@
+import asyncio
+
+from app.services import service_siret_pappers
+from app.services.service_siret_pappers import enregistrer_export_comptes, generer_csv_comptes, obtenir_export_comptes
+
+FICHE = {
+    "siren": "123456789",
+    "nom_entreprise": "MCA",
+    "siege": {"siret": "12345678900012", "adresse": "1 rue de la Paix"},
+    "comptes": [
+        {"annee_cloture": 2023, "nom_fichier_pdf": "comptes_2023.pdf", "token": "abc"},
+        {"annee_cloture": 2022, "nom_fichier_pdf": None},
+    ],
+}
+
+def test_export_comptes_en_memoire_et_regenere(monkeypatch):
+    """Le CSV est identifié par son contenu et régénéré depuis la fiche en cache s'il a quitté la mémoire"""
+    from datetime import datetime
+
+    fiches = {"123456789": (FICHE, datetime.utcnow())}
+
+    async def lire_entreprise_en_cache(siren):
+        return fiches.get(siren)
+
+    async def obtenir_entreprise(siren, sans_cache=False):
+        raise AssertionError("Pappers ne doit pas être appelé pour un lien de téléchargement")
+
+    monkeypatch.setattr(service_siret_pappers, "lire_entreprise_en_cache", lire_entreprise_en_cache)
+    monkeypatch.setattr(service_siret_pappers, "obtenir_entreprise", obtenir_entreprise)
+    contenu = generer_csv_comptes(FICHE)
+    artefact_id = enregistrer_export_comptes("123456789", contenu)
+
+    assert contenu.decode("utf-8").splitlines()[1].startswith("MCA;12345678900012;1 rue de la Paix")
+    assert len(contenu.decode("utf-8").splitlines()) == 2  # Seuls les comptes avec PDF
+    assert enregistrer_export_comptes("123456789", generer_csv_comptes(FICHE)) == artefact_id
+
+    service_siret_pappers.exports_comptes.clear()
+    assert asyncio.run(obtenir_export_comptes(artefact_id)) == contenu
+    assert asyncio.run(obtenir_export_comptes("123456789-" + "0" * 32)) is None
+
+def test_lien_comptes_expire_sans_appel_pappers(monkeypatch):
+    """Fiche sortie du cache : 404, sans nouvel appel à Pappers"""
+    import pytest
+    from fastapi import HTTPException
+    from app.routes import route_siret_pappers
+
+    async def lire_entreprise_en_cache(siren):
+        return None
+
+    async def obtenir_entreprise(siren, sans_cache=False):
+        raise AssertionError("Pappers ne doit pas être appelé pour un lien de téléchargement")
+
+    monkeypatch.setattr(service_siret_pappers, "lire_entreprise_en_cache", lire_entreprise_en_cache)
+    monkeypatch.setattr(service_siret_pappers, "obtenir_entreprise", obtenir_entreprise)
+    service_siret_pappers.exports_comptes.clear()
+
+    with pytest.raises(HTTPException) as erreur:
+        asyncio.run(route_siret_pappers.telecharger_comptes("123456789-" + "a" * 32))
+    assert erreur.value.status_code == 404
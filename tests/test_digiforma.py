@@ -0,0 +1,193 @@
+import asyncio
+import re
+
+from app.services import service_digiforma_client
+from app.services.service_digiforma_client import recuperer_pages
+
+def test_pagination_par_vagues_ordonnee(monkeypatch):
+    """Les pages sont demandées en parallèle et concaténées dans l'ordre jusqu'à la page incomplète"""
+    elements = list(range(250))
+    pages_demandees = []
+
+    async def digiforma_graphql_post(query, debug=False):
+        page, taille = map(int, re.search(r"page: (\d+), size: (\d+)", query).groups())
+        pages_demandees.append(page)
+        await asyncio.sleep(0.01 * (3 - page % 4))  # Réponses dans le désordre
+        return {"customers": elements[page * taille:(page + 1) * taille]}
+
+    monkeypatch.setattr(service_digiforma_client, "digiforma_graphql_post", digiforma_graphql_post)
+    monkeypatch.setattr(service_digiforma_client.settings, "DIGIFORMA_CONCURRENCE", 2)
+
+    resultat = asyncio.run(recuperer_pages("customers", "query { customers(__PAGINATION__) { id } }", taille_page=100))
+
+    assert resultat == elements
+    assert sorted(pages_demandees) == [0, 1, 2, 3]
+
+def test_empreintes_de_synchronisation():
+    """L'empreinte d'une inscription change avec ses signatures, pas avec l'ordre des clés"""
+    from app.services.service_digiforma_sync import ligne_session, lignes_inscriptions
+
+    session = {
+        "id": 7, "name": "Créer son entreprise", "code": "CSE", "pipelineState": "ongoing",
+        "program": {"name": "Création"}, "endDate": "2026-03-31",
+        "dates": [{"date": "2026-03-02"}, {"date": "2026-02-16"}],
+        "evaluationScore": [{"totalScores": [{"evaluationType": "TOTAL", "score": 4.567}]}],
+        "trainees": [{"firstname": "Awa", "lastname": "Diallo"}],
+    }
+    ligne = ligne_session(session)
+    assert ligne["id"] == "7" and str(ligne["date_debut"]) == "2026-02-16" and ligne["total_score"] == 4.57
+    assert ligne_session(dict(reversed(list(session.items()))))["empreinte"] == ligne["empreinte"]
+
+    customer = {
+        "id": "c1",
+        "trainingSession": {"id": "7", "name": "Créer son entreprise", "code": "CSE"},
+        "customerTrainees": [{
+            "trainee": {"id": "42", "firstname": "Awa", "lastname": "Diallo"},
+            "passed": False,
+            "signatures": [{"signature": "ok", "type": "trainee", "dates": [{"date": "2026-02-16", "slot": "morning"}]}],
+        }],
+    }
+    (inscription, signatures), = lignes_inscriptions([customer])
+    assert inscription["id"] == "7:c1:42" and len(signatures) == 1
+
+    customer["customerTrainees"][0]["signatures"][0]["dates"].append({"date": "2026-02-17", "slot": "morning"})
+    (modifiee, signatures), = lignes_inscriptions([customer])
+    assert modifiee["empreinte"] != inscription["empreinte"] and len(signatures) == 2
+
+def test_inscriptions_sans_collision_de_cle():
+    """Apprenants sans identifiant, ou présents chez plusieurs clients d'une session : aucune ligne perdue"""
+    from app.services.service_digiforma_sync import lignes_inscriptions
+
+    session = {"id": "7", "name": "Créer son entreprise"}
+    customers = [
+        {"id": "c1", "trainingSession": session, "customerTrainees": [
+            {"trainee": {"id": "42"}}, {"trainee": {"lastname": "Diallo"}}, {"trainee": {"lastname": "Traoré"}},
+            {"trainee": {"id": "42"}},
+        ]},
+        {"id": "c2", "trainingSession": session, "customerTrainees": [{"trainee": {"id": "42"}}]},
+    ]
+
+    ids = [ligne["id"] for ligne, _ in lignes_inscriptions(customers)]
+
+    assert ids == ["7:c1:42", "7:c1:#1", "7:c1:#2", "7:c1:42#3", "7:c2:42"]
+
+def test_relecture_complete_periodique(monkeypatch):
+    """Toute l'année est relue si la dernière relecture complète date de plus de DIGIFORMA_SYNC_COMPLETE_HEURES"""
+    from datetime import date, datetime, timedelta
+    from types import SimpleNamespace
+    from app.services import service_digiforma_sync
+
+    class Db:
+        def __init__(self, etats):
+            self.etats = etats
+
+        async def get(self, modele, entite):
+            return self.etats.get(entite)
+
+        async def execute(self, requete):
+            return SimpleNamespace(scalar=lambda: date(date.today().year, 1, 1) + timedelta(days=400))
+
+    monkeypatch.setattr(service_digiforma_sync.settings, "DIGIFORMA_SYNC_COMPLETE_HEURES", 24)
+    il_y_a = lambda heures: SimpleNamespace(derniere_synchro=datetime.utcnow() - timedelta(hours=heures))
+    debut_annee = date(date.today().year, 1, 1)
+
+    def fenetre(etats, complete=False):
+        return asyncio.run(service_digiforma_sync._debut_fenetre_sessions(Db(etats), complete))
+
+    assert fenetre({"sessions": il_y_a(1), "sessions_complete": il_y_a(30)}) == (debut_annee, True)
+    assert fenetre({"sessions": il_y_a(1)}) == (debut_annee, True)
+    assert fenetre({"sessions": il_y_a(1), "sessions_complete": il_y_a(2)}, complete=True) == (debut_annee, True)
+    assert fenetre({"sessions": il_y_a(1), "sessions_complete": il_y_a(2)})[1] is False
+
+def test_zip_en_flux_sans_fichier_temporaire(monkeypatch, tmp_path):
+    """Le ZIP est produit en mémoire, par blocs, à partir des lignes lues en base"""
+    import hashlib
+    import io
+    import zipfile
+    from app.services import service_digiforma
+
+    async def sessions(depuis):
+        for i in range(3000):
+            yield ("2026-10-18", str(i), hashlib.sha256(str(i).encode()).hexdigest())  # Peu compressible
+
+    async def inscriptions():
+        yield ("2026-10-18", "1", "Créer son entreprise")
+
+    async def lire():
+        return [bloc async for bloc in service_digiforma.flux_zip_digiforma()]
+
+    monkeypatch.setattr(service_digiforma, "lignes_export_sessions", sessions)
+    monkeypatch.setattr(service_digiforma, "lignes_export_inscriptions", inscriptions)
+    monkeypatch.setattr(service_digiforma, "TAILLE_BLOC_ZIP", 1024)
+    monkeypatch.chdir(tmp_path)
+
+    blocs = asyncio.run(lire())
+
+    assert len(blocs) > 1 and list(tmp_path.iterdir()) == []
+    with zipfile.ZipFile(io.BytesIO(b"".join(blocs))) as zipf:
+        assert zipf.namelist() == ["df_customer_trainees_data.csv", "df_sessions.csv"]
+        lignes = zipf.read("df_sessions.csv").decode("utf-8").splitlines()
+    assert lignes[0].startswith("Date de mise à jour,Id_session") and len(lignes) == 3001
+
+def test_lien_export_signe(monkeypatch):
+    from app.services.service_digiforma import jeton_export, verifier_jeton_export
+
+    jeton = jeton_export()
+    assert verifier_jeton_export(jeton)
+    assert not verifier_jeton_export(jeton[:-1] + ("0" if jeton[-1] != "0" else "1"))
+    assert not verifier_jeton_export(jeton_export(validite_minutes=-1))
+
+def test_aplatissement_scores_et_signatures():
+    """Premier score de chaque type, 0 si absent ; signatures matérialisées pour les seules inscriptions modifiées"""
+    from app.services.service_digiforma_sync import ligne_session, lignes_inscriptions, lignes_signatures
+
+    ligne = ligne_session({"id": 1, "dates": [], "evaluationScore": [{"totalScores": [
+        {"evaluationType": "HOT", "score": 3.333}, {"evaluationType": "HOT", "score": 1},
+    ]}]})
+    assert (ligne["total_hot"], ligne["total_score"], ligne["date_debut"]) == (3.33, 0.0, None)
+
+    customers = [{"id": "c1", "trainingSession": {"id": "7"}, "customerTrainees": [
+        {"trainee": {"id": str(i)}, "signatures": [{"signature": "ok", "type": "trainee", "dates": [
+            {"date": "2026-02-16", "slot": "morning", "subsession": {"name": "Module 1", "id": "3"}},
+        ]}]}
+        for i in range(3)
+    ]}]
+    signatures = lignes_signatures(lignes_inscriptions(customers), {"7:c1:1"})
+    assert signatures == [{
+        "signature": "ok", "type": "trainee", "date": "2026-02-16", "creneau": "morning",
+        "sous_session": "Module 1", "id_sous_session": "3", "inscription_id": "7:c1:1",
+    }]
+
+def test_export_en_cache_et_304(monkeypatch):
+    """Export servi depuis le cache dans la fenêtre de fraîcheur ; rafraîchissement forcé en arrière-plan"""
+    from app.routes.route_digiformat import reponse_zip
+    from app.services import service_digiforma
+
+    synchronisations = []
+
+    async def synchroniser_digiforma(complete=False):
+        synchronisations.append(complete)
+
+    async def flux_zip_digiforma():
+        yield f"zip {len(synchronisations)}".encode()
+
+    monkeypatch.setattr(service_digiforma, "synchroniser_digiforma", synchroniser_digiforma)
+    monkeypatch.setattr(service_digiforma, "flux_zip_digiforma", flux_zip_digiforma)
+    monkeypatch.setattr(service_digiforma, "_export", None)
+    monkeypatch.setattr(service_digiforma, "_reconstruction", None)
+    monkeypatch.setattr(service_digiforma, "_reconstruction_complete", False)
+
+    async def scenario():
+        premier = await service_digiforma.obtenir_export()
+        deuxieme = await service_digiforma.obtenir_export()
+        force = await service_digiforma.obtenir_export(forcer=True)  # Sert l'ancien export immédiatement
+        await service_digiforma._reconstruction
+        return premier, deuxieme, force, await service_digiforma.obtenir_export()
+
+    premier, deuxieme, force, apres = asyncio.run(scenario())
+
+    assert deuxieme is premier and force is premier
+    assert synchronisations == [False, True]  # Le rafraîchissement forcé relit toute l'année
+    assert apres["contenu"] == b"zip 2" and apres["etag"] != premier["etag"]
+    assert reponse_zip(apres, f'"autre", {apres["etag"]}').status_code == 304
+    assert reponse_zip(apres, premier["etag"]).body == b"zip 2"
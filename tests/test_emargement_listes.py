@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression
+
+from app.models.models import Emargement
+from app.routes.forms import route_emargement
+
+class SessionComptee:
+    """Session factice : compte les requêtes et rejoue des résultats préparés, dans l'ordre"""
+
+    def __init__(self, *resultats):
+        self.resultats = list(resultats)
+        self.requetes = []
+
+    async def execute(self, requete, *args, **kwargs):
+        self.requetes.append(requete)
+        return self.resultats.pop(0)
+
+def resultat(lignes=(), objet=None):
+    return SimpleNamespace(all=lambda: list(lignes), scalar_one_or_none=lambda: objet)
+
+def ligne_emargement(i):
+    return SimpleNamespace(
+        id=i, evenement_id=1, email=f"p{i}@example.org", date_signature=None, mode_signature="presentiel",
+        is_validated=True, nom=f"Nom {i}", prenom="Awa", a_rempli_besoins=i % 2 == 0,
+        is_participant=True if i % 2 == 0 else None,
+    )
+
+def sql(requete) -> str:
+    return str(requete.compile(dialect=postgresql.dialect()))
+
+def test_liste_evenement_en_une_requete():
+    """Le nombre de requêtes ne dépend pas du nombre d'émargements (plus de 2N+2)"""
+    db = SessionComptee(
+        resultat(objet=SimpleNamespace(id=1, titre="Atelier")),
+        resultat(lignes=[ligne_emargement(i) for i in range(50)]),
+    )
+
+    liste = asyncio.run(route_emargement.get_emargements_evenement(1, db=db))
+
+    assert len(db.requetes) == 2 and len(liste) == 50
+    assert liste[0]["a_rempli_besoins"] is True and liste[1]["is_participant"] is None
+    roster = sql(db.requetes[1])
+    assert roster.count("LATERAL") == 2 and "CAST" not in roster
+    assert "besoins_evenement.event_id = emargements.evenement_id" in roster
+
+class SessionHistorique:
+    """Session factice : applique à des émargements en mémoire le curseur, l'ordre et la limite de la requête"""
+
+    def __init__(self, ids):
+        self.lignes = [SimpleNamespace(**vars(ligne_emargement(i)), titre=f"Atelier {i}", date_debut=None,
+                                       date_fin=None, lieu="Paris") for i in ids]
+        self.requetes = []
+
+    async def execute(self, requete, *args, **kwargs):
+        self.requetes.append(requete)
+        assert [c.compare(Emargement.id.desc()) for c in requete._order_by_clauses] == [True]
+        curseurs = [
+            critere.right.value for critere in visitors.iterate(requete.whereclause)
+            if isinstance(critere, BinaryExpression) and critere.operator is operators.lt
+            and critere.left.compare(Emargement.__table__.c.id)
+        ]
+        lignes = sorted((l for l in self.lignes if all(l.id < c for c in curseurs)), key=lambda l: -l.id)
+        limite = requete._limit
+        return resultat(lignes=lignes if limite is None else lignes[:limite])
+
+def historique(db, **pagination):
+    from starlette.responses import Response
+
+    reponse = Response()
+    liste = asyncio.run(route_emargement.get_emargements_participant("p@example.org", reponse, db=db, **pagination))
+    return [e["id"] for e in liste], reponse.headers.get("X-Next-Cursor")
+
+def test_historique_participant_complet_par_defaut():
+    """Sans limite ni curseur, tout l'historique est renvoyé, sans en-tête de pagination"""
+    db = SessionHistorique(range(1, 121))
+
+    ids, curseur = historique(db, limite=None, apres=None)
+
+    assert ids == list(range(120, 0, -1)) and curseur is None
+    assert len(db.requetes) == 1
+    assert "JOIN evenements ON evenements.id = emargements.evenement_id" in sql(db.requetes[0])
+
+def test_historique_participant_pagine_par_curseur():
+    """Une requête par page ; pages contiguës sans doublon ni trou, curseur absent sur la dernière page"""
+    db = SessionHistorique(range(1, 26))
+    pages, curseur = [], None
+
+    page, curseur = historique(db, limite=10, apres=None)
+    pages.append(page)
+    while curseur is not None:
+        page, curseur = historique(db, limite=10, apres=int(curseur))
+        pages.append(page)
+
+    assert pages == [list(range(25, 15, -1)), list(range(15, 5, -1)), list(range(5, 0, -1))]
+    assert len(db.requetes) == 3
+
+def test_historique_participant_curseur_seul_et_curseur_zero():
+    """Un curseur sans limite pagine à LIMITE_PAGE_EMARGEMENTS ; `apres=0` est un curseur, pas une absence"""
+    db = SessionHistorique(range(1, 61))
+
+    ids, curseur = historique(db, limite=None, apres=61)
+    assert len(ids) == route_emargement.LIMITE_PAGE_EMARGEMENTS and curseur == str(ids[-1])
+
+    assert historique(db, limite=None, apres=0) == ([], None)
@@ -0,0 +1,60 @@
+import asyncio
+
+from app.services.service_geocodage import normaliser_adresse
+from app.utils.cache_lru import CacheLRU
+
+def test_normaliser_adresse_accents_et_ponctuation():
+    """Deux graphies de la même adresse donnent la même clé"""
+    assert normaliser_adresse("12, Rue de l'Église  -  75011 PARIS") == "12 rue de l eglise 75011 paris"
+    assert normaliser_adresse("12 rue de l eglise 75011 Paris") == "12 rue de l eglise 75011 paris"
+
+def test_normaliser_adresse_vide():
+    """Une adresse absente donne une clé vide"""
+    assert normaliser_adresse(None) == ""
+
+def test_cache_lru_eviction_et_expiration():
+    """Le cache évince l'entrée la moins récemment utilisée et respecte le TTL"""
+    cache = CacheLRU(taille_max=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+
+def test_adresse_introuvable_gardee_brievement_en_memoire(monkeypatch):
+    """Une adresse introuvable n'est pas écrite en base et expire vite du cache mémoire"""
+    from app.services import service_geocodage
+
+    appels = []
+
+    def appeler_api_adresse(adresse):
+        appels.append(adresse)
+        return None
+
+    async def lire_cache_db(cles):
+        return {}
+
+    def session_interdite():
+        raise AssertionError("une adresse introuvable ne doit pas être écrite en base")
+
+    monkeypatch.setattr(service_geocodage, "_appeler_api_adresse", appeler_api_adresse)
+    monkeypatch.setattr(service_geocodage, "lire_cache_db", lire_cache_db)
+    monkeypatch.setattr(service_geocodage, "AsyncSessionLocal", session_interdite)
+    monkeypatch.setattr(service_geocodage.settings, "GEOCODAGE_CACHE_DB", True)
+    monkeypatch.setattr(service_geocodage.limiteur_api_adresse, "debit", 1000)
+    service_geocodage.cache_geocodage.clear()
+
+    assert asyncio.run(service_geocodage.geocoder_adresse("1 rue inconnue")) is None
+    assert asyncio.run(service_geocodage.geocoder_adresse("1 rue inconnue")) is None
+    assert len(appels) == 1
+
+    monkeypatch.setattr(service_geocodage.settings, "GEOCODAGE_CACHE_TTL_NEGATIF_MIN", -1)
+    service_geocodage.cache_geocodage.clear()
+    asyncio.run(service_geocodage.geocoder_adresse("1 rue inconnue"))
+    asyncio.run(service_geocodage.geocoder_adresse("1 rue inconnue"))
+    assert len(appels) == 3
@@ -0,0 +1,50 @@
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from app.config import settings
+from app.services.service_geocodage import _appeler_api_adresse_csv
+from tests.stubs import stub_api_adresse
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    """Démarre le bouchon api-adresse sur un port libre"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(stub_api_adresse.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    yield f"http://127.0.0.1:{port}"
+
+    server.should_exit = True
+    thread.join()
+
+
+def test_geocodage_csv_aligne_les_resultats(stub_url, monkeypatch):
+    """Un seul appel /search/csv/ géocode tout le lot, dans l'ordre d'entrée"""
+    monkeypatch.setattr(settings, "API_ADRESSE_URL", stub_url)
+    appels_avant = stub_api_adresse.compteurs["search_csv"]
+    adresses = ["1 rue de la Paix Paris", "adresse introuvable ici", "5, avenue Foch, Paris"]
+
+    resultats = _appeler_api_adresse_csv(adresses)
+
+    assert stub_api_adresse.compteurs["search_csv"] == appels_avant + 1
+    assert len(resultats) == 3
+    assert resultats[0] == {
+        **{k: resultats[0][k] for k in ("latitude", "longitude")},
+        "score": 0.9,
+        "label": "1 rue de la Paix Paris",
+        "code_postal": "75011",
+        "code_commune": "75111",
+    }
+    assert resultats[1] is None
+    assert resultats[2]["label"] == "5, avenue Foch, Paris"
@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+
+from app.config import settings
+from app.utils import http_client
+
+def test_retry_sur_429_puis_succes(monkeypatch):
+    """Une réponse 429 est retentée, la réponse suivante est renvoyée à l'appelant"""
+    monkeypatch.setattr(settings, "HTTP_DELAI_RETRY_SEC", 0)
+    reponses = iter([httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200, json={"siren": "123456789"})])
+    appels = []
+
+    def repondre(request):
+        appels.append(request.url.params["siren"])
+        return next(reponses)
+
+    async def scenario():
+        http_client.demarrer_client_http(transport=httpx.MockTransport(repondre))
+        try:
+            return await http_client.requete("GET", "https://api.test/v2/entreprise", params={"siren": "123456789"})
+        finally:
+            await http_client.arreter_client_http()
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["siren"] == "123456789"
+    assert appels == ["123456789", "123456789"]
+
+def test_erreur_reseau_levee_apres_les_tentatives(monkeypatch):
+    """Une erreur réseau persistante est levée après HTTP_TENTATIVES essais"""
+    monkeypatch.setattr(settings, "HTTP_DELAI_RETRY_SEC", 0)
+    appels = []
+
+    def repondre(request):
+        appels.append(request)
+        raise httpx.ConnectError("connexion refusée", request=request)
+
+    async def scenario():
+        http_client.demarrer_client_http(transport=httpx.MockTransport(repondre))
+        try:
+            await http_client.requete("GET", "https://api.test/", tentatives=3)
+        finally:
+            await http_client.arreter_client_http()
+
+    try:
+        asyncio.run(scenario())
+        assert False, "httpx.ConnectError attendue"
+    except httpx.ConnectError:
+        pass
+    assert len(appels) == 3
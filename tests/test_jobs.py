@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from app.models.models import JobBatch, StatutJob
+from app.services.service_jobs import etat_job
+
+def test_etat_job_debit_et_eta():
+    """Le débit ignore les lignes reprises et l'ETA se déduit des lignes restantes"""
+    job = JobBatch(
+        id="abc", type="qpv_groupe", statut=StatutJob.EN_COURS.value,
+        lignes_total=1000, lignes_traitees=300, lignes_reprises=100,
+        started_at=datetime.utcnow() - timedelta(seconds=100),
+    )
+    etat = etat_job(job)
+
+    assert 1.9 < etat["lignes_par_seconde"] <= 2.0
+    assert 350 <= etat["eta_secondes"] <= 370
+    assert etat["download_url"] is None
+
+def test_etat_job_termine_lien_de_telechargement():
+    job = JobBatch(
+        id="abc", type="qpv_groupe", statut=StatutJob.TERMINE.value,
+        lignes_total=10, lignes_traitees=10, lignes_reprises=0,
+        started_at=datetime(2026, 1, 1, 12, 0, 0), finished_at=datetime(2026, 1, 1, 12, 0, 5),
+        fichier_sortie="resultats_qpv_abc.xlsx",
+    )
+    etat = etat_job(job)
+
+    assert etat["lignes_par_seconde"] == 2.0
+    assert etat["eta_secondes"] is None
+    assert etat["download_url"] == "/fichiers/resultats_qpv_abc.xlsx"
+
+def test_worker_survit_aux_erreurs_de_base(monkeypatch):
+    """Réservation puis mise à jour finale en échec : le worker continue et exécute le job suivant"""
+    import asyncio
+    from types import SimpleNamespace
+    from app.services import service_jobs
+
+    executes = []
+    reservations = iter([RuntimeError("connexion perdue"), "job-1", "job-2"])
+
+    async def reserver_job():
+        suivant = next(reservations, None)
+        if isinstance(suivant, Exception):
+            raise suivant
+        if suivant is None:
+            await asyncio.sleep(3600)
+        return SimpleNamespace(id=suivant, type="test", parametres={}, tentatives=1)
+
+    async def maj_job(job_id, **valeurs):
+        raise RuntimeError("base indisponible")
+
+    async def handler(job_id, parametres, progression):
+        executes.append(job_id)
+
+    monkeypatch.setattr(service_jobs, "_reserver_job", reserver_job)
+    monkeypatch.setattr(service_jobs, "_maj_job", maj_job)
+    monkeypatch.setitem(service_jobs._handlers, "test", handler)
+    monkeypatch.setattr(service_jobs.settings, "JOBS_INTERVALLE_SONDAGE_SEC", 0)
+
+    async def scenario():
+        monkeypatch.setattr(service_jobs, "_reveil", asyncio.Event())
+        worker = asyncio.create_task(service_jobs._boucle_worker())
+        while len(executes) < 2 and not worker.done():
+            await asyncio.sleep(0.01)
+        worker.cancel()
+        return worker
+
+    worker = asyncio.run(scenario())
+
+    assert executes == ["job-1", "job-2"] and worker.cancelled()
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.services.service_navigateur_pool import PoolNavigateurs, _Navigateur
+
+class DriverFactice:
+    crees = 0
+
+    def __init__(self):
+        DriverFactice.crees += 1
+        self.numero = DriverFactice.crees
+        self.quitte = False
+
+    def quit(self):
+        self.quitte = True
+
+def pool_factice(taille, captures_max):
+    """Pool rempli de drivers factices, sans Chrome ni ChromeDriverManager"""
+    pool = PoolNavigateurs(taille, captures_max)
+    pool._creer_driver = DriverFactice
+    for _ in range(taille):
+        pool.file.put_nowait(_Navigateur(DriverFactice()))
+    return pool
+
+def test_drivers_reutilises_puis_recycles():
+    """Un même driver sert plusieurs captures, puis est remplacé après NAVIGATEUR_CAPTURES_MAX"""
+    async def scenario():
+        pool = pool_factice(taille=1, captures_max=3)
+        utilises = []
+        for _ in range(4):
+            async with pool.acquerir() as navigateur:
+                utilises.append(navigateur.driver)
+        return utilises
+
+    utilises = asyncio.run(scenario())
+
+    assert utilises[0] is utilises[1] is utilises[2] and utilises[3] is not utilises[0]
+    assert utilises[0].quitte and not utilises[3].quitte
+
+def test_driver_recycle_apres_erreur_et_concurrence_bornee():
+    """Une capture en échec recycle le driver ; jamais plus d'emprunts simultanés que la taille du pool"""
+    async def scenario():
+        pool = pool_factice(taille=2, captures_max=100)
+        en_cours = {"n": 0, "max": 0}
+
+        async def emprunter():
+            async with pool.acquerir():
+                en_cours["n"] += 1
+                en_cours["max"] = max(en_cours["max"], en_cours["n"])
+                await asyncio.sleep(0.01)
+                en_cours["n"] -= 1
+
+        await asyncio.gather(*(emprunter() for _ in range(6)))
+
+        with pytest.raises(RuntimeError):
+            async with pool.acquerir() as navigateur:
+                casse = navigateur.driver
+                raise RuntimeError("chrome a planté")
+        restants = [pool.file.get_nowait().driver for _ in range(pool.file.qsize())]
+        return en_cours["max"], casse, restants
+
+    maximum, casse, restants = asyncio.run(scenario())
+
+    assert maximum == 2
+    assert casse.quitte and casse not in restants and len(restants) == 2
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.services import service_pappers
+from app.services.service_pappers import SOURCE_CACHE, SOURCE_CACHE_PERIME, SOURCE_PAPPERS, obtenir_entreprise
+
+def test_fiche_perimee_servie_puis_rafraichie(monkeypatch):
+    """Une fiche expirée est servie immédiatement et rafraîchie en arrière-plan"""
+    monkeypatch.setattr(settings, "ENTREPRISE_CACHE_DB", False)
+    appels = []
+
+    async def appeler_pappers(siren):
+        appels.append(siren)
+        return {"siren": siren, "nom_entreprise": "NOUVEAU NOM"}
+
+    monkeypatch.setattr(service_pappers, "appeler_pappers", appeler_pappers)
+    service_pappers.cache_entreprises.clear()
+    ancienne = datetime.utcnow() - timedelta(hours=settings.ENTREPRISE_CACHE_TTL_HEURES + 1)
+    service_pappers.cache_entreprises.set("123456789", ({"siren": "123456789", "nom_entreprise": "ANCIEN NOM"}, ancienne))
+
+    async def scenario():
+        perimee = await obtenir_entreprise("123456789")
+        await asyncio.gather(*service_pappers._rafraichissements.values())
+        fraiche = await obtenir_entreprise("123456789")
+        forcee = await obtenir_entreprise("123456789", sans_cache=True)
+        return perimee, fraiche, forcee
+
+    perimee, fraiche, forcee = asyncio.run(scenario())
+
+    assert perimee == ({"siren": "123456789", "nom_entreprise": "ANCIEN NOM"}, SOURCE_CACHE_PERIME)
+    assert fraiche[0]["nom_entreprise"] == "NOUVEAU NOM" and fraiche[1] == SOURCE_CACHE
+    assert forcee[1] == SOURCE_PAPPERS
+    assert appels == ["123456789", "123456789"]
@@ -0,0 +1,126 @@
+import asyncio
+
+import pandas as pd
+
+from app.services import service_qpv_batch
+from app.services.service_qpv_batch import STATUT_INVALIDE, STATUT_OK, traiter_colonne_qpv, traiter_lignes_qpv
+from app.utils.progression import Progression
+
+def test_adresses_repetees_evaluees_une_seule_fois(monkeypatch):
+    """Les graphies d'une même adresse sont évaluées une fois et le résultat redistribué"""
+    appels = []
+
+    async def traiter_lignes_qpv(adresses, base_url, coordonnees=None, progression=None, poids=None, **kwargs):
+        appels.append(list(adresses))
+        progression.avancer(sum(poids))
+        return [{"nom_qpv": f"QPV {a}", "carte_qpv": "", "distance_qpv_en_metre": 0, "statut_qpv": "ok"} for a in adresses]
+
+    monkeypatch.setattr(service_qpv_batch, "traiter_lignes_qpv", traiter_lignes_qpv)
+    colonne = pd.Series([
+        "12 rue de la Paix, 75002 Paris",
+        "n/a",
+        "12 RUE DE LA PAIX 75002 PARIS",
+        "3 avenue Jean Jaurès, 93100 Montreuil",
+        "12 rue de la paix 75002 paris",
+    ])
+    progression = Progression()
+
+    resultats, statistiques = asyncio.run(traiter_colonne_qpv(colonne, "http://test", "unitaire", progression))
+
+    assert appels == [["12 rue de la Paix, 75002 Paris", "3 avenue Jean Jaurès, 93100 Montreuil"]]
+    assert resultats["nom_qpv"].tolist() == [
+        "QPV 12 rue de la Paix, 75002 Paris", "",
+        "QPV 12 rue de la Paix, 75002 Paris",
+        "QPV 3 avenue Jean Jaurès, 93100 Montreuil",
+        "QPV 12 rue de la Paix, 75002 Paris",
+    ]
+    assert resultats["statut_qpv"][1] == STATUT_INVALIDE
+    assert statistiques["adresses_uniques"] == 2 and statistiques["taux_deduplication"] == 0.5
+    assert progression.faites == 5
+
+def adresses_test(nombre):
+    return [f"{i} rue de la Paix, 75002 Paris" for i in range(1, nombre + 1)]
+
+def evaluations_simulees(monkeypatch, echecs=None, latence=None):
+    """Géocodage et évaluation QPV simulés ; `echecs[adresse]` = nombre d'erreurs avant succès"""
+    echecs = dict(echecs or {})
+    etat = {"en_cours": 0, "max": 0, "appels": [], "geocodages_unitaires": []}
+
+    async def geocoder_adresse(adresse):
+        etat["geocodages_unitaires"].append(adresse)
+        return {"latitude": 48.87, "longitude": 2.33}
+
+    async def evaluer_qpv(adresse, lat, lon, base_url):
+        etat["appels"].append(adresse)
+        etat["en_cours"] += 1
+        etat["max"] = max(etat["max"], etat["en_cours"])
+        try:
+            numero = int(adresse.split()[0])
+            await asyncio.sleep(latence(numero) if latence else 0.01)
+            if echecs.get(adresse, 0) > 0:
+                echecs[adresse] -= 1
+                raise RuntimeError("OpenDataSoft indisponible")
+            return {"nom_qp": f"QPV {numero}", "carte": "", "distance_m": numero}
+        finally:
+            etat["en_cours"] -= 1
+
+    monkeypatch.setattr(service_qpv_batch, "geocoder_adresse", geocoder_adresse)
+    monkeypatch.setattr(service_qpv_batch, "evaluer_qpv", evaluer_qpv)
+    monkeypatch.setattr(service_qpv_batch.settings, "QPV_BATCH_DELAI_RETRY_SEC", 0)
+    monkeypatch.setattr(service_qpv_batch.settings, "QPV_BATCH_TENTATIVES", 3)
+    return etat
+
+def test_concurrence_bornee_et_ordre_conserve(monkeypatch):
+    """Jamais plus de `concurrence` lignes en vol ; résultats dans l'ordre d'entrée malgré des latences inversées"""
+    etat = evaluations_simulees(monkeypatch, latence=lambda numero: 0.002 * (20 - numero))
+    adresses = adresses_test(20)
+
+    resultats = asyncio.run(traiter_lignes_qpv(adresses, "http://test", concurrence=4))
+
+    assert etat["max"] == 4
+    assert [r["distance_qpv_en_metre"] for r in resultats] == list(range(1, 21))
+
+def test_retry_puis_succes_et_erreur_apres_les_tentatives(monkeypatch):
+    """Une erreur passagère est retentée ; après QPV_BATCH_TENTATIVES échecs, la ligne seule passe en erreur"""
+    adresses = adresses_test(3)
+    etat = evaluations_simulees(monkeypatch, echecs={adresses[0]: 2, adresses[1]: 5})
+
+    resultats = asyncio.run(traiter_lignes_qpv(adresses, "http://test"))
+
+    assert resultats[0]["statut_qpv"] == STATUT_OK and etat["appels"].count(adresses[0]) == 3
+    assert resultats[1]["statut_qpv"] == "erreur : OpenDataSoft indisponible" and etat["appels"].count(adresses[1]) == 3
+    assert resultats[2]["statut_qpv"] == STATUT_OK
+
+def test_lot_csv_en_echec_geocode_ligne_a_ligne(monkeypatch):
+    """Un lot /search/csv/ en échec n'arrête pas le fichier : ses lignes sont géocodées une par une"""
+    from app.services import service_geocodage
+
+    etat = evaluations_simulees(monkeypatch)
+    lots = []
+
+    def appeler_api_adresse_csv(adresses):
+        lots.append(list(adresses))
+        if len(lots) == 1:
+            raise service_geocodage.requests.Timeout("délai dépassé")
+        return [{"latitude": 48.87, "longitude": 2.33, "score": 0.9, "label": a,
+                 "code_postal": "75002", "code_commune": "75102"} for a in adresses]
+
+    async def lire_cache_db(cles):
+        return {}
+
+    async def ecrire_cache_db(entrees):
+        pass
+
+    monkeypatch.setattr(service_geocodage, "_appeler_api_adresse_csv", appeler_api_adresse_csv)
+    monkeypatch.setattr(service_geocodage, "lire_cache_db", lire_cache_db)
+    monkeypatch.setattr(service_geocodage, "ecrire_cache_db", ecrire_cache_db)
+    monkeypatch.setattr(service_geocodage.settings, "GEOCODAGE_CSV_TAILLE_LOT", 2)
+    monkeypatch.setattr(service_geocodage.limiteur_api_adresse, "debit", 1000)
+    service_geocodage.cache_geocodage.clear()
+    monkeypatch.setattr(service_qpv_batch, "get_qpv_index", lambda: None)
+
+    resultats, _ = asyncio.run(traiter_colonne_qpv(pd.Series(adresses_test(4)), "http://test", "bulk"))
+
+    assert len(lots) == 2
+    assert etat["geocodages_unitaires"] == lots[0]  # Seules les adresses du lot en échec
+    assert resultats["statut_qpv"].tolist() == [STATUT_OK] * 4
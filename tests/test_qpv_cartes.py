@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.services import service_qpv_cartes
+
+QPV = {"nom_qp": "Quartier Test", "code_qp": "QN0001", "distance_m": 0,
+       "anneau": [[2.0, 48.0], [2.01, 48.0], [2.01, 48.01], [2.0, 48.01], [2.0, 48.0]]}
+
+@pytest.fixture
+def dossier_cartes(tmp_path, monkeypatch):
+    monkeypatch.setattr(service_qpv_cartes, "QPV_CARTES_DIR", str(tmp_path))
+    monkeypatch.setattr(service_qpv_cartes.settings, "QPV_MAP_RENDERER", "statique")
+    service_qpv_cartes._acces.clear()
+    return tmp_path
+
+def test_carte_rendue_au_premier_acces(dossier_cartes):
+    """La vérification n'enregistre qu'une description ; le PNG est rendu au premier accès puis réutilisé"""
+    cle = service_qpv_cartes.enregistrer_carte("1 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV")
+    png = service_qpv_cartes.chemins_carte(cle)["png"]
+    assert not os.path.exists(png)
+
+    chemin = asyncio.run(service_qpv_cartes.obtenir_carte(cle, "png"))
+    assert chemin == png and os.path.getsize(png) > 0
+
+    mtime = os.path.getmtime(png)
+    assert asyncio.run(service_qpv_cartes.obtenir_carte(cle, "png")) == png
+    assert os.path.getmtime(png) == mtime
+
+def test_cle_partagee_entre_graphies(dossier_cartes):
+    """Deux graphies géocodées au même point (à ~1 m près) partagent la même carte"""
+    cle1 = service_qpv_cartes.enregistrer_carte("1 rue de la Paix Paris", 48.0050001, 2.005, QPV, "QPV")
+    cle2 = service_qpv_cartes.enregistrer_carte("1, Rue de la PAIX, Paris", 48.0050002, 2.005, QPV, "QPV")
+    assert cle1 == cle2
+    assert service_qpv_cartes.enregistrer_carte("1 rue de la Paix Paris", 48.005, 2.005, None, None) != cle1
+
+def test_cle_suit_le_contenu_affiche(dossier_cartes):
+    """Adresse, verdict, distance ou date différents : nouvelle carte, jamais la description d'un autre rendu"""
+    cle = service_qpv_cartes.cle_carte
+    reference = cle("1 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV", "2026-10-18")
+
+    assert cle("3 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV", "2026-10-18") != reference
+    assert cle("1 rue de la Paix Paris", 48.005, 2.005, {**QPV, "distance_m": 120}, "QPV", "2026-10-18") != reference
+    assert cle("1 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV limitrophe", "2026-10-18") != reference
+    assert cle("1 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV", "2026-10-19") != reference
+
+    premiere = service_qpv_cartes.enregistrer_carte("1 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV")
+    autre = service_qpv_cartes.enregistrer_carte("3 rue de la Paix Paris", 48.005, 2.005, QPV, "QPV")
+    assert autre != premiere and service_qpv_cartes._lire_spec(autre)["address"] == "3 rue de la Paix Paris"
+
+def test_eviction_selon_le_dernier_acces(dossier_cartes):
+    """Une carte ancienne mais consultée récemment est conservée"""
+    ancienne = service_qpv_cartes.enregistrer_carte("1 rue de la Paix Paris", 48.1, 2.1, None, None)
+    consultee = service_qpv_cartes.enregistrer_carte("2 rue de la Paix Paris", 48.2, 2.2, None, None)
+    il_y_a_deux_jours = time.time() - 2 * 86400
+    for cle in (ancienne, consultee):
+        service_qpv_cartes._acces[cle] = il_y_a_deux_jours
+    service_qpv_cartes.marquer_acces(consultee)
+
+    assert service_qpv_cartes.evincer_cartes(age_limite_minutes=1440) == [ancienne]
+    assert not os.path.exists(service_qpv_cartes.chemins_carte(ancienne)["json"])
+    assert os.path.exists(service_qpv_cartes.chemins_carte(consultee)["json"])
+
+def test_eviction_conserve_les_acces_persistes_entre_temps(dossier_cartes, monkeypatch):
+    """L'index réécrit après l'éviction garde les accès persistés pendant le parcours des cartes"""
+    ancienne = service_qpv_cartes.enregistrer_carte("1 rue de la Paix Paris", 48.1, 2.1, None, None)
+    service_qpv_cartes._acces[ancienne] = time.time() - 2 * 86400
+    listdir = os.listdir
+
+    def listdir_avec_acces_concurrent(dossier):
+        noms = listdir(dossier)
+        service_qpv_cartes._acces["concurrente"] = time.time()  # Accès d'une autre requête, persisté
+        service_qpv_cartes.persister_index_acces()
+        return noms
+
+    monkeypatch.setattr(service_qpv_cartes.os, "listdir", listdir_avec_acces_concurrent)
+
+    assert service_qpv_cartes.evincer_cartes(age_limite_minutes=1440) == [ancienne]
+    assert set(service_qpv_cartes._lire_index_acces()) == {"concurrente"}
+
+def test_carte_inconnue(dossier_cartes):
+    """Une clé inconnue retourne None sans laisser de verrou derrière elle"""
+    assert asyncio.run(service_qpv_cartes.obtenir_carte("0" * 32, "png")) is None
+    assert ("0" * 32, "png") not in service_qpv_cartes._verrous
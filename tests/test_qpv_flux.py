@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+from app.services import service_qpv_flux
+from app.services.service_qpv_flux import ecrire_sortie, lire_lots
+
+def test_lire_lots_csv_par_blocs_et_reprise(tmp_path):
+    """Le CSV est lu par blocs et la reprise saute les lignes déjà traitées"""
+    chemin = tmp_path / "adresses.csv"
+    chemin.write_text("Adresse complete,code\n" + "".join(f"{i} rue de la paix,{i:05d}\n" for i in range(7)))
+
+    lots = list(lire_lots(str(chemin), "csv", taille_lot=3))
+    assert [len(lot) for lot in lots] == [3, 3, 1]
+    assert lots[0]["code"].tolist() == ["00000", "00001", "00002"]
+
+    reprise = list(lire_lots(str(chemin), "csv", taille_lot=3, deja_traitees=5))
+    assert [a for lot in reprise for a in lot["Adresse complete"]] == ["5 rue de la paix", "6 rue de la paix"]
+
+def test_reprise_csv_par_enregistrements_avec_retours_a_la_ligne(tmp_path):
+    """La reprise compte des enregistrements : un champ entre guillemets sur plusieurs lignes ne décale rien"""
+    chemin = tmp_path / "adresses.csv"
+    chemin.write_text('Adresse complete,note\n0 rue,"ligne 1\nligne 2"\n1 rue,ok\n2 rue,"a\nb\nc"\n3 rue,ok\n')
+
+    reprise = list(lire_lots(str(chemin), "csv", taille_lot=2, deja_traitees=2))
+
+    assert [a for lot in reprise for a in lot["Adresse complete"]] == ["2 rue", "3 rue"]
+    assert reprise[0]["note"].tolist() == ["a\nb\nc", "ok"]
+
+def test_ecrire_sortie_csv(tmp_path):
+    """Le fichier intermédiaire JSON Lines est converti en CSV ligne à ligne"""
+    partiel = tmp_path / "sortie.partiel.jsonl"
+    partiel.write_text("\n".join(json.dumps(l) for l in [["a", 1, None], ["b", 2, "QPV"]]) + "\n")
+    sortie = tmp_path / "sortie.csv"
+
+    ecrire_sortie(str(partiel), str(sortie), "csv", ["adresse", "n", "nom_qpv"])
+
+    assert sortie.read_text().splitlines() == ["adresse,n,nom_qpv", "a,1,", "b,2,QPV"]
+
+def test_reprise_hors_du_dossier_servi(tmp_path, monkeypatch):
+    """Fichier partiel et point de reprise vivent dans JOBS_DIR ; un traitement interrompu reprend au dernier lot"""
+    jobs, fichiers = tmp_path / "jobs", tmp_path / "fichiers"
+    jobs.mkdir()
+    fichiers.mkdir()
+    entree = tmp_path / "adresses.csv"
+    entree.write_text("Adresse complete\n" + "".join(f"{i} rue de la paix\n" for i in range(5)))
+    sortie = fichiers / "resultat.csv"
+    lots_traites, interruption = [], {"a_faire": True}
+
+    async def traiter_colonne_qpv(colonne, base_url, mode, progression):
+        if len(lots_traites) == 1 and interruption.pop("a_faire", False):
+            raise RuntimeError("arrêt du serveur")
+        lots_traites.append(colonne.tolist())
+        resultats = pd.DataFrame([["", "", 0, "ok"]] * len(colonne), columns=service_qpv_flux.COLONNES_RESULTAT)
+        return resultats, {"lignes": len(colonne), "lignes_valides": len(colonne), "adresses_uniques": len(colonne),
+                           "taux_deduplication": 0.0}
+
+    monkeypatch.setattr(service_qpv_flux, "JOBS_DIR", str(jobs))
+    monkeypatch.setattr(service_qpv_flux, "traiter_colonne_qpv", traiter_colonne_qpv)
+
+    def lancer():
+        return asyncio.run(service_qpv_flux.recherche_groupqpv_flux(
+            str(entree), str(sortie), "csv", taille_lot=2, base_url="http://test"))
+
+    with pytest.raises(RuntimeError):
+        lancer()
+    assert list(fichiers.iterdir()) == []
+    assert sorted(p.suffix for p in jobs.iterdir()) == [".json", ".jsonl"]
+
+    lancer()
+
+    assert [a for lot in lots_traites for a in lot] == [f"{i} rue de la paix" for i in range(5)]
+    assert list(fichiers.iterdir()) == [sortie] and len(sortie.read_text().splitlines()) == 6
+    assert list(jobs.iterdir()) == []
+
+def test_travail_fichier_hors_de_la_boucle(tmp_path, monkeypatch):
+    """Hachage, comptage, lecture des lots et écriture de la sortie tournent hors du thread de la boucle"""
+    import threading
+
+    entree = tmp_path / "adresses.csv"
+    entree.write_text("Adresse complete\n" + "".join(f"{i} rue de la paix\n" for i in range(5)))
+    threads = {}
+
+    def espionner(nom, fonction):
+        def espion(*args, **kwargs):
+            threads.setdefault(nom, set()).add(threading.current_thread())
+            return fonction(*args, **kwargs)
+        return espion
+
+    def lire_lots_espion(*args, **kwargs):
+        for lot in lire_lots(*args, **kwargs):
+            threads.setdefault("lire_lots", set()).add(threading.current_thread())
+            yield lot
+
+    async def traiter_colonne_qpv(colonne, base_url, mode, progression):
+        resultats = pd.DataFrame([["", "", 0, "ok"]] * len(colonne), columns=service_qpv_flux.COLONNES_RESULTAT)
+        return resultats, {"lignes": len(colonne), "lignes_valides": len(colonne), "adresses_uniques": len(colonne),
+                           "taux_deduplication": 0.0}
+
+    for nom in ("empreinte_fichier", "compter_lignes", "ecrire_sortie", "_ajouter_lot"):
+        monkeypatch.setattr(service_qpv_flux, nom, espionner(nom, getattr(service_qpv_flux, nom)))
+    monkeypatch.setattr(service_qpv_flux, "lire_lots", lire_lots_espion)
+    monkeypatch.setattr(service_qpv_flux, "traiter_colonne_qpv", traiter_colonne_qpv)
+    monkeypatch.setattr(service_qpv_flux, "JOBS_DIR", str(tmp_path))
+
+    from app.utils.progression import Progression
+
+    asyncio.run(service_qpv_flux.recherche_groupqpv_flux(
+        str(entree), str(tmp_path / "resultat.csv"), "csv", taille_lot=2, base_url="http://test",
+        progression=Progression()))
+
+    assert set(threads) == {"empreinte_fichier", "compter_lignes", "ecrire_sortie", "_ajouter_lot", "lire_lots"}
+    assert all(threading.main_thread() not in utilises for utilises in threads.values())
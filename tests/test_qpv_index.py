@@ -0,0 +1,96 @@
+from app.services.service_qpv_index import QPVIndex
+
+# Carré d'environ 1 km de côté autour de (2.35, 48.85)
+FEATURES = [
+    {
+        "type": "Feature",
+        "properties": {"nom_qp": "Quartier Test", "code_qp": "QP075000"},
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[2.345, 48.845], [2.355, 48.845], [2.355, 48.855], [2.345, 48.855], [2.345, 48.845]]],
+        },
+    }
+]
+
+def test_point_dans_le_qpv():
+    """Un point à l'intérieur du polygone est à 0 m"""
+    index = QPVIndex(FEATURES)
+
+    result = index.rechercher(2.35, 48.85)
+
+    assert result["nom_qp"] == "Quartier Test"
+    assert result["code_qp"] == "QP075000"
+    assert result["distance_m"] == 0
+
+def test_point_a_moins_de_300_m():
+    """Un point à ~150 m à l'est du bord est en limite de QPV"""
+    index = QPVIndex(FEATURES)
+
+    result = index.rechercher(2.357, 48.85)
+
+    assert result is not None
+    assert 100 < result["distance_m"] <= 300
+
+def test_point_eloigne():
+    """Un point à plusieurs kilomètres ne renvoie aucun QPV"""
+    index = QPVIndex(FEATURES)
+
+    assert index.rechercher(2.45, 48.85) is None
+
+def test_lambert93_point_de_reference():
+    """Paris (Hôtel de Ville) tombe à quelques mètres de ses coordonnées Lambert-93 publiées"""
+    from app.utils import lambert93
+
+    x, y = lambert93.projeter(2.3488, 48.8534)
+
+    assert abs(x - 652216) < 5 and abs(y - 6861681) < 5
+    assert abs(lambert93.facteur_echelle(44.0) - 1) < 1e-9
+
+def test_qpv_le_plus_proche_parmi_les_candidats_et_trous():
+    """Le QPV retenu est le plus proche, et un point dans un trou n'est pas dans le QPV"""
+    features = FEATURES + [
+        {
+            "type": "Feature",
+            "properties": {"nom_qp": "Quartier Troué", "code_qp": "QP075001"},
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [[[2.3580, 48.845], [2.3700, 48.845], [2.3700, 48.855], [2.3580, 48.855], [2.3580, 48.845]],
+                     [[2.3620, 48.848], [2.3660, 48.848], [2.3660, 48.852], [2.3620, 48.852], [2.3620, 48.848]]],
+                    [[[2.40, 48.80], [2.41, 48.80], [2.41, 48.81], [2.40, 48.81], [2.40, 48.80]]],
+                ],
+            },
+        }
+    ]
+    index = QPVIndex(features)
+
+    # Plus proche du second QPV (~70 m) que du premier (~150 m)
+    assert index.rechercher(2.357, 48.85)["code_qp"] == "QP075001"
+
+    dans_le_trou = index.rechercher(2.364, 48.85)
+    assert dans_le_trou["code_qp"] == "QP075001"
+    assert 100 < dans_le_trou["distance_m"] < 200
+
+def test_recherche_vectorisee_alignee():
+    """La recherche en lot renvoie un résultat par point, dans l'ordre"""
+    index = QPVIndex(FEATURES)
+
+    resultats = index.rechercher_lot([2.45, 2.35, 2.357], [48.85, 48.85, 48.85])
+
+    assert resultats[0] is None
+    assert resultats[1]["distance_m"] == 0
+    assert resultats[2] == index.rechercher(2.357, 48.85)
+
+def test_prefiltre_court_circuite_les_points_eloignes():
+    """Le pré-filtre écarte les points loin de tout QPV sans perdre ceux en limite"""
+    from app.utils import metrics
+
+    index = QPVIndex(FEATURES)
+    metrics.reinitialiser()
+
+    resultats = index.rechercher_lot([2.35, 2.357, 2.45, 3.5], [48.85, 48.85, 48.85, 45.0])
+
+    assert resultats[0]["distance_m"] == 0
+    assert resultats[1] is not None
+    assert resultats[2] is None and resultats[3] is None
+    assert metrics.snapshot()["compteurs"]["qpv.prefiltre.court_circuit"] == 2
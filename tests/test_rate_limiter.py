@@ -0,0 +1,28 @@
+import asyncio
+import time
+
+from app.utils.rate_limiter import TokenBucket
+
+def test_debit_respecte_apres_la_rafale():
+    """La capacité part en rafale, puis les jetons arrivent au débit configuré"""
+    limiteur = TokenBucket(debit=50, capacite=5)
+
+    async def acquerir(nombre):
+        debut = time.monotonic()
+        for _ in range(nombre):
+            await limiteur.acquerir()
+        return time.monotonic() - debut
+
+    assert asyncio.run(acquerir(5)) < 0.05
+    assert 0.18 <= asyncio.run(acquerir(10)) < 0.5  # 10 jetons à 50/s, seau vide
+
+def test_acquisitions_concurrentes_serialisees():
+    """Des tâches simultanées ne dépassent pas le débit ensemble"""
+    limiteur = TokenBucket(debit=100, capacite=1)
+
+    async def scenario():
+        debut = time.monotonic()
+        await asyncio.gather(*(limiteur.acquerir() for _ in range(11)))
+        return time.monotonic() - debut
+
+    assert asyncio.run(scenario()) >= 0.09
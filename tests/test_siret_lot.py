@@ -0,0 +1,61 @@
+import asyncio
+import csv
+
+import pandas as pd
+
+from app.services import service_siret_lot
+from app.services.service_siret_lot import STATUT_INTROUVABLE, STATUT_INVALIDE, STATUT_OK, enrichir_sirets, lire_fichier_sirets, nettoyer_numero
+
+def test_nettoyer_numero():
+    """SIRET et SIREN saisis librement sont ramenés au SIREN"""
+    assert nettoyer_numero("123 456 789 00012") == "123456789"
+    assert nettoyer_numero("123456789") == "123456789"
+    assert nettoyer_numero("12345678900012.0") == "123456789"
+    assert nettoyer_numero("123456789.0") == "123456789"
+    assert nettoyer_numero(12345678900012.0) == "123456789"
+    assert nettoyer_numero("123.456.789") == "123456789"
+    assert nettoyer_numero("12345") is None
+    assert nettoyer_numero(12345678.0) == "012345678"
+    assert nettoyer_numero("1234567800012") == "012345678"
+    assert nettoyer_numero(float("nan")) is None
+
+def test_sirens_dedoublonnes_et_fichier_enrichi(monkeypatch, tmp_path):
+    """Chaque SIREN unique n'est résolu qu'une fois, chaque ligne reçoit son statut"""
+    appels = []
+
+    async def obtenir_entreprise(siren):
+        appels.append(siren)
+        if siren == "999999999":
+            return None, "pappers"
+        return {"siren": siren, "nom_entreprise": "MCA", "siege": {"siret": siren + "00012"}}, "pappers"
+
+    monkeypatch.setattr(service_siret_lot, "obtenir_entreprise", obtenir_entreprise)
+    df = pd.DataFrame({"SIRET": ["12345678900012", "123456789", "abc", "999999999"], "ref": ["a", "b", "c", "d"]})
+    sortie = tmp_path / "entreprises.csv"
+
+    statistiques = asyncio.run(enrichir_sirets(df, "SIRET", str(sortie)))
+
+    assert sorted(appels) == ["123456789", "999999999"]
+    with open(sortie, encoding="utf-8") as f:
+        lignes = list(csv.DictReader(f, delimiter=";"))
+    assert [l["statut_siret"] for l in lignes] == [STATUT_OK, STATUT_OK, STATUT_INVALIDE, STATUT_INTROUVABLE]
+    assert lignes[1]["nom_entreprise"] == "MCA" and lignes[1]["siege_siret"] == "12345678900012"
+    assert statistiques == {"lignes": 4, "sirens_uniques": 2, "ok": 1}
+
+def test_xlsx_zeros_de_tete_et_cellules_vides(tmp_path):
+    """Un SIREN saisi comme nombre retrouve son zéro de tête, une cellule vide reste vide"""
+    from openpyxl import Workbook
+
+    classeur = Workbook()
+    feuille = classeur.active
+    feuille.append(["SIREN", "ref"])
+    feuille.append([12345678, "a"])
+    feuille.append([None, "b"])
+    feuille.append(["NA", None])
+    chemin = tmp_path / "sirens.xlsx"
+    classeur.save(chemin)
+
+    df, colonne = lire_fichier_sirets(str(chemin), "xlsx")
+
+    assert df["ref"].tolist() == ["a", "b", ""]
+    assert [nettoyer_numero(v) for v in df[colonne]] == ["012345678", None, None]